@@ -0,0 +1,49 @@
+"""
+Per-offspring cost of crossover and mutation.
+
+    $ python -m benchmarks.bench_offspring
+
+It compares the validated Circuit constructor with the trusted
+construction path that crossover and mutation use.
+"""
+import timeit
+
+import numpy as np
+import yaml
+
+from spea2.IC import AnalogCircuit, Circuit
+from spea2.algorithm import EvolutionaryAlgorithm, Generation
+
+
+def main(config_path='configs.yaml', number=20000):
+    with open(config_path) as file:
+        configs = yaml.load(file, Loader=yaml.FullLoader)
+    Circuit.PROPERTIES = configs["Circuit"]
+    Generation.PROPERTIES = configs["Circuit"]
+
+    gen = Generation(50, 0)
+    gen.population_initialize('Random')
+    gen.archive_inds = gen.individuals
+    for ind in gen.individuals:
+        ind.fitness.fitness = np.random.rand()
+
+    params = gen.individuals[0].circuit.parameters
+    as_list = list(params)
+    results = {
+        "Circuit(list) validated": timeit.timeit(
+            lambda: AnalogCircuit(as_list), number=number),
+        "Circuit.from_trusted(ndarray)": timeit.timeit(
+            lambda: AnalogCircuit.from_trusted(params.copy()), number=number),
+    }
+
+    offspring = EvolutionaryAlgorithm(gen, gen).produce_new_individual()
+    # Each call produces two offspring.
+    results["crossover + mutation"] = timeit.timeit(
+        lambda: next(offspring), number=number // 2)
+
+    for name, seconds in results.items():
+        print(f"{name:<32}{seconds / number * 1e6:8.2f} us per offspring")
+
+
+if __name__ == '__main__':
+    main()
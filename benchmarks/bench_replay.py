@@ -0,0 +1,54 @@
+"""
+Cost of answering a circuit from a recorded trace.
+
+    $ python -m benchmarks.bench_replay
+
+A trace of random circuits is replayed: 'hit' looks up recorded
+circuits, 'nearest' interpolates unrecorded ones from the nearest
+neighbors.
+"""
+import timeit
+
+import numpy as np
+import yaml
+
+from spea2.IC import AnalogCircuit, Circuit, ReplaySimulator, SimulationTrace
+
+
+def main(config_path='configs.yaml', simulations=20000, number=2000):
+    with open(config_path) as file:
+        circuit_config = yaml.load(file, Loader=yaml.FullLoader)["Circuit"]
+    Circuit.PROPERTIES = circuit_config
+    lower = np.array(circuit_config["lower_bound"])
+    upper = np.array(circuit_config["upper_bound"])
+    rng = np.random.default_rng(0)
+
+    trace = SimulationTrace(circuit_config["topology"], circuit_config["output"],
+                            lower, upper)
+    circuits = []
+    for _ in range(simulations):
+        circuit = AnalogCircuit.from_trusted(lower + (upper - lower) * rng.random(len(lower)))
+        for name in circuit_config["output"]:
+            setattr(circuit, name, rng.random())
+        trace.add(circuit)
+        circuits.append(circuit)
+    others = [AnalogCircuit.from_trusted(lower + (upper - lower) * rng.random(len(lower)))
+              for _ in range(number)]
+    trace.index()
+
+    results = {}
+    for neighbors in (1, 4):
+        replay = ReplaySimulator(trace, 'nearest', None, neighbors)
+        hits, misses = iter(circuits), iter(others)
+        results[f"hit, {neighbors} neighbors"] = timeit.timeit(
+            lambda: replay.replay(next(hits)), number=number)
+        results[f"nearest, {neighbors} neighbors"] = timeit.timeit(
+            lambda: replay.replay(next(misses)), number=number)
+
+    print(f"{simulations} recorded simulations")
+    for name, seconds in results.items():
+        print(f"{name:<28}{seconds / number * 1e6:8.2f} us per circuit")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Size and speed of the compressed saving format against the numpy one.
+
+    $ python -m benchmarks.bench_storage
+
+Generations of random circuits are stored whose archives keep all but
+a tenth of their members from one generation to the next. Throughputs
+are of the uncompressed values, reads are of random generations.
+"""
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+from spea2.IC import Circuit
+from spea2.algorithm import Generation, GenerationPool
+from spea2.algorithm.storage import CompressedStore
+
+
+def generations(circuit_config, count, n, rng):
+    archive = []
+    for kii in range(count):
+        generation = Generation(n, kii)
+        generation.population_initialize('Random', rng=rng)
+        for ind in generation.individuals:
+            for name in circuit_config["output"]:
+                setattr(ind.circuit, name, float(rng.normal(50, 10)))
+        new = n // 10 if archive else n
+        archive = archive[new:] + generation.individuals[:new]
+        generation.archive_inds = list(archive)
+        yield generation
+
+
+def main(config_path='configs.yaml', count=300, n=200, reads=200):
+    with open(config_path) as file:
+        circuit_config = yaml.load(file, Loader=yaml.FullLoader)["Circuit"]
+    Circuit.PROPERTIES = circuit_config
+    Generation.PROPERTIES = circuit_config
+    spea2_config = {"maximum_generation": count, "N": n, "targets": {}}
+
+    pool = list(generations(circuit_config, count, n, np.random.default_rng(0)))
+    numpy_pool = GenerationPool('numpy', False, circuit_config, spea2_config)
+    start = time.perf_counter()
+    for generation in pool:
+        numpy_pool._append_as_nparray(generation)
+    numpy_seconds = time.perf_counter() - start
+    numpy_bytes = len(pickle.dumps(numpy_pool))
+    print(f"numpy pickle: {numpy_bytes / 2 ** 20:.2f} MB, "
+          f"append {numpy_bytes / 2 ** 20 / numpy_seconds:.1f} MB/s")
+
+    folder = tempfile.mkdtemp()
+    rng = np.random.default_rng(1)
+    for codec in CompressedStore.CODECS:
+        store = CompressedStore(circuit_config["topology"], circuit_config["output"],
+                                codec=codec, spill_path=folder)
+        start = time.perf_counter()
+        for generation in pool:
+            store.append(generation)
+        seconds = time.perf_counter() - start
+        path = os.path.join(folder, f"pool-{codec}.gens")
+        store.save(path)
+
+        order = rng.integers(0, count, reads)
+        start = time.perf_counter()
+        for kii in order:
+            store._cache = None
+            store[int(kii)]
+        read_seconds = time.perf_counter() - start
+        size = os.path.getsize(path)
+        summary = store.summary()
+        print(f"{codec}: {size / 2 ** 20:.2f} MB, {numpy_bytes / size:.1f}x smaller than "
+              f"the numpy pickle ({summary['ratio']:.1f}x of the stored values), "
+              f"write {summary['raw_bytes'] / 2 ** 20 / seconds:.1f} MB/s, "
+              f"random read {read_seconds / reads * 1e3:.2f} ms per generation")
+        store.cleanup()
+        os.remove(path)
+    os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Cost of handing the parameters of one circuit to the simulator.
+
+    $ python -m benchmarks.bench_write_param
+
+'line by line' is the former HSpiceSimulator.write_param which issued
+one write per parameter. 'include' and 'inline' are the two
+param_injection modes of HSpiceSimulator.
+"""
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+import yaml
+
+from spea2.IC import HSpiceSimulator
+
+
+def write_param_line_by_line(path, topology, parameters):
+    with open(path + 'param.cir', 'w') as f:
+        f.write('.PARAM\n')
+        for header, parameter in zip(topology, parameters):
+            f.write('+ ' + header + ' = ' + str(parameter) + '\n')
+
+
+def main(config_path='configs.yaml', number=5000):
+    with open(config_path) as file:
+        circuit_config = yaml.load(file, Loader=yaml.FullLoader)["Circuit"]
+    topology = circuit_config["topology"]
+    lower = np.array(circuit_config["lower_bound"])
+    upper = np.array(circuit_config["upper_bound"])
+    parameters = lower + (upper - lower) * np.random.rand(len(topology))
+
+    folder = tempfile.mkdtemp()
+    try:
+        for name in os.listdir(circuit_config["path_to_circuit"]):
+            shutil.copy(os.path.join(circuit_config["path_to_circuit"], name), folder)
+        path = folder + os.sep
+
+        include = HSpiceSimulator(path, circuit_config["name"], 'include')
+        inline = HSpiceSimulator(path, circuit_config["name"], 'inline')
+        results = {
+            "line by line (longdouble)": timeit.timeit(
+                lambda: write_param_line_by_line(
+                    path, topology, parameters.astype(np.longdouble)),
+                number=number),
+            "include": timeit.timeit(
+                lambda: include.write_param(topology, parameters), number=number),
+            "inline": timeit.timeit(
+                lambda: inline.write_param(topology, parameters), number=number),
+        }
+    finally:
+        shutil.rmtree(folder)
+
+    for name, seconds in results.items():
+        print(f"{name:<28}{seconds / number * 1e6:8.2f} us per circuit")
+
+
+if __name__ == '__main__':
+    main()
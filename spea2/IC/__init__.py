@@ -1,2 +1,6 @@
 from .circuit import *
 from .simulators import *
+from .netlist import *
+from .grid import *
+from .trace import *
+from .operating_point import *
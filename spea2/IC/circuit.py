@@ -5,7 +5,9 @@ from typing import List, Union
 
 import numpy as np
 
-from .simulators import HSpiceSimulator, SimulationFailedError
+from .operating_point import OP_FIELDS
+from .simulators import HSpiceSimulator, NgspiceSharedSimulator, SimulationFailedError
+from .trace import ReplaySimulator
 
 __all__ = [
     "Circuit", "AnalogCircuit", "DigitalCircuit",
@@ -22,6 +24,8 @@ class Circuit(metaclass=ABCMeta):
     """
 
     PROPERTIES = {}
+    # Grid of the parameters of new circuits, see grid.ParameterGrid
+    GRID = None
 
     def __init__(self,
                  parameters: Union[List[float], List[int], np.ndarray]):
@@ -31,15 +35,51 @@ class Circuit(metaclass=ABCMeta):
         elif len(parameters) != len(self.PROPERTIES["topology"]):
             raise ValueError(
                 f"Length of the parameters and topology are not the same.")
-        elif any(map(
-                lambda x: not isinstance(x, (float, int, np.longdouble)), parameters)):
+
+        # Mixed or non-numeric elements end up in a non-numeric dtype.
+        parameters = np.array(parameters)
+        if parameters.dtype.kind not in 'iuf':
             raise TypeError(
                 f"Parameters should be list of float or int!")
 
         self.t_values = None
-        self.parameters = np.array(parameters, dtype=np.longdouble)
+        self.operating_point = None
+        self.corner = None
+        self.fidelity = None
+        self.parameters = parameters.astype(np.float64, copy=False)
         self.parameters.flags.writeable = False
 
+    @classmethod
+    def from_trusted(cls, parameters: np.ndarray):
+        """
+        Create a circuit without validating the parameters. It is meant
+        for the internal callers such as crossover and mutation whose
+        parameters are computed from validated circuits.
+
+        Args:
+            parameters (numpy.ndarray): float64 array which the circuit
+                takes ownership of. It is made read-only.
+        """
+        circuit = cls.__new__(cls)
+        circuit.__dict__['t_values'] = None
+        circuit.__dict__['operating_point'] = None
+        circuit.__dict__['corner'] = None
+        circuit.__dict__['fidelity'] = None
+        parameters.flags.writeable = False
+        circuit.__dict__['parameters'] = parameters
+        return circuit
+
+    @classmethod
+    def on_grid(cls, parameters: np.ndarray):
+        """
+        from_trusted with the parameters snapped to the grid, if there
+        is one. It is meant for the new circuits of initialization,
+        crossover and mutation.
+        """
+        if cls.GRID is not None:
+            parameters = cls.GRID.snap(parameters)
+        return cls.from_trusted(parameters)
+
     def __setattr__(self, name, value):
         if name == 'parameters' and hasattr(self, 'parameters'):
             raise AttributeError(f"Parameters can not be re-set!"
@@ -60,7 +100,7 @@ class Circuit(metaclass=ABCMeta):
         if not isinstance(self, type(obj)):
             raise TypeError(f"Can not add {type(self).__name__} type "
                             f"with {type(obj).__name__} type.")
-        return type(self).__call__(
+        return type(self).from_trusted(
             np.add(self.parameters, obj.parameters))
 
     def __sub__(self, obj):
@@ -68,27 +108,47 @@ class Circuit(metaclass=ABCMeta):
         if not isinstance(self, type(obj)):
             raise TypeError(f"Can not subtract {type(self).__name__} type "
                             f"with {type(obj).__name__} type.")
-        return type(self).__call__(
+        return type(self).from_trusted(
             np.subtract(self.parameters, obj.parameters))
 
     def __mul__(self, obj):
         """Operator overloading for multiplying a Circuit with a constant."""
         if isinstance(obj, (float, int)):
-            return type(self).__call__(self.parameters * obj)
+            return type(self).from_trusted(self.parameters * obj)
         raise TypeError(f"Can not multiply {type(self).__name__} type"
                         f"with {type(obj).__name__} type.")
 
     def __div__(self, obj):
         """Operator overloading for dividing a Circuit by a constant."""
         if isinstance(obj, (float, int)):
-            return type(self).__call__(self.parameters / obj)
+            return type(self).from_trusted(self.parameters / obj)
         raise TypeError(f"Can not divide {type(self).__name__} type"
                         f"by {type(obj).__name__} type.")
 
+    def copy_results(self, other):
+        """
+        Copy the simulation results of other circuit instead of
+        simulating this one.
+        """
+        for name, value in vars(other).items():
+            if name != 'parameters':
+                self.__dict__[name] = value
+
     @abstractmethod
     def simulate(self, path, lock=None):
         pass
 
+    def netlist_parameters(self) -> tuple:
+        """
+        Names and values of the .PARAM block, i.e. the topology and, if
+        the circuit is simulated at a corner, the corner parameters.
+        """
+        corner = getattr(self, 'corner', None)
+        if not corner:
+            return self.PROPERTIES["topology"], self.parameters
+        return (list(self.PROPERTIES["topology"]) + list(corner),
+                np.concatenate([self.parameters, list(corner.values())]))
+
     def HSPICE_simulate(self, path, lock=None):
         """
         Simulate using HSPICE.
@@ -99,11 +159,35 @@ class Circuit(metaclass=ABCMeta):
                 avoiding race condition between threads
                 in folders.
         """
+        self._run_locked(self.run_HSPICE, path, lock)
+
+    def NGSPICE_simulate(self, path, lock=None):
+        """
+        Simulate using ngspice loaded as a shared library.
+
+        Args:
+            path (str): Path to circuit file
+            lock (threading.Lock): Lock object for
+                avoiding race condition between threads
+                in folders.
+        """
+        self._run_locked(self.run_NGSPICE, path, lock)
+
+    def REPLAY_simulate(self, path, lock=None):
+        """
+        Answer from the trace of the 'trace' section of the Circuit
+        configuration instead of simulating, see trace.ReplaySimulator.
+        The trace is shared by the threads, path and lock are not used.
+        """
+        self._run_locked(self.run_REPLAY, path)
+
+    @staticmethod
+    def _run_locked(run, path, lock=None):
         if lock is None:
             lock = Lock()
         try:
             with lock:
-                self.run_HSPICE(path)
+                run(path)
         except SimulationFailedError:
             raise
         except Exception as e:
@@ -114,6 +198,15 @@ class Circuit(metaclass=ABCMeta):
             raise NotImplemented("You should override run_HSPICE method"
                                  "in your child class.")
 
+    def run_NGSPICE(self, path):
+        raise ValueError(f"{type(self).__name__} can not be simulated with ngspice.")
+
+    def run_REPLAY(self, path):
+        """ Set the recorded outputs, or fail as the recorded simulation did. """
+        outputs = ReplaySimulator.for_config(self.PROPERTIES["trace"]).replay(self)
+        for header, value in outputs:
+            setattr(self, header, value)
+
 
 class AnalogCircuit(Circuit):
 
@@ -135,7 +228,13 @@ class AnalogCircuit(Circuit):
         return None
 
     def simulate(self, path: str, lock=None):
-        self.HSPICE_simulate(path, lock)
+        simulator = self.PROPERTIES.get("simulator", "hspice")
+        if simulator == "ngspice":
+            self.NGSPICE_simulate(path, lock)
+        elif simulator == "replay":
+            self.REPLAY_simulate(path, lock)
+        else:
+            self.HSPICE_simulate(path, lock)
 
     def run_HSPICE(self, path):
         """
@@ -148,13 +247,17 @@ class AnalogCircuit(Circuit):
         Args:
             path (str): path to folder in which circuit files lay.
         """
-        # create a simulator object
-        hspice_simulator = HSpiceSimulator(
-            path, self.PROPERTIES["name"])
+        # screened circuits simulate the low fidelity netlist
+        name, screening = self.PROPERTIES["name"], getattr(self, 'fidelity', None)
+        if screening is not None:
+            name = screening.prepare(path, name)
+
+        # get the simulator object of the folder
+        hspice_simulator = HSpiceSimulator.for_path(
+            path, name, self.PROPERTIES.get("param_injection", "include"))
 
         # write parameters to param.cir file
-        hspice_simulator.write_param(
-            self.PROPERTIES["topology"], self.parameters)
+        hspice_simulator.write_param(*self.netlist_parameters())
 
         # run Hspice to output the results
         hspice_simulator.simulate()
@@ -163,15 +266,47 @@ class AnalogCircuit(Circuit):
         outputs = hspice_simulator.read_ma0()
 
         # read ma0 and parse power, area, temper
-        outputs.extend(hspice_simulator.read_mt0())
+        if screening is None or screening.transient:
+            outputs.extend(hspice_simulator.read_mt0())
 
         for header, value in outputs:
             setattr(self, header, value)
 
         # read Id, Ibs, Ibd, Vgs, Vds, Vbs, Vth,
-        # Vdsat, beta, gm, gds, gmb
-        # self.t_values = hspice_simulator.read_dp0(
-        #     self.PROPERTIES["transistor_number"])
+        # Vdsat, beta, gm, gds, gmb only if it is asked for
+        if self.PROPERTIES.get("operating_point", False) and screening is None:
+            self.operating_point = hspice_simulator.read_operating_point(
+                self.PROPERTIES["transistor_number"])
+
+    def run_NGSPICE(self, path):
+        """
+        Apply the parameters of the circuit to the netlist loaded in
+        ngspice, run it and read the outputs from memory.
+
+        Args:
+            path (str): path to folder in which circuit files lay.
+        """
+        # screened circuits simulate the low fidelity netlist
+        name, screening = self.PROPERTIES["name"], getattr(self, 'fidelity', None)
+        if screening is not None:
+            name = screening.prepare(path, name)
+
+        # get the simulator, i.e. the ngspice instance, of the folder
+        ngspice_simulator = NgspiceSharedSimulator.for_path(
+            path, name, self.PROPERTIES.get("ngspice_library"))
+
+        # alter the parameters of the loaded netlist
+        ngspice_simulator.write_param(*self.netlist_parameters())
+
+        ngspice_simulator.simulate()
+
+        # read gain, bw, himg, hreal, ... from the vectors
+        # the outputs the low fidelity netlist does not measure are skipped
+        outputs = ngspice_simulator.read_outputs(self.PROPERTIES["output"],
+                                                 strict=screening is None)
+
+        for header, value in outputs:
+            setattr(self, header, value)
 
 
 class DigitalCircuit(Circuit):
@@ -183,16 +318,23 @@ class DigitalCircuit(Circuit):
         return f"DigitalCircuit({list(self.parameters)})"
 
     def simulate(self, path: str, lock=None):
-        self.HSPICE_simulate(path, lock)
+        if self.PROPERTIES.get("simulator", "hspice") == "replay":
+            self.REPLAY_simulate(path, lock)
+        else:
+            self.HSPICE_simulate(path, lock)
 
     def run_HSPICE(self, path):
-        # create a simulater object
-        hspice_simulator = HSpiceSimulator(
-            path, self.PROPERTIES["name"])
+        # screened circuits simulate the low fidelity netlist
+        name, screening = self.PROPERTIES["name"], getattr(self, 'fidelity', None)
+        if screening is not None:
+            name = screening.prepare(path, name)
+
+        # get the simulator object of the folder
+        hspice_simulator = HSpiceSimulator.for_path(
+            path, name, self.PROPERTIES.get("param_injection", "include"))
 
         # write parameters to param.cir file
-        hspice_simulator.write_param(
-            self.PROPERTIES["topology"], self.parameters)
+        hspice_simulator.write_param(*self.netlist_parameters())
 
         # run Hspice to output the results
         hspice_simulator.simulate()
@@ -206,17 +348,21 @@ class DigitalCircuit(Circuit):
         # read Id, Ibs, Ibd, Vgs, Vds, Vbs, Vth,
         # Vdsat, beta, gm, gds, gmb
         self.t_values = hspice_simulator.read_dp0(self.PROPERTIES["transistor_number"])
+        if self.PROPERTIES.get("operating_point", False):
+            self.operating_point = np.ascontiguousarray(
+                np.transpose([self.t_values[name] for name in OP_FIELDS]),
+                dtype=np.float32)
 
 
 class CircuitCreator(metaclass=ABCMeta):
 
     @classmethod
     @abstractmethod
-    def _create(cls, circuit_type, params=None):
+    def _create(cls, circuit_type, params=None, rng=None):
         pass
 
     @classmethod
-    def create(cls, circuit_type, initializer_type, params=None):
+    def create(cls, circuit_type, initializer_type, params=None, rng=None):
         """
         Abstract Factory method for creating a new Circuit instance.
 
@@ -224,14 +370,16 @@ class CircuitCreator(metaclass=ABCMeta):
             circuit_type (str): returned circuit type.
             initializer_type (str): Creator type.
             params (Union[List[float], numpy.ndarray]): Circuit paramaters.
+            rng (numpy.random.Generator): source of randomness. If None
+                the global numpy random state is used.
 
         Returns:
             Union[circuit.AnalogCircuit, circuit.DigitalCircuit]
         """
         if initializer_type == 'Random':
-            return RandomInitializer._create(circuit_type)
+            return RandomInitializer._create(circuit_type, rng=rng)
         elif initializer_type == 'QuasiMonteCarlo':
-            return QuasiMonteCarloInitializer._create(circuit_type)
+            return QuasiMonteCarloInitializer._create(circuit_type, rng=rng)
         elif initializer_type == 'Normal':
             return NormalInitializer._create(circuit_type, params)
         else:
@@ -242,7 +390,7 @@ class CircuitCreator(metaclass=ABCMeta):
 class RandomInitializer(CircuitCreator):
 
     @classmethod
-    def _create(cls, circuit_type, params=None):
+    def _create(cls, circuit_type, params=None, rng=None):
         """
         Create new circuit with parameters that are
         randomly selected between upper bound and lower
@@ -252,14 +400,14 @@ class RandomInitializer(CircuitCreator):
         lower_bound = Circuit.PROPERTIES['lower_bound']
         p = len(Circuit.PROPERTIES.get("topology"))
 
+        random = np.random.rand(p) if rng is None else rng.random(p)
         dif_bound = (np.array(upper_bound) - np.array(lower_bound))
-        variable = np.multiply(
-            dif_bound, np.random.rand(p)) + np.array(lower_bound)
+        variable = np.multiply(dif_bound, random) + np.array(lower_bound)
 
         if circuit_type == 'analog':
-            return AnalogCircuit(variable)
+            return AnalogCircuit.on_grid(variable)
         elif circuit_type == 'digital':
-            return DigitalCircuit(variable)
+            return DigitalCircuit.on_grid(variable)
         else:
             raise ValueError(
                 f"Unrecognized circuit type! {circuit_type} is unknown.")
@@ -268,14 +416,14 @@ class RandomInitializer(CircuitCreator):
 class QuasiMonteCarloInitializer(CircuitCreator):
 
     @classmethod
-    def _create(cls, circuit_type, params=None):
+    def _create(cls, circuit_type, params=None, rng=None):
         pass
 
 
 class NormalInitializer(CircuitCreator):
 
     @classmethod
-    def _create(cls, circuit_type, params=None):
+    def _create(cls, circuit_type, params=None, rng=None):
         """
         Create circuit instance with the given parameters.
         """
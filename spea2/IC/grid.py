@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+__all__ = ["ParameterGrid"]
+
+
+class ParameterGrid:
+    """
+    Manufacturing grid of each parameter which the parameters of new
+    circuits are snapped to, so that circuits which are the same on
+    the layout are the same parameter vector too.
+
+    A grid is given per parameter as one of
+
+        tech                 multiples of the technology grid
+        {step: 5.0e-9}       multiples of step
+        {per_decade: 48}     10**(k / per_decade), i.e. log steps
+        null                 continuous
+
+    Snapped values outside the bounds are moved one step inwards and
+    clipped to the bounds if there is no grid point between them.
+
+    Args:
+        topology (List[str]): names of the parameters.
+        lower_bound (List[float]): lower bound of the parameters.
+        upper_bound (List[float]): upper bound of the parameters.
+        grids (Dict[str, object]): parameter -> grid. 'default' is the
+            grid of the parameters which are not given.
+        technology_grid (float): step of the tech grid.
+    """
+
+    def __init__(self, topology: List[str], lower_bound, upper_bound,
+                 grids: Dict[str, object], technology_grid: Optional[float] = None):
+        unknown = set(grids) - set(topology) - {'default'}
+        if unknown:
+            raise ValueError(f"{sorted(unknown)} are not parameters of the topology.")
+        self.lower_bound = np.asarray(lower_bound, dtype=float)
+        self.upper_bound = np.asarray(upper_bound, dtype=float)
+        p = len(topology)
+        self.step = np.zeros(p)
+        self.per_decade = np.zeros(p)
+        for i, name in enumerate(topology):
+            grid = grids.get(name, grids.get('default'))
+            if grid is None or grid == 'continuous':
+                continue
+            if grid == 'tech':
+                if technology_grid is None:
+                    raise ValueError(f"Tech grid of {name} needs technology_grid "
+                                     f"or technology_L.")
+                self.step[i] = technology_grid
+            elif isinstance(grid, dict) and 'step' in grid:
+                self.step[i] = grid['step']
+            elif isinstance(grid, dict) and 'per_decade' in grid:
+                if self.lower_bound[i] <= 0:
+                    raise ValueError(f"Log grid of {name} needs a positive lower bound.")
+                self.per_decade[i] = grid['per_decade']
+            else:
+                raise ValueError(f"Grid of {name} should be tech, {{step: value}}, "
+                                 f"{{per_decade: value}} or null but given {grid}")
+        if (self.step < 0).any() or (self.per_decade < 0).any():
+            raise ValueError("Grid steps should be positive.")
+        self._linear = self.step > 0
+        self._log = self.per_decade > 0
+
+    @classmethod
+    def from_config(cls, circuit_config: dict):
+        """
+        Create from the 'grid' section of the Circuit configuration.
+        The tech grid is technology_grid, or technology_L / 10 if it
+        is not given. Returns None if there is no grid.
+        """
+        grids = circuit_config.get("grid", None)
+        if not grids:
+            return None
+        technology_grid = circuit_config.get("technology_grid")
+        if technology_grid is None and circuit_config.get("technology_L") is not None:
+            technology_grid = circuit_config["technology_L"] / 10
+        return cls(circuit_config["topology"], circuit_config["lower_bound"],
+                   circuit_config["upper_bound"], grids, technology_grid)
+
+    def snap(self, parameters: np.ndarray) -> np.ndarray:
+        """
+        Parameters on the grid, a new float64 array. parameters may
+        be one vector or a (n, parameters) matrix.
+        """
+        x = np.array(parameters, dtype=float)
+        lower, upper = self.lower_bound, self.upper_bound
+        if self._linear.any():
+            step = self.step[self._linear]
+            k = np.rint(x[..., self._linear] / step)
+            k = np.where(k * step > upper[self._linear], k - 1, k)
+            k = np.where(k * step < lower[self._linear], k + 1, k)
+            x[..., self._linear] = k * step
+        if self._log.any():
+            per_decade = self.per_decade[self._log]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                k = np.rint(np.log10(x[..., self._log]) * per_decade)
+            k = np.where(10 ** (k / per_decade) > upper[self._log], k - 1, k)
+            k = np.where(10 ** (k / per_decade) < lower[self._log], k + 1, k)
+            x[..., self._log] = 10 ** (k / per_decade)
+        return np.clip(x, lower, upper)
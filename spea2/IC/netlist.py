@@ -0,0 +1,144 @@
+import os
+import re
+from typing import List
+
+__all__ = ["NetlistTemplate", "ScreeningNetlist", "write_file"]
+
+
+def write_file(path: str, data: bytes):
+    """
+    Write data with a single write call to a temporary file which then
+    replaces path, so that the simulator never reads a partially
+    written file.
+    """
+    temp_path = path + '.tmp'
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        written = os.write(fd, data)
+        # Regular files are written at once, keep going in case the
+        # system writes less.
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
+    os.replace(temp_path, path)
+
+
+class NetlistTemplate:
+    """
+    Precompiled .PARAM block of a topology and, optionally, of the
+    netlist which includes it.
+
+    The netlist is split once around its '.inc param.cir' line so that
+    render_netlist can inline the parameters in place of the include
+    without parsing the netlist again.
+
+    Args:
+        topology (List[str]): names of the parameters.
+        netlist (str): content of the netlist. If None only the .PARAM
+            block can be rendered.
+    """
+
+    INCLUDE = re.compile(r"^[ \t]*\.inc(?:lude)?[ \t]+['\"]?param\.cir['\"]?[ \t]*\r?$",
+                         re.IGNORECASE | re.MULTILINE)
+
+    def __init__(self, topology: List[str], netlist: str = None):
+        self.topology = tuple(topology)
+        # repr of a float is the shortest string which is parsed back
+        # to exactly the same value.
+        self._param_format = '.PARAM\n' + ''.join(
+            '+ ' + name.replace('%', '%%') + ' = %r\n' for name in self.topology)
+
+        self._prefix = self._suffix = None
+        if netlist is not None:
+            match = self.INCLUDE.search(netlist)
+            if match is None:
+                raise ValueError("The netlist does not include param.cir, so the "
+                                 "parameters can not be inlined.")
+            self._prefix = netlist[:match.start()]
+            self._suffix = netlist[match.end():]
+
+    @classmethod
+    def from_file(cls, topology: List[str], netlist_path: str):
+        with open(netlist_path) as f:
+            return cls(topology, f.read())
+
+    def render_params(self, parameters) -> bytes:
+        """ The content of param.cir. """
+        return self.render_params_str(parameters).encode()
+
+    def render_params_str(self, parameters) -> str:
+        if len(parameters) != len(self.topology):
+            raise ValueError("Length of the parameters and topology are not the same.")
+        return self._param_format % tuple(map(float, parameters))
+
+    def render_netlist(self, parameters) -> bytes:
+        """ The netlist with the .PARAM block in place of its include. """
+        if self._prefix is None:
+            raise ValueError("The template was created without a netlist.")
+        return (self._prefix + self.render_params_str(parameters)
+                + self._suffix).encode()
+
+
+class ScreeningNetlist:
+    """
+    Low fidelity variant of the netlist which is simulated to screen
+    the circuits before the full analysis.
+
+    Unless a netlist is given, <circuit_name>_screen.sp is derived from
+    <circuit_name>.sp in each folder at its first simulation: every .ac
+    sweep is coarsened to at most ac_points points per decade, octave
+    or, for linear sweeps, in total and, unless transient is true, the
+    .TRAN analysis and the measurements which are not of an AC, DC or
+    operating point analysis are removed, so only .ma0 is read.
+
+    Args:
+        ac_points (int): points of the coarse .ac sweeps.
+        transient (bool): keep the transient analysis.
+        netlist (str): file in the circuit folder which is simulated
+            instead of the derived one.
+    """
+
+    AC = re.compile(r"^([ \t]*\.ac[ \t]+(?:dec|oct|lin)[ \t]+)(\S+)", re.IGNORECASE)
+    TRAN = re.compile(r"^[ \t]*\.tran\b", re.IGNORECASE)
+    MEAS = re.compile(r"^[ \t]*\.meas(?:ure)?\b(?![ \t]+(?:ac|dc|op)\b)", re.IGNORECASE)
+
+    def __init__(self, ac_points: int = 10, transient: bool = False, netlist: str = None):
+        if ac_points < 1:
+            raise ValueError("ac_points should be at least 1.")
+        self.ac_points = ac_points
+        self.transient = transient
+        self.netlist = netlist
+
+    def derive(self, netlist: str) -> str:
+        """ The low fidelity variant of the content of a netlist. """
+        lines, dropping = [], False
+        for line in netlist.splitlines(keepends=True):
+            if line.lstrip().startswith('+'):
+                if not dropping:
+                    lines.append(line)
+                continue
+            dropping = not self.transient and bool(
+                self.TRAN.match(line) or self.MEAS.match(line))
+            if dropping:
+                continue
+            match = self.AC.match(line)
+            if match is not None:
+                points = min(int(float(match.group(2))), self.ac_points)
+                line = match.group(1) + str(points) + line[match.end():]
+            lines.append(line)
+        return ''.join(lines)
+
+    def prepare(self, path: str, circuit_name: str) -> str:
+        """
+        Write the derived netlist into the folder if it is not there,
+        e.g. the folder was recreated, and return the name of the
+        netlist to simulate.
+        """
+        if self.netlist is not None:
+            return os.path.splitext(self.netlist)[0]
+        name = circuit_name + '_screen'
+        if not os.path.exists(path + name + '.sp'):
+            with open(path + circuit_name + '.sp') as f:
+                write_file(path + name + '.sp', self.derive(f.read()).encode())
+        return name
@@ -0,0 +1,44 @@
+import re
+from typing import List
+
+import numpy as np
+
+__all__ = ["OP_FIELDS", "parse_dp0", "operating_point_dict"]
+
+# Quantities of each transistor in the .dp0 file and their row offsets
+# from the row of the transistor names.
+OP_FIELDS = ('Id', 'Ibs', 'Ibd', 'Vgs', 'Vds', 'Vbs',
+             'Vth', 'Vdsat', 'beta', 'gm', 'gds', 'gmb')
+_OP_ROWS = (4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 15, 16)
+
+_TRANSISTOR = re.compile(r'^M(\d+)$', re.IGNORECASE)
+
+
+def parse_dp0(lines: List[str], transistor_count: int,
+              dtype=np.float32) -> np.ndarray:
+    """
+    Parse the operating point of the transistors M1...M<transistor_count>
+    from the lines of a .dp0 file.
+
+    Returns:
+        numpy.ndarray: (transistor_count, 12) array whose columns are
+            in the order of OP_FIELDS. Transistors which are not in the
+            file are left as zero.
+    """
+    op = np.zeros((transistor_count, len(OP_FIELDS)), dtype=dtype)
+    rows = [[cell.strip() for cell in line.split('|') if cell != '']
+            for line in lines if '|' in line]
+
+    for row_n, row in enumerate(rows):
+        for col_n, cell in enumerate(row):
+            match = _TRANSISTOR.match(cell)
+            if match is None or not 0 < int(match.group(1)) <= transistor_count:
+                continue
+            op[int(match.group(1)) - 1] = [float(rows[row_n + offset][col_n])
+                                           for offset in _OP_ROWS]
+    return op
+
+
+def operating_point_dict(op: np.ndarray) -> dict:
+    """ Field name -> list of the values of each transistor. """
+    return {name: op[:, i].tolist() for i, name in enumerate(OP_FIELDS)}
@@ -1,5 +1,19 @@
+import ctypes
+import ctypes.util
 import os
+import shutil
+import tempfile
+import threading
 from abc import ABCMeta, abstractmethod
+from collections import deque
+
+import numpy as np
+
+from .netlist import NetlistTemplate, write_file
+from .operating_point import operating_point_dict, parse_dp0
+
+# Values of the simulator option of the Circuit configuration.
+SIMULATORS = ('hspice', 'ngspice', 'replay')
 
 
 class SimulationFailedError(BaseException):
@@ -35,10 +49,44 @@ class BaseSimulator(metaclass=ABCMeta):
 
 
 class HSpiceSimulator(BaseSimulator):
+    """
+    Args:
+        path (str): folder of the circuit files.
+        circuit_name (str): name of the .sp file.
+        param_injection (str): how the parameters reach the netlist.
+            'include' writes param.cir which the netlist includes.
+            'inline' writes <circuit_name>_inline.sp, the netlist with
+            the .PARAM block in place of '.inc param.cir', and simulates
+            it instead, so HSpice reads one file instead of two.
+    """
+
+    INJECTIONS = ('include', 'inline')
+
+    # One simulator per folder so that templates are compiled once
+    # for each thread. See for_path.
+    _instances = {}
 
-    def __init__(self, path: str, circuit_name: str):
+    def __init__(self, path: str, circuit_name: str, param_injection='include'):
         super().__init__(path)
+        if param_injection not in self.INJECTIONS:
+            raise ValueError(f"param_injection should be one of {self.INJECTIONS} "
+                             f"but given {param_injection}")
         self.circuit_name = circuit_name
+        self.param_injection = param_injection
+        self.netlist = circuit_name + '.sp'
+        if param_injection == 'inline':
+            self.netlist = circuit_name + '_inline.sp'
+        self._template = None
+
+    @classmethod
+    def for_path(cls, path: str, circuit_name: str, param_injection='include'):
+        """ Return the simulator of the folder, create it at the first call. """
+        key = (path, circuit_name, param_injection)
+        simulator = cls._instances.get(key)
+        if simulator is None:
+            simulator = cls._instances.setdefault(
+                key, cls(path, circuit_name, param_injection))
+        return simulator
 
     def __repr__(self):
         return f"HSpiceSimulator({self.path})"
@@ -47,7 +95,7 @@ class HSpiceSimulator(BaseSimulator):
         path = self.path.replace('/', '\\')
         execution_command = r'start/min/wait /D ' + path + \
                             r' C:\synopsys\Hspice_A-2008.03\BIN\hspicerf.exe ' \
-                            + self.circuit_name + '.sp -o ' + self.circuit_name
+                            + self.netlist + ' -o ' + self.circuit_name
         os.system(execution_command)
 
     @staticmethod
@@ -60,11 +108,27 @@ class HSpiceSimulator(BaseSimulator):
         for header, value in zip(headers_list, lines_list):
             yield header, value
 
+    def _get_template(self, topology: list) -> NetlistTemplate:
+        if self._template is None or self._template.topology != tuple(topology):
+            if self.param_injection == 'inline':
+                self._template = NetlistTemplate.from_file(
+                    topology, self.path + self.circuit_name + '.sp')
+            else:
+                self._template = NetlistTemplate(topology)
+        return self._template
+
     def write_param(self, topology: list, parameters: list):
-        with open(self.path + 'param.cir', 'w') as f:
-            f.write('.PARAM\n')
-            for header, parameter in zip(topology, parameters):
-                f.write('+ ' + header + ' = ' + str(parameter) + '\n')
+        """
+        Write the parameters with a single write call, either to
+        param.cir or inlined into the netlist.
+        """
+        template = self._get_template(topology)
+        if self.param_injection == 'inline':
+            write_file(self.path + self.netlist,
+                       template.render_netlist(parameters))
+        else:
+            write_file(self.path + 'param.cir',
+                       template.render_params(parameters))
 
     def read_ma0(self) -> list:
         """ Read gain, bw, himg, hreal, tmp from .ma0 file"""
@@ -96,48 +160,198 @@ class HSpiceSimulator(BaseSimulator):
                 outputs.append((header, value))
         return outputs
 
+    def read_operating_point(self, transistor_count: int) -> np.ndarray:
+        """
+        Read Id, Ibs, Ibd, Vgs, Vds, Vbs, Vth, Vdsat, beta, gm, gds, gmb
+        of each transistor from .dp0 file as (transistor_count, 12)
+        float32 array. See operating_point.parse_dp0.
+        """
+        with open(self.path + self.circuit_name + '.dp0', 'r') as f:
+            return parse_dp0(f.readlines(), transistor_count)
+
     def read_dp0(self, transistor_count: int) -> dict:
         """ Read values of transistor from .dp0 file."""
-        Id = [0.00] * transistor_count
-        Ibs = [0.00] * transistor_count
-        Ibd = [0.00] * transistor_count
-        Vgs = [0.00] * transistor_count
-        Vds = [0.00] * transistor_count
-        Vbs = [0.00] * transistor_count
-        Vth = [0.00] * transistor_count
-        Vdsat = [0.00] * transistor_count
-        beta = [0.00] * transistor_count
-        gm = [0.00] * transistor_count
-        gds = [0.00] * transistor_count
-        gmb = [0.00] * transistor_count
-
         with open(self.path + self.circuit_name + '.dp0', 'r') as f:
-            lines = f.readlines()
+            op = parse_dp0(f.readlines(), transistor_count, dtype=float)
+        return operating_point_dict(op)
+
+
+class _NgComplex(ctypes.Structure):
+    _fields_ = [("cx_real", ctypes.c_double), ("cx_imag", ctypes.c_double)]
+
+
+class _NgVectorInfo(ctypes.Structure):
+    _fields_ = [("v_name", ctypes.c_char_p),
+                ("v_type", ctypes.c_int),
+                ("v_flags", ctypes.c_short),
+                ("v_realdata", ctypes.POINTER(ctypes.c_double)),
+                ("v_compdata", ctypes.POINTER(_NgComplex)),
+                ("v_length", ctypes.c_int)]
+
+
+_SendChar = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_SendStat = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_ControlledExit = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_int, ctypes.c_bool,
+                                   ctypes.c_bool, ctypes.c_int, ctypes.c_void_p)
+
+
+class NgspiceSharedSimulator(BaseSimulator):
+    """
+    ngspice loaded in the process as a shared library.
+
+    The netlist, <circuit_name>.sp with its '.inc param.cir', is loaded
+    once with the .PARAM block inlined. The parameters of each circuit
+    are then applied with alterparam and reset, and the .MEAS results
+    are read from the vectors in memory, so a simulation starts no
+    process and reads or writes no file.
+
+    Shared ngspice keeps its state in globals, so every simulator other
+    than the first one loads its own copy of the library.
+
+    Args:
+        path (str): folder of the circuit files.
+        circuit_name (str): name of the .sp file.
+        library (str): path to libngspice. Found on the system if None.
+    """
+
+    # One simulator per folder, i.e. per worker. See for_path.
+    _instances = {}
+    _loaded = 0
+    _load_lock = threading.Lock()
+
+    def __init__(self, path: str, circuit_name: str, library: str = None):
+        super().__init__(path)
+        self.circuit_name = circuit_name
+        self.netlist = circuit_name + '_ngspice.sp'
+        self.library = library
+        self.messages = deque(maxlen=20)
+        self.exited = False
+        self._lib = None
+        self._template = None
+        # The callbacks must live as long as the library.
+        self._callbacks = (_SendChar(self._send_char), _SendStat(self._send_stat),
+                           _ControlledExit(self._controlled_exit))
+
+    @classmethod
+    def for_path(cls, path: str, circuit_name: str, library: str = None):
+        """ Return the simulator of the folder, create it at the first call. """
+        key = (path, circuit_name, library)
+        simulator = cls._instances.get(key)
+        if simulator is None or simulator.exited:
+            simulator = cls._instances[key] = cls(path, circuit_name, library)
+        return simulator
+
+    def __repr__(self):
+        return f"NgspiceSharedSimulator({self.path})"
+
+    @classmethod
+    def find_library(cls, library: str = None) -> str:
+        library = library or ctypes.util.find_library('ngspice')
+        if library is None:
+            raise FileNotFoundError("libngspice could not be found. Install ngspice "
+                                    "as a shared library or set ngspice_library "
+                                    "in the Circuit configuration.")
+        return library
+
+    def _load_library(self):
+        library = self.find_library(self.library)
+        with self._load_lock:
+            first = NgspiceSharedSimulator._loaded == 0
+            NgspiceSharedSimulator._loaded += 1
+        if first:
+            return ctypes.CDLL(library)
+        folder = tempfile.mkdtemp(prefix='spea2_ngspice_')
+        try:
+            copy = shutil.copy(library, folder)
+            return ctypes.CDLL(copy)
+        finally:
+            # The copy is not needed once it is loaded, except on Windows.
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _init(self, topology: list, parameters: list):
+        lib = self._load_library()
+        lib.ngSpice_Command.argtypes = [ctypes.c_char_p]
+        lib.ngSpice_Command.restype = ctypes.c_int
+        lib.ngGet_Vec_Info.argtypes = [ctypes.c_char_p]
+        lib.ngGet_Vec_Info.restype = ctypes.POINTER(_NgVectorInfo)
+        lib.ngSpice_AllPlots.restype = ctypes.POINTER(ctypes.c_char_p)
+        send_char, send_stat, controlled_exit = self._callbacks
+        lib.ngSpice_Init(send_char, send_stat, controlled_exit, None, None, None, None)
+        self._lib = lib
+
+        self._template = NetlistTemplate.from_file(
+            topology, self.path + self.circuit_name + '.sp')
+        write_file(self.path + self.netlist, self._template.render_netlist(parameters))
+        # source resolves the includes relative to the netlist.
+        self._command(f"source {self.path + self.netlist}")
+
+    def _send_char(self, text, _id, _user):
+        self.messages.append(text.decode(errors='replace'))
+        return 0
+
+    def _send_stat(self, _text, _id, _user):
+        return 0
+
+    def _controlled_exit(self, status, _unload, _quit, _id, _user):
+        self.exited = True
+        self.messages.append(f"ngspice exited with status {status}")
+        return 0
+
+    def _command(self, command: str):
+        if self._lib.ngSpice_Command(command.encode()) != 0 or self.exited:
+            raise SimulationFailedError(
+                f"ngspice failed to execute '{command}'.\n" + "\n".join(self.messages))
+
+    def write_param(self, topology: list, parameters: list):
+        """ Apply the parameters to the loaded circuit without writing a file. """
+        if self._lib is None or self._template.topology != tuple(topology):
+            self._init(topology, parameters)
+        for name, value in zip(topology, parameters):
+            self._command(f"alterparam {name} = {float(value)!r}")
+        self._command("reset")
+
+    def simulate(self):
+        self.messages.clear()
+        self._command("run")
+
+    def _plots(self) -> list:
+        plots = self._lib.ngSpice_AllPlots()
+        names = []
+        while plots and plots[len(names)] is not None:
+            names.append(plots[len(names)].decode())
+        return names
+
+    def read_outputs(self, names: list, strict: bool = True) -> list:
+        """
+        Read the .MEAS results with the given names from the plots of
+        the last run, then free the plots. If strict is false the
+        outputs which are not measured are left out instead of failing.
+        """
+        plots = self._plots()
+        outputs = []
+        try:
+            for name in names:
+                value = self._read_vector(plots, name)
+                if value is None and not strict:
+                    continue
+                if value is None or np.isnan(value):
+                    raise SimulationFailedError(
+                        f"ngspice could not calculate the response of the {name}. "
+                        f"Check error logs for more information.\n"
+                        + "\n".join(self.messages))
+                outputs.append((name, value))
+        finally:
+            self._command("destroy all")
+        return outputs
 
-        row_list = [line.split('|') for line in lines
-                    if '|' in line]
-        row_list = [[elem.strip() for elem in row
-                     if not elem == '']
-                    for row in row_list]
-        transistor_names = ['M' + str(x + 1) for x in range(transistor_count)]
-
-        for rowN, row in enumerate(row_list):
-            for colN, elem in enumerate(row):
-                if elem in transistor_names:
-                    transN = int(elem[-1])
-                    Id[transN - 1] = float(row_list[rowN + 4][colN])
-                    Ibs[transN - 1] = float(row_list[rowN + 5][colN])
-                    Ibd[transN - 1] = float(row_list[rowN + 6][colN])
-                    Vgs[transN - 1] = float(row_list[rowN + 7][colN])
-                    Vds[transN - 1] = float(row_list[rowN + 8][colN])
-                    Vbs[transN - 1] = float(row_list[rowN + 9][colN])
-                    Vth[transN - 1] = float(row_list[rowN + 10][colN])
-                    Vdsat[transN - 1] = float(row_list[rowN + 11][colN])
-                    beta[transN - 1] = float(row_list[rowN + 12][colN])
-                    gm[transN - 1] = float(row_list[rowN + 14][colN])
-                    gds[transN - 1] = float(row_list[rowN + 15][colN])
-                    gmb[transN - 1] = float(row_list[rowN + 16][colN])
-
-        return {'Id': Id, 'Ibs': Ibs, 'Ibd': Ibd, 'Vgs': Vgs,
-                'Vds': Vds, 'Vbs': Vbs, 'Vth': Vth, 'Vdsat': Vdsat,
-                'beta': beta, 'gm': gm, 'gds': gds, 'gmb': gmb}
+    def _read_vector(self, plots: list, name: str):
+        for plot in plots:
+            info = self._lib.ngGet_Vec_Info(f"{plot}.{name.lower()}".encode())
+            if not info or info.contents.v_length < 1:
+                continue
+            vector = info.contents
+            if vector.v_realdata:
+                return float(vector.v_realdata[0])
+            if vector.v_compdata:
+                return float(vector.v_compdata[0].cx_real)
+        return None
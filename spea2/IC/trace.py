@@ -0,0 +1,330 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .simulators import SimulationFailedError
+
+__all__ = ["SimulationTrace", "ReplaySimulator", "TraceMissError"]
+
+
+class TraceMissError(SimulationFailedError):
+    """ Raised for a circuit which the trace has no answer for. """
+
+
+class SimulationTrace:
+    """
+    Every simulation of a run: the parameters of the circuit, the
+    condition it is simulated at, i.e. its corner and whether it is a
+    low fidelity screening job, and its outputs or its failure.
+
+    The trace is kept in memory as growing arrays and saved as one
+    .npz file with a row per simulation. Loaded traces are indexed per
+    condition, exactly by the bytes of the parameters and by distance
+    in the parameter space normalized by the bounds.
+
+    Args:
+        topology (List[str]): names of the parameters.
+        outputs (List[str]): names of the outputs.
+        lower_bound (List[float]): lower bound of the parameters.
+        upper_bound (List[float]): upper bound of the parameters.
+    """
+
+    def __init__(self, topology: List[str], outputs: List[str], lower_bound, upper_bound):
+        self.topology = list(topology)
+        self.outputs = list(outputs)
+        self.lower_bound = np.asarray(lower_bound, dtype=float)
+        self.upper_bound = np.asarray(upper_bound, dtype=float)
+        span = self.upper_bound - self.lower_bound
+        span[span == 0] = 1.0
+        self.span = span
+        self.conditions = []
+        self._condition_index = {}
+        self.parameters = np.empty((0, len(self.topology)))
+        self.values = np.empty((0, len(self.outputs)))
+        self.condition = np.empty(0, dtype=np.int32)
+        self.failed = np.empty(0, dtype=bool)
+        self.size = 0
+        self._lock = threading.Lock()
+        self._index = None
+
+    @classmethod
+    def from_config(cls, circuit_config: dict):
+        """
+        Trace of the file given in the 'trace' section of the Circuit
+        configuration, loaded if it exists and empty otherwise.
+        Returns None if there is no trace section.
+        """
+        config = circuit_config.get("trace", None)
+        if not config:
+            return None
+        trace = cls(circuit_config["topology"], circuit_config["output"],
+                    circuit_config["lower_bound"], circuit_config["upper_bound"])
+        if os.path.isfile(config["path"]):
+            trace.extend(cls.load(config["path"]))
+        return trace
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def condition_of(circuit) -> str:
+        """ Label of the corner and the fidelity the circuit is simulated at. """
+        corner = getattr(circuit, 'corner', None) or {}
+        screening = getattr(circuit, 'fidelity', None) is not None
+        return json.dumps({"corner": corner, "screening": screening}, sort_keys=True)
+
+    def _condition(self, label: str) -> int:
+        if label not in self._condition_index:
+            self._condition_index[label] = len(self.conditions)
+            self.conditions.append(label)
+        return self._condition_index[label]
+
+    def _reserve(self, rows: int):
+        """ Grow the arrays geometrically so that adding a row is amortized O(1). """
+        needed = self.size + rows
+        if needed <= len(self.parameters):
+            return
+        capacity = max(needed, 2 * len(self.parameters), 256)
+        for name in ('parameters', 'values', 'condition', 'failed'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, circuit, failed: bool = False):
+        """ Record a simulated, or failed, circuit. """
+        values = [np.nan] * len(self.outputs)
+        if not failed:
+            values = [getattr(circuit, name, np.nan) for name in self.outputs]
+        label = self.condition_of(circuit)
+        with self._lock:
+            self._reserve(1)
+            self.parameters[self.size] = circuit.parameters
+            self.values[self.size] = np.asarray(values, dtype=float)
+            self.condition[self.size] = self._condition(label)
+            self.failed[self.size] = failed
+            self.size += 1
+            self._index = None
+
+    def extend(self, other: "SimulationTrace"):
+        """ Append the rows of another trace of the same topology and outputs. """
+        if other.topology != self.topology or other.outputs != self.outputs:
+            raise ValueError("Traces of different topologies or outputs can not "
+                             "be merged.")
+        with self._lock:
+            mapping = np.array([self._condition(label) for label in other.conditions],
+                               dtype=np.int32)
+            self._reserve(other.size)
+            rows = slice(self.size, self.size + other.size)
+            self.parameters[rows] = other.parameters[:other.size]
+            self.values[rows] = other.values[:other.size]
+            self.condition[rows] = mapping[other.condition[:other.size]]
+            self.failed[rows] = other.failed[:other.size]
+            self.size += other.size
+            self._index = None
+
+    def save(self, path: str):
+        """ Write the trace to path atomically, as an uncompressed .npz. """
+        with self._lock:
+            n = self.size
+            arrays = {
+                "topology": np.array(self.topology),
+                "outputs": np.array(self.outputs),
+                "lower_bound": self.lower_bound,
+                "upper_bound": self.upper_bound,
+                "conditions": np.array(self.conditions, dtype=str),
+                "parameters": self.parameters[:n],
+                "values": self.values[:n],
+                "condition": self.condition[:n],
+                "failed": self.failed[:n],
+            }
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SimulationTrace":
+        with np.load(path) as data:
+            trace = cls(data["topology"].tolist(), data["outputs"].tolist(),
+                        data["lower_bound"], data["upper_bound"])
+            for label in data["conditions"].tolist():
+                trace._condition(label)
+            trace.parameters = data["parameters"]
+            trace.values = data["values"]
+            trace.condition = data["condition"]
+            trace.failed = data["failed"]
+        trace.size = len(trace.parameters)
+        return trace
+
+    def index(self) -> Dict[str, tuple]:
+        """
+        Rows of each condition: label -> (rows, normalized parameters,
+        parameter bytes -> row). The first of duplicated rows is kept.
+        """
+        with self._lock:
+            if self._index is None:
+                index = {}
+                parameters = np.ascontiguousarray(self.parameters[:self.size])
+                for k, label in enumerate(self.conditions):
+                    rows = np.flatnonzero(self.condition[:self.size] == k)
+                    exact = {}
+                    for row in rows[::-1]:
+                        exact[parameters[row].tobytes()] = row
+                    index[label] = (rows, (parameters[rows] - self.lower_bound) / self.span,
+                                    exact)
+                self._index = index
+            return self._index
+
+    def nearest(self, parameters: np.ndarray, label: str, neighbors: int = 1):
+        """
+        The rows of the condition nearest to the parameters and their
+        root mean square distances in the normalized parameter space,
+        nearest first. A row with the same parameters is the only one
+        returned, at 0.
+
+        Returns:
+            Tuple[numpy.ndarray, numpy.ndarray]: rows and distances,
+                empty if the condition is not in the trace.
+        """
+        entry = self.index().get(label)
+        if entry is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        rows, normalized, exact = entry
+        parameters = np.ascontiguousarray(parameters, dtype=float)
+        row = exact.get(parameters.tobytes())
+        if row is not None:
+            # The recorded circuit itself, whose weight would be infinite.
+            return np.array([row]), np.zeros(1)
+        difference = normalized - (parameters - self.lower_bound) / self.span
+        squared = np.einsum('ij,ij->i', difference, difference)
+        k = min(neighbors, len(rows))
+        nearest = np.argpartition(squared, k - 1)[:k] if k < len(rows) else np.arange(k)
+        nearest = nearest[np.argsort(squared[nearest], kind='stable')]
+        return rows[nearest], np.sqrt(squared[nearest] / len(self.topology))
+
+
+class ReplaySimulator:
+    """
+    Simulator which answers from a recorded trace instead of running a
+    simulator, so that changes of the algorithm can be benchmarked on
+    the circuits of a real run at memory speed.
+
+    A circuit of the trace gets its recorded outputs, or fails if its
+    simulation failed. Any other circuit is a miss which, by the miss
+    policy, either
+
+        nearest     gets the outputs of the nearest circuits of the
+                    trace, the inverse distance weighted mean of
+                    neighbors of them. It fails if the nearest one
+                    failed or is farther than max_distance.
+        fail        fails as if its simulation failed, so that it is
+                    replaced.
+
+    Args:
+        trace (SimulationTrace): the recorded simulations.
+        miss (str): 'nearest' or 'fail'.
+        max_distance (float): root mean square distance, in the
+            parameter space normalized by the bounds, up to which
+            nearest answers a miss. None for any distance.
+        neighbors (int): number of circuits the outputs of a miss are
+            interpolated from.
+    """
+
+    MISS_POLICIES = ('nearest', 'fail')
+
+    # One simulator per trace file, shared by the threads. See for_config.
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, trace: SimulationTrace, miss: str = 'nearest',
+                 max_distance: Optional[float] = None, neighbors: int = 1):
+        if miss not in self.MISS_POLICIES:
+            raise ValueError(f"miss should be one of {self.MISS_POLICIES} "
+                             f"but given {miss}")
+        if neighbors < 1:
+            raise ValueError(f"neighbors should be at least 1 but given {neighbors}")
+        self.trace = trace
+        self.miss = miss
+        self.max_distance = max_distance
+        self.neighbors = neighbors
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.interpolated = 0
+        self.misses = 0
+
+    @classmethod
+    def for_config(cls, trace_config: dict) -> "ReplaySimulator":
+        """ Simulator of the 'trace' section, the trace is loaded once. """
+        with cls._instances_lock:
+            key = os.path.abspath(trace_config["path"])
+            if key not in cls._instances:
+                cls._instances[key] = cls(
+                    SimulationTrace.load(trace_config["path"]),
+                    trace_config.get("miss", 'nearest'),
+                    trace_config.get("max_distance"),
+                    trace_config.get("neighbors", 1))
+            return cls._instances[key]
+
+    def __repr__(self):
+        return f"ReplaySimulator({len(self.trace)} simulations, miss={self.miss})"
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def replay(self, circuit) -> list:
+        """
+        Recorded outputs of the circuit as (name, value) pairs, those
+        not measured at its condition are left out.
+
+        Raises:
+            SimulationFailedError: if its recorded simulation failed.
+            TraceMissError: if the miss policy does not answer it.
+        """
+        trace = self.trace
+        neighbors = 1 if self.miss == 'fail' else self.neighbors
+        rows, distances = trace.nearest(circuit.parameters, trace.condition_of(circuit),
+                                        neighbors)
+        exact = len(rows) > 0 and distances[0] == 0
+        if not exact:
+            if self.miss == 'fail' or not len(rows) or (
+                    self.max_distance is not None and distances[0] > self.max_distance):
+                self._count('misses')
+                raise TraceMissError(f"{circuit} is not in the trace.")
+        if trace.failed[rows[0]]:
+            self._count('hits' if exact else 'interpolated')
+            raise SimulationFailedError(f"Recorded simulation of {circuit} failed.")
+
+        if exact:
+            values = trace.values[rows[0]]
+        else:
+            usable = ~trace.failed[rows]
+            rows, distances = rows[usable], distances[usable]
+            if self.max_distance is not None:
+                rows = rows[distances <= self.max_distance]
+                distances = distances[distances <= self.max_distance]
+            weights = np.broadcast_to((1 / distances)[:, None],
+                                      (len(rows), len(trace.outputs)))
+            values = trace.values[rows]
+            weights = np.where(np.isnan(values), 0.0, weights)
+            with np.errstate(invalid='ignore'):
+                values = np.nansum(values * weights, axis=0) / weights.sum(axis=0)
+        self._count('hits' if exact else 'interpolated')
+        return [(name, float(value)) for name, value in zip(trace.outputs, values)
+                if not np.isnan(value)]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {"simulations": len(self.trace), "hits": self.hits,
+                    "interpolated": self.interpolated, "misses": self.misses}
+
+    def report(self) -> str:
+        """ Human readable summary for the end of the run. """
+        summary = self.summary()
+        return (f"Replayed from {summary['simulations']} recorded simulations: "
+                f"{summary['hits']} hits, {summary['interpolated']} interpolated, "
+                f"{summary['misses']} misses")
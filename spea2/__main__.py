@@ -1,12 +1,23 @@
 import argparse
 import atexit
+import json
 import logging
+import sys
 import time
+
+import numpy as np
 import yaml
 
+from . import export, query
 from .filehandler import FileHandler
+from .profiling import Profiler
 from .IC import *
-from .algorithm import EvolutionaryAlgorithm, Individual
+from .algorithm import (
+    DuplicateIndex, EarlyStopping, Generation, GenerationPool, Individual,
+    LocalSearch, PopulationSizing
+)
+from .islands import process_islands
+from .runner import close_workers, configure, create_workers, evolve
 
 
 def get_logger():
@@ -18,37 +29,56 @@ def get_logger():
     return logging.getLogger()
 
 
+def get_metrics_logger():
+    # Quality metrics of each generation are written as json lines.
+    metrics_logger = logging.getLogger("spea2.metrics")
+    if not metrics_logger.handlers:
+        handler = logging.FileHandler('metrics.log')
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        metrics_logger.addHandler(handler)
+        metrics_logger.propagate = False
+    metrics_logger.setLevel(logging.INFO)
+    return metrics_logger
+
+
 def process(
         circuit_config: dict,
         spea2_config: dict,
         path: str,
         thread=1,
         saving_format='instance',
-        only_cct=False
+        only_cct=False,
+        seed=None,
+        profiler=None
 ):
     """
     The whole process is going under this function. After iterating
-    the generations to the maximum_generation the data will be pickled
-    to the path.
+    the generations to the maximum_generation, or until one of the
+    stopping criteria in spea2_config["stopping"] is met, the data
+    will be pickled to the path.
+
+    All of the randomness comes from one numpy.random.Generator seeded
+    with seed, or spea2_config["seed"] if seed is None, so that the
+    same seed gives the same result regardless of the thread number.
+
+    If profiler (profiling.Profiler) is given, each stage of each
+    generation is tagged and profiled with it.
+
+    If spea2_config has an 'islands' section, several populations are
+    evolved in separate processes instead, see islands.process_islands.
     """
-    # Assign configuration to class variables. Note that these are
-    # runtime assignment and can not be pickled.
-    circuit.Circuit.PROPERTIES = circuit_config
-    Generation.PROPERTIES = circuit_config
-    Individual.TARGETS = spea2_config["targets"]
-    Individual.CONSTRAINTS = spea2_config["constraints"]
-    Individual.constraint_operations = [next(iter(x))
-                                        for x in Individual.CONSTRAINTS.values()]
-    Individual.constraint_constants = [next(iter(x.values()))
-                                       for x in Individual.CONSTRAINTS.values()]
-
-    MAXIMUM_GEN = spea2_config["maximum_generation"]
-    output_path = circuit_config["path_to_output"]
-    N = spea2_config["N"]
-    kii = 0
+    if spea2_config.get("islands"):
+        return process_islands(circuit_config, spea2_config, path, thread,
+                               saving_format, only_cct, seed, profiler)
 
-    # Create first generation with N individual
-    generation = Generation(N, kii)
+    configure(circuit_config, spea2_config)
+    output_path = circuit_config["path_to_output"]
+    sizing = PopulationSizing.from_config(spea2_config)
+    rng = np.random.default_rng(spea2_config.get("seed") if seed is None else seed)
+    metrics_logger = logging.getLogger("spea2.metrics")
+    duplicate_index = DuplicateIndex.from_config(circuit_config, spea2_config)
+    workers = create_workers(circuit_config, spea2_config, path, thread)
+    local_search = LocalSearch.from_config(circuit_config, spea2_config)
 
     # Each generation will be appended to the generationpool after
     # each iteration. Since each generation contains individuals,
@@ -61,61 +91,50 @@ def process(
     generation_pool = GenerationPool(saving_format, only_cct,
                                      circuit_config, spea2_config)
 
-    # Initialize the first generation. Either with Randomly,
-    # or using Low-discrepancy sequence.
-    generation.population_initialize('Random')
-
-    # Simulate the individuals of the generation
-    generation.simulate(path=path, multithread=thread)
-
-    # Assign fitness instance to the each individual in the generation
-    FitnessAssigner.assign_fitness_first(generation)
-
-    # Since it is the first generation, archive individuals and individiuals
-    # will be the same.
-    generation.archive_inds = generation.individuals
-
-    # Append to the pool
-    generation_pool.append(generation)
-
-    # With the help of the assigned fitness values, the algorithm
-    # can now produce the next generation.
-    algorithm = EvolutionaryAlgorithm(generation, generation)
-    next_generation = algorithm.produce()
-
-    while kii < MAXIMUM_GEN - 1:
-        # Increase the current generation number
-        kii += 1
-        print("# Gen: ", kii)
-
-        # Now simulate the new generation in order to calculate
-        # performance values of the each circuit generation has.
-        next_generation.simulate(path=path, multithread=thread, algorithm=algorithm)
-
-        # Assign fitness instance to the new generation and arch_fitness
-        # instance to the generation before.
-        FitnessAssigner().assign_fitness(next_generation, generation)
-
-        # Choose archive individuals based on the assigned fitness values
-        algorithm = EvolutionaryAlgorithm(generation, next_generation)
-        next_generation.archive_inds = algorithm.select_archive()
-
-        # Iterate to the next generation.
-        new_generation = algorithm.produce()
-
-        # Create a shallow copy of new generation and overrides generation
-        generation = next_generation
-        next_generation = new_generation
-
-        # Append the last generation
+    def append(generation):
         generation_pool.append(generation)
+        metrics_logger.info(json.dumps(generation_pool.metrics[-1]))
+        return generation_pool.metrics[-1]
+
+    kii = evolve(append, workers, sizing, rng, spea2_config["maximum_generation"],
+                 thread, duplicate_index, EarlyStopping.from_config(spea2_config),
+                 local_search=local_search, profiler=profiler)
+
+    close_workers(workers, generation_pool)
+    if duplicate_index is not None:
+        logging.getLogger().info(f"Simulations avoided by eliminating duplicated "
+                                 f"offspring: {duplicate_index.avoided}")
+    if local_search is not None:
+        logging.getLogger().info(f"Simulations of the local search: "
+                                 f"{local_search.simulations}")
+    if circuit_config.get("simulator", "hspice") == "replay":
+        logging.getLogger().info(
+            ReplaySimulator.for_config(circuit_config["trace"]).report())
+    if Generation.parameter_constraints is not None:
+        logging.getLogger().info(f"Violators of the parameter constraints replaced: "
+                                 f"{Generation.parameter_constraints.rejected}, "
+                                 f"repaired: {Generation.parameter_constraints.repaired}")
+
+    # Discard the unused generations if the process stopped early.
+    generation_pool.finalize(kii)
+    if saving_format == 'compressed':
+        summary = generation_pool.pool.summary()
+        logging.getLogger().info(f"Generations compressed from {summary['raw_bytes']} "
+                                 f"to {summary['compressed_bytes']} bytes "
+                                 f"({summary['ratio']:.1f}x)")
 
     # Save pool to the path_to_output
     generation_pool.save(output_path, circuit_config["name"], kii)
+    generation_pool.release()
     return generation_pool.saved_file_path
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["export"]:
+        raise SystemExit(export.main(sys.argv[2:]))
+    if sys.argv[1:2] == ["query"]:
+        raise SystemExit(query.main(sys.argv[2:]))
+
     # Parse the arguments and start the process
     parser = argparse.ArgumentParser()
     parser.add_argument("--only_cct",
@@ -124,16 +143,47 @@ if __name__ == "__main__":
     parser.add_argument("--config_path",
                         help="path to configuration .yaml file")
     parser.add_argument("--saving_mode",
-                        choices=("numpy", "instance"),
+                        choices=("numpy", "instance", "compressed"),
                         default="numpy",
                         help="output data saving mode.")
     parser.add_argument("--thread",
-                        choices=range(1, 9),
+                        type=int,
                         default=1,
                         help="number of threads to be used.")
+    parser.add_argument("--scratch_path",
+                        default=None,
+                        help="folder in which the simulation folders of "
+                             "the threads will be formed.")
+    parser.add_argument("--keep_scratch",
+                        help="keep the simulation folders at the end so that "
+                             "the next run can reuse them.",
+                        action='store_true')
+    parser.add_argument("--profile",
+                        nargs='?',
+                        const='profile',
+                        default=None,
+                        metavar='DIR',
+                        help="sample the stacks and profile each stage, the "
+                             "output is written to DIR (default: profile).")
+    parser.add_argument("--profile_interval",
+                        type=float,
+                        default=10.0,
+                        help="milliseconds between the stack samples.")
+    parser.add_argument("--profile_every",
+                        type=int,
+                        default=10,
+                        help="number of generations per profile output file.")
+    parser.add_argument("--seed",
+                        type=int,
+                        default=None,
+                        help="seed of the random number generator. Overrides "
+                             "the seed in the configuration file.")
     args = parser.parse_args()
+    if args.thread < 1:
+        parser.error("--thread should be at least 1.")
 
     logger = get_logger()
+    get_metrics_logger()
 
     with open(args.config_path) as file:
         yaml_file = yaml.load(file, Loader=yaml.FullLoader)
@@ -144,33 +194,43 @@ if __name__ == "__main__":
         raise SystemExit(f"There is no such direction "
                          f"{CIRCUIT_PROPERTIES['path_to_output']}")
 
-    # Create temp folder to perform simulations
-    file_handler = FileHandler(CIRCUIT_PROPERTIES['path_to_circuit'])
-    file_handler.form_simulation_environment(args.thread)
-    path = file_handler.get_folder_path()
+    if CIRCUIT_PROPERTIES.get("simulator", "hspice") == "replay":
+        # Replayed circuits are not simulated, no folders are needed.
+        path = CIRCUIT_PROPERTIES['path_to_circuit']
+    else:
+        # Create temp folder to perform simulations
+        file_handler = FileHandler(CIRCUIT_PROPERTIES['path_to_circuit'],
+                                   scratch_path=args.scratch_path,
+                                   keep_scratch=args.keep_scratch)
+        file_handler.form_simulation_environment(args.thread)
+        path = file_handler.get_folder_path()
 
-    # Delete simulation environ at the end
-    atexit.register(file_handler.delete_simulation_environment)
+        # Delete simulation environ at the end
+        atexit.register(file_handler.delete_simulation_environment)
 
     # start time_perf counter.
     start = time.perf_counter()
 
     # start the process
-    saved_file_path = process(
-        CIRCUIT_PROPERTIES,
-        SPEA2_PROPERTIES,
-        path,
-        args.thread,
-        args.saving_mode,
-        args.only_cct
-    )
+    profiler = Profiler(args.profile, args.profile_interval / 1000,
+                        args.profile_every)
+    with profiler:
+        saved_file_path = process(
+            CIRCUIT_PROPERTIES,
+            SPEA2_PROPERTIES,
+            path,
+            args.thread,
+            args.saving_mode,
+            args.only_cct,
+            args.seed,
+            profiler
+        )
 
     # stop time_perf counter
     stop = time.perf_counter()
 
-    constraints_as_str = [k + '->' + i + ':' + str(j)
-                          for k, v in SPEA2_PROPERTIES['constraints'].items()
-                          for i, j in v.items()]
+    constraints_as_str = [repr(c) for c in Individual.constraint_set.constraints
+                          + Individual.constraint_set.operating_point_constraints]
 
     logger.info(f"\nTime took for the whole process: {(stop - start) / 60} min."
                 f"\nMaximum generation: {SPEA2_PROPERTIES['maximum_generation']} "
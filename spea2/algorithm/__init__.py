@@ -2,3 +2,15 @@ from .genetic import EvolutionaryAlgorithm
 from .generation import Generation, GenerationPool
 from .assigner import FitnessAssigner
 from .individual import Individual
+from .stopping import EarlyStopping
+from .sizing import PopulationSizing
+from .dedup import DuplicateIndex
+from .paretoindex import ParetoIndex
+from .constraints import Constraint, ConstraintSet, OperatingPointConstraint
+from .workers import JobCancelled, StragglerError, WorkerMonitor, WorkerPool
+from .dataplane import ProcessWorkerPool, SharedBatch
+from .corners import Corner, CornerPool, CornerSet
+from .localsearch import LocalSearch
+from .screening import ScreenedOut, Screening, ScreeningPool
+from .feasibility import ParameterConstraints
+from .recording import RecordingPool
@@ -2,9 +2,9 @@ from heapq import nsmallest
 
 from .helperfuncs import (
     calculate_distance, calculate_fitness_value,
-    calculate_total_error, compare_targets,
-    get_normalize_constants
+    compare_targets, get_normalize_constants
 )
+from .individual import Individual
 
 
 class FitnessAssigner:
@@ -18,7 +18,8 @@ class FitnessAssigner:
             gen (generation.Generation): the first generation
         """
         normalize_constants = get_normalize_constants(gen.individuals)
-        for ind1 in gen.individuals:
+        total_errors = Individual.constraint_set.evaluate(gen.individuals)
+        for ind1, total_error in zip(gen.individuals, total_errors):
             for j, ind2 in enumerate(gen.individuals):
 
                 if compare_targets(ind1, ind2):
@@ -34,7 +35,7 @@ class FitnessAssigner:
                 )
 
             ind1.fitness.distance = nsmallest(2, ind1.fitness.distance)[-1]
-            ind1.fitness.total_error = calculate_total_error(ind1)
+            ind1.fitness.total_error = float(total_error)
 
         max_rawfitnesses = max(
             ind.fitness.rawfitness for ind in gen.individuals)
@@ -97,44 +98,53 @@ class FitnessAssigner:
     @staticmethod
     def _assign_total_error(inds, arch_inds):
         """
-        Assign errors to the individuals.
+        Assign errors to the individuals. Constraints are evaluated
+        for all of them at once.
         Args:
             inds (individual.Individual):
             arch_inds (individual.Individual):
         """
-        for ind, arch_ind in zip(inds, arch_inds):
-            ind.fitness.total_error = calculate_total_error(ind)
-            arch_ind.arch_fitness.total_error = calculate_total_error(arch_ind)
+        total_errors = Individual.constraint_set.evaluate(inds + arch_inds)
+        for ind, total_error in zip(inds, total_errors[:len(inds)]):
+            ind.fitness.total_error = float(total_error)
+        for arch_ind, total_error in zip(arch_inds, total_errors[len(inds):]):
+            arch_ind.arch_fitness.total_error = float(total_error)
 
     @staticmethod
     def _assign_strength(inds, arch_inds):
-        """ Assign strength values to new generation """
-        for ind1, arch_ind1 in zip(inds, arch_inds):
-            for ind2, arch_ind2 in zip(inds, arch_inds):
-
-                if compare_targets(ind1, ind2) \
-                        or compare_targets(ind1, arch_ind2):
-                    ind1.fitness.strength += 1
-
-                if compare_targets(arch_ind1, ind2) \
-                        or compare_targets(arch_ind1, arch_ind2):
-                    arch_ind1.arch_fitness.strength += 1
+        """
+        Assign strength values to new generation and archive. Strength
+        is the number of individuals in the generation and the archive
+        that the individual dominates.
+        """
+        for ind1 in inds:
+            ind1.fitness.strength += sum(
+                compare_targets(ind1, ind2) for ind2 in inds)
+            ind1.fitness.strength += sum(
+                compare_targets(ind1, arch_ind2) for arch_ind2 in arch_inds)
+
+        for arch_ind1 in arch_inds:
+            arch_ind1.arch_fitness.strength += sum(
+                compare_targets(arch_ind1, ind2) for ind2 in inds)
+            arch_ind1.arch_fitness.strength += sum(
+                compare_targets(arch_ind1, arch_ind2) for arch_ind2 in arch_inds)
 
     @staticmethod
     def _assign_rawfitness(inds, arch_inds):
         """ Assign rawfitness values to new generation """
-        for ind1, arch_ind1 in zip(inds, arch_inds):
-            for ind2, arch_ind2 in zip(inds, arch_inds):
-
+        for ind1 in inds:
+            for ind2 in inds:
                 if compare_targets(ind2, ind1):
                     ind1.fitness.rawfitness += ind2.fitness.strength
-
+            for arch_ind2 in arch_inds:
                 if compare_targets(arch_ind2, ind1):
                     ind1.fitness.rawfitness += arch_ind2.arch_fitness.strength
 
+        for arch_ind1 in arch_inds:
+            for ind2 in inds:
                 if compare_targets(ind2, arch_ind1):
                     arch_ind1.arch_fitness.rawfitness += ind2.fitness.strength
-
+            for arch_ind2 in arch_inds:
                 if compare_targets(arch_ind2, arch_ind1):
                     arch_ind1.arch_fitness.rawfitness += arch_ind2.arch_fitness.strength
 
@@ -150,13 +160,14 @@ class FitnessAssigner:
             normalize_arc (List[float]): the highest values for each targets among
                 individuals in archive.
         """
-        for ind1, arch_ind1 in zip(inds, arch_inds):
-            d1 = [0.0] * len(inds)
-            d2 = [0.0] * len(inds)
-            for j, arch_ind2 in enumerate(arch_inds):
-                d1[j] = calculate_distance(ind1, arch_ind2, normalize)
-                d2[j] = calculate_distance(arch_ind1, arch_ind2, normalize_arc)
-            ind1.fitness.distance = min(d1)
+        for ind1 in inds:
+            ind1.fitness.distance = min(
+                calculate_distance(ind1, arch_ind2, normalize)
+                for arch_ind2 in arch_inds)
+
+        for arch_ind1 in arch_inds:
+            d2 = [calculate_distance(arch_ind1, arch_ind2, normalize_arc)
+                  for arch_ind2 in arch_inds]
             arch_ind1.arch_fitness.distance = nsmallest(2, d2)[-1]
 
     @staticmethod
@@ -166,13 +177,14 @@ class FitnessAssigner:
         normalize_rawfitness_arch = max(
             [ind.fitness.rawfitness for ind in arch_inds])
 
-        for ind, arch_ind in zip(inds, arch_inds):
+        for ind in inds:
             ind.fitness.fitness = calculate_fitness_value(
                 ind.fitness,
                 normalize_rawfitness,
                 kii
             )
 
+        for arch_ind in arch_inds:
             arch_ind.arch_fitness.fitness = calculate_fitness_value(
                 arch_ind.arch_fitness,
                 normalize_rawfitness_arch,
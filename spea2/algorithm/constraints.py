@@ -0,0 +1,374 @@
+import ast
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..IC import OP_FIELDS
+
+_COMPARISONS = {ast.GtE: 'min', ast.Gt: 'min', ast.LtE: 'max', ast.Lt: 'max'}
+
+
+def phase_margin(himg, hreal):
+    """ Vectorized AnalogCircuit.pm """
+    himg = np.asarray(himg, dtype=float)
+    hreal = np.asarray(hreal, dtype=float)
+    same_sign = ((himg > 0) & (hreal > 0)) | ((himg < 0) & (hreal < 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pm = np.arctan(himg / hreal) * (180 / math.pi)
+    pm = np.where(same_sign, pm, np.where((himg > 0) & (hreal < 0), 0.1, 10.0))
+    return np.where(np.isnan(himg) | np.isnan(hreal), np.nan, pm)
+
+
+# Quantities which are calculated from the outputs instead of being
+# read from the circuits: name -> (outputs, function of the outputs)
+DERIVED = {
+    'pm': (('himg', 'hreal'), phase_margin),
+}
+
+
+class Expression:
+    """
+    Arithmetic expression of named columns which is compiled once and
+    evaluated on numpy arrays.
+
+    Expressions may use names, numbers, arithmetic operators and the
+    functions in FUNCTIONS, e.g. 'gain - 20*log10(bw)'.
+
+    Args:
+        source (Union[str, ast.Expression]): the expression.
+        allowed_names (Sequence[str]): if given, the only names the
+            expression may use.
+    """
+
+    FUNCTIONS = {
+        'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log,
+        'log10': np.log10, 'arctan': np.arctan, 'degrees': np.degrees,
+        'minimum': np.minimum, 'maximum': np.maximum,
+    }
+    _NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name,
+              ast.Load, ast.Constant, ast.operator, ast.unaryop)
+
+    def __init__(self, source, allowed_names=None):
+        if isinstance(source, ast.Expression):
+            tree, self.source = source, ast.unparse(source)
+        else:
+            self.source = source.strip()
+            tree = self._parse(self.source)
+        self.names = self._validate(tree, allowed_names)
+        self._code = compile(tree, '<constraint>', 'eval')
+
+    @staticmethod
+    def _parse(source) -> ast.Expression:
+        try:
+            return ast.parse(source, mode='eval')
+        except SyntaxError:
+            raise ValueError(f"Can not parse the expression {source}") from None
+
+    def _validate(self, tree, allowed_names) -> List[str]:
+        """ Check the expression and return the names it uses in order. """
+        names = []
+        for node in ast.walk(tree):
+            if not isinstance(node, self._NODES):
+                raise ValueError(f"{type(node).__name__} is not allowed in "
+                                 f"the expression {self.source}")
+            if isinstance(node, ast.Call) and not (
+                    isinstance(node.func, ast.Name) and node.func.id in self.FUNCTIONS):
+                raise ValueError(f"Only {list(self.FUNCTIONS)} can be called in "
+                                 f"the expression {self.source}")
+            if isinstance(node, ast.Name) and node.id not in self.FUNCTIONS:
+                if allowed_names is not None and node.id not in allowed_names:
+                    raise ValueError(f"{node.id} is not one of {list(allowed_names)}")
+                names.append((node.col_offset, node.id))
+        return list(dict.fromkeys(name for _, name in sorted(names)))
+
+    def __repr__(self):
+        return self.source
+
+    def __call__(self, columns: Dict[str, np.ndarray]):
+        namespace = {name: columns[name] for name in self.names}
+        namespace.update(self.FUNCTIONS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return eval(self._code, {'__builtins__': {}}, namespace)
+
+
+class Constraint:
+    """
+    Lower ('min') or upper ('max') limit of an expression of the
+    outputs. The error of a violating circuit is its distance to the
+    limit relative to the limit, circuits whose expression can not be
+    evaluated, e.g. missing outputs, get infinite error.
+
+    Args:
+        expression (Union[str, Expression]): expression of the outputs.
+        operation (str): 'min' if the expression should be at least
+            constant, 'max' if at most.
+        constant (float): limit of the expression.
+    """
+
+    def __init__(self, expression, operation: str, constant: float):
+        if operation not in ('min', 'max'):
+            raise ValueError(f"Operation should be 'max or 'min' "
+                             f"but given {operation}")
+        self.expression = expression if isinstance(expression, Expression) \
+            else self._expression(expression)
+        self.operation = operation
+        self.constant = float(constant)
+        # Relative error as before, but a negative or zero limit
+        # should not make the error negative or infinite.
+        self.scale = abs(self.constant) if self.constant != 0 else 1.0
+
+    def _expression(self, source) -> Expression:
+        return Expression(source)
+
+    @classmethod
+    def parse(cls, source: str):
+        """
+        Create from a comparison such as 'pm >= 45' or
+        'gain - 20*log10(bw) > -100'. If the right side is not a
+        number, it is moved to the left side and compared with 0.
+        """
+        tree = Expression._parse(source)
+        comparison = tree.body
+        if not isinstance(comparison, ast.Compare) or len(comparison.ops) != 1 \
+                or type(comparison.ops[0]) not in _COMPARISONS:
+            raise ValueError(f"Constraint should be like 'pm >= 45' or "
+                             f"'zsarea <= 5e-9' but given {source}")
+        operation = _COMPARISONS[type(comparison.ops[0])]
+        left, right = comparison.left, comparison.comparators[0]
+        try:
+            constant = float(ast.literal_eval(right))
+        except ValueError:
+            left = ast.BinOp(left=left, op=ast.Sub(), right=right)
+            constant = 0.0
+        return cls(Expression(ast.fix_missing_locations(ast.Expression(left))),
+                   operation, constant)
+
+    def __repr__(self):
+        sign = '>=' if self.operation == 'min' else '<='
+        return f"{self.expression} {sign} {self.constant:g}"
+
+    @property
+    def names(self) -> List[str]:
+        return self.expression.names
+
+    def violation(self, values) -> np.ndarray:
+        """ Relative violation of each value, 0 if satisfied. """
+        values = np.asarray(values, dtype=float)
+        if self.operation == 'min':
+            violation = self.constant - values
+        else:
+            violation = values - self.constant
+        return np.maximum(violation, 0) / self.scale
+
+    def error(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        error = self.violation(self.expression(columns))
+        return np.where(np.isnan(error), np.inf, error)
+
+
+class OperatingPointConstraint(Constraint):
+    """
+    Constraint on an expression of the operating point fields which is
+    checked for each transistor, e.g. saturation margin
+
+        OperatingPointConstraint('Vds - Vdsat', 'min', 0.05)
+
+    The expression may use the names in IC.OP_FIELDS, each of them is
+    taken from the last axis of the operating point array, so any
+    number of circuits is evaluated at once.
+
+    Args:
+        transistors (List[int]): numbers of the transistors, 1 for M1,
+            which are constrained. None for all of them.
+    """
+
+    def __init__(self, expression, operation: str, constant: float,
+                 transistors: Optional[List[int]] = None):
+        super().__init__(expression, operation, constant)
+        self.transistors = None if transistors is None \
+            else np.asarray(transistors, dtype=int) - 1
+
+    def _expression(self, source) -> Expression:
+        return Expression(source, OP_FIELDS)
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> List["OperatingPointConstraint"]:
+        """
+        Create the constraints from the 'operating_point' section of
+        the constraints, i.e. expression -> {min or max: constant,
+        transistors: [...]}.
+        """
+        constraints = []
+        for expression, limits in (config or {}).items():
+            limits = dict(limits)
+            transistors = limits.pop('transistors', None)
+            for operation, constant in limits.items():
+                constraints.append(cls(expression, operation, constant, transistors))
+        return constraints
+
+    def evaluate(self, op: np.ndarray) -> np.ndarray:
+        """
+        Value of the expression for each transistor.
+
+        Args:
+            op (numpy.ndarray): (..., transistor_number, 12) operating point.
+
+        Returns:
+            numpy.ndarray: (..., number of constrained transistors) values.
+        """
+        op = np.asarray(op)
+        if self.transistors is not None:
+            op = op[..., self.transistors, :]
+        columns = {name: op[..., i] for i, name in enumerate(OP_FIELDS)}
+        return np.broadcast_to(self.expression(columns), op.shape[:-1])
+
+    def error(self, op: np.ndarray) -> np.ndarray:
+        """
+        Sum of the violations of the transistors. Missing operating
+        points, i.e. nan, are not counted.
+
+        Returns:
+            numpy.ndarray: (...) error of each circuit, 0 if satisfied.
+        """
+        violation = self.violation(self.evaluate(op))
+        return np.nansum(violation, axis=-1)
+
+
+class ConstraintSet:
+    """
+    All of the constraints which are compiled once and evaluated on
+    the outputs of a whole generation at once.
+
+    Args:
+        constraints (List[Constraint]): constraints of the outputs.
+        operating_point_constraints (List[OperatingPointConstraint]):
+            constraints of the operating points of the transistors.
+    """
+
+    def __init__(self, constraints=(), operating_point_constraints=()):
+        self.constraints = list(constraints)
+        self.operating_point_constraints = list(operating_point_constraints)
+
+    @classmethod
+    def from_config(cls, config) -> "ConstraintSet":
+        """
+        Create from the constraints section of the SPEA2 configuration.
+        It is either a list of comparisons
+
+            - pm >= 45
+            - gain - 20*log10(bw) >= -100
+            - operating_point: {Vds - Vdsat: {min: 0.05}}
+
+        or output -> {min or max: constant} as well as an
+        'operating_point' section.
+        """
+        constraints, op_config = [], {}
+        if isinstance(config, dict):
+            config = [{name: limits} for name, limits in config.items()]
+        for item in config or []:
+            if isinstance(item, str):
+                constraints.append(Constraint.parse(item))
+                continue
+            for name, limits in item.items():
+                if name == 'operating_point':
+                    op_config.update(limits)
+                else:
+                    constraints.extend(Constraint(name, operation, constant)
+                                       for operation, constant in limits.items())
+        return cls(constraints, OperatingPointConstraint.from_config(op_config))
+
+    def __len__(self):
+        return len(self.constraints) + len(self.operating_point_constraints)
+
+    def __repr__(self):
+        return f"ConstraintSet({self.constraints + self.operating_point_constraints})"
+
+    @property
+    def names(self) -> List[str]:
+        """ Names used by the expressions. """
+        names = []
+        for constraint in self.constraints:
+            names.extend(n for n in constraint.names if n not in names)
+        return names
+
+    @property
+    def output_names(self) -> List[str]:
+        """ Outputs to be read from the circuits, derived ones expanded. """
+        outputs = []
+        for name in self.names:
+            for output in DERIVED[name][0] if name in DERIVED else (name,):
+                if output not in outputs:
+                    outputs.append(output)
+        return outputs
+
+    def columns(self, circuits) -> Dict[str, np.ndarray]:
+        """ Output matrix of the circuits as name -> (n,) array. """
+        columns = {name: np.array([_get(cct, name) for cct in circuits], dtype=float)
+                   for name in self.output_names}
+        for name in self.names:
+            if name in DERIVED:
+                outputs, function = DERIVED[name]
+                columns[name] = function(*(columns[o] for o in outputs))
+        return columns
+
+    def total_error(self, columns: Dict[str, np.ndarray],
+                    operating_points: Optional[np.ndarray] = None,
+                    n: Optional[int] = None) -> np.ndarray:
+        """
+        Sum of the errors of all constraints.
+
+        Args:
+            columns (Dict[str, numpy.ndarray]): see columns.
+            operating_points (numpy.ndarray): (n, transistor_number, 12)
+                operating points. Required if there are operating point
+                constraints.
+            n (int): number of circuits, if columns is empty.
+
+        Returns:
+            numpy.ndarray: (n,) total error of each circuit.
+        """
+        if n is None:
+            n = len(next(iter(columns.values())))
+        total_error = np.zeros(n)
+        for constraint in self.constraints:
+            total_error += constraint.error(columns)
+        for constraint in self.operating_point_constraints:
+            total_error += constraint.error(operating_points)
+        return total_error
+
+    def evaluate(self, inds) -> np.ndarray:
+        """
+        Total error of the individuals. Circuits simulated at several
+        corners have their error aggregated over the corners, see
+        corners.CornerSet.
+        """
+        circuits = [ind.circuit for ind in inds]
+        total_error = self.evaluate_circuits(circuits)
+        for n, circuit in enumerate(circuits):
+            corner_error = getattr(circuit, 'corner_error', None)
+            if corner_error is not None:
+                total_error[n] = corner_error
+        return total_error
+
+    def evaluate_circuits(self, circuits) -> np.ndarray:
+        """ Total error of the circuits computed from their outputs. """
+        operating_points = None
+        if self.operating_point_constraints:
+            operating_points = _stack_operating_points(circuits)
+        return self.total_error(self.columns(circuits), operating_points,
+                                n=len(circuits))
+
+
+def _get(circuit, name):
+    value = getattr(circuit, name, None)
+    return np.nan if value is None else value
+
+
+def _stack_operating_points(circuits) -> np.ndarray:
+    ops = [getattr(cct, 'operating_point', None) for cct in circuits]
+    shape = next((op.shape for op in ops if op is not None), (0, len(OP_FIELDS)))
+    stacked = np.full((len(circuits),) + shape, np.nan, dtype=np.float32)
+    for n, op in enumerate(ops):
+        if op is not None:
+            stacked[n] = op
+    return stacked
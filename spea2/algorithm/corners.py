@@ -0,0 +1,277 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .constraints import ConstraintSet
+from .workers import JobCancelled
+
+
+class Corner:
+    """
+    Condition to simulate a circuit at, i.e. values of the corner
+    parameters which are written to the .PARAM block next to the
+    topology, e.g. Corner('ss', {'temp': 125, 'vdd': 1.08}).
+    """
+
+    __slots__ = ("name", "values")
+
+    def __init__(self, name: str, values: Dict[str, float]):
+        self.name = name
+        self.values = {key: float(value) for key, value in values.items()}
+
+    def __repr__(self):
+        return f"Corner({self.name}, {self.values})"
+
+
+class CornerSet:
+    """
+    PVT corners and Monte Carlo samples each circuit is simulated at.
+
+    The results of the corners of a circuit are aggregated into the
+    circuit: each target is the worst, or the percentile, over the
+    corners, the constraint error is the worst or percentile error of
+    the corners and the other outputs are those of the corner with the
+    largest error. The outputs of every corner are kept as the
+    (corners, outputs) array circuit.corner_outputs.
+
+    Args:
+        corners (List[Corner]): corners, all with the same parameters.
+        targets (dict): target -> 'max' or 'min'.
+        constraint_set (constraints.ConstraintSet): constraints whose
+            error is aggregated.
+        aggregate (str): 'worst' or 'percentile'.
+        percentile (float): between 0 and 100, the percentage of the
+            corners at which the aggregated value is met.
+        hard_constraints (constraints.ConstraintSet): once a corner of a
+            circuit violates one of them, the remaining corners of the
+            circuit are not simulated. With the percentile aggregate,
+            only once more corners violate them than the percentile
+            allows, see tolerated. None disables early abort.
+    """
+
+    AGGREGATES = ('worst', 'percentile')
+
+    def __init__(self, corners: List[Corner], targets: dict,
+                 constraint_set: ConstraintSet, aggregate: str = 'worst',
+                 percentile: float = 90.0,
+                 hard_constraints: Optional[ConstraintSet] = None):
+        if aggregate not in self.AGGREGATES:
+            raise ValueError(f"aggregate should be one of {self.AGGREGATES} "
+                             f"but given {aggregate}")
+        if not corners:
+            raise ValueError("At least one corner should be given.")
+        names = set(corners[0].values)
+        for corner in corners:
+            if set(corner.values) != names:
+                raise ValueError(f"Corner {corner.name} should set the parameters "
+                                 f"{sorted(names)}, not {sorted(corner.values)}.")
+        self.corners = list(corners)
+        self.targets = targets
+        self.constraint_set = constraint_set
+        self.aggregate_mode = aggregate
+        self.percentile = percentile
+        self.hard_constraints = hard_constraints
+
+    @classmethod
+    def from_config(cls, spea2_config: dict, constraint_set: ConstraintSet):
+        """
+        Create from the 'corners' section of the SPEA2 configuration.
+        Returns None if it is not given.
+        """
+        config = spea2_config.get("corners", None)
+        if not config:
+            return None
+        corners = [Corner(name, values)
+                   for name, values in (config.get("conditions") or {}).items()]
+        monte_carlo = config.get("monte_carlo")
+        if monte_carlo:
+            monte_carlo = dict(monte_carlo)
+            monte_carlo.setdefault("seed", spea2_config.get("seed"))
+            nominal = corners[0].values if corners else {}
+            corners.extend(cls.monte_carlo(nominal, **monte_carlo))
+
+        hard_constraints = None
+        if config.get("early_abort", True):
+            hard_constraints = constraint_set
+            if config.get("hard_constraints") is not None:
+                hard_constraints = ConstraintSet.from_config(config["hard_constraints"])
+        return cls(corners, spea2_config["targets"], constraint_set,
+                   config.get("aggregate", 'worst'), config.get("percentile", 90.0),
+                   hard_constraints)
+
+    @staticmethod
+    def monte_carlo(nominal: Dict[str, float], samples: int, parameters: dict,
+                    seed=None) -> List[Corner]:
+        """
+        Draw the Monte Carlo corners once, so that every circuit is
+        simulated at the same samples.
+
+        Args:
+            nominal (Dict[str, float]): values of the parameters which
+                are not drawn.
+            samples (int): number of corners.
+            parameters (dict): name -> {mean: value, sigma: value} of the
+                normally distributed parameters. mean defaults to the
+                nominal value.
+            seed (int): seed of the samples.
+        """
+        rng = np.random.default_rng(seed)
+        drawn = {}
+        for name, distribution in parameters.items():
+            mean = distribution.get("mean", nominal.get(name))
+            if mean is None:
+                raise ValueError(f"Monte Carlo parameter {name} has no mean.")
+            drawn[name] = rng.normal(mean, distribution["sigma"], samples)
+        return [Corner(f"mc-{k}", dict(nominal, **{name: values[k]
+                                                   for name, values in drawn.items()}))
+                for k in range(samples)]
+
+    def __len__(self):
+        return len(self.corners)
+
+    def __repr__(self):
+        return f"CornerSet({[corner.name for corner in self.corners]})"
+
+    @staticmethod
+    def job(circuit, corner: Corner):
+        """ Copy of the circuit to simulate at the corner. """
+        job = type(circuit).from_trusted(circuit.parameters)
+        job.corner = corner.values
+        return job
+
+    @property
+    def tolerated(self) -> int:
+        """
+        Number of corners of a circuit which can violate the hard
+        constraints before its remaining corners are skipped, i.e.
+        those above the percentile of the errors.
+        """
+        if self.aggregate_mode == 'worst':
+            return 0
+        return len(self.corners) - 1 - math.ceil(self.percentile / 100 * (len(self.corners) - 1))
+
+    def violates_hard(self, job) -> bool:
+        if self.hard_constraints is None:
+            return False
+        return bool(self.hard_constraints.evaluate_circuits([job])[0] > 0)
+
+    def _aggregate(self, values: np.ndarray, worst: str) -> float:
+        """ Worst or percentile value, worst being 'min' or 'max'. """
+        values = np.sort(values)
+        if self.aggregate_mode == 'worst':
+            return float(values[0] if worst == 'min' else values[-1])
+        position = self.percentile / 100 * (len(values) - 1)
+        if worst == 'min':
+            return float(values[len(values) - 1 - math.ceil(position)])
+        return float(values[math.ceil(position)])
+
+    def aggregate(self, circuit, jobs: list, outcomes: list):
+        """
+        Set the aggregated results of the corners to the circuit.
+
+        Args:
+            circuit (Circuit): circuit whose corners are simulated.
+            jobs (List[Circuit]): the circuit at each corner.
+            outcomes (List[Optional[BaseException]]): None for the
+                simulated corners, the others are not used.
+        """
+        simulated = [n for n, outcome in enumerate(outcomes) if outcome is None]
+        if not simulated:
+            raise ValueError("None of the corners is simulated.")
+        sim_jobs = [jobs[n] for n in simulated]
+
+        errors = self.constraint_set.evaluate_circuits(sim_jobs)
+        circuit.copy_results(sim_jobs[int(np.argmax(errors))])
+        circuit.corner = None
+        for target, operation in self.targets.items():
+            values = np.array([getattr(job, target) for job in sim_jobs], dtype=float)
+            setattr(circuit, target,
+                    self._aggregate(values, 'min' if operation == 'max' else 'max'))
+        circuit.corner_error = self._aggregate(errors, 'max')
+
+        outputs = circuit.PROPERTIES["output"]
+        corner_outputs = np.full((len(jobs), len(outputs)), np.nan)
+        for n, job in zip(simulated, sim_jobs):
+            corner_outputs[n] = [getattr(job, name, np.nan) for name in outputs]
+        circuit.corner_outputs = corner_outputs
+
+
+class CornerPool:
+    """
+    Worker pool which simulates each circuit at every corner of the
+    corner set and aggregates the results into the circuit. It is used
+    in place of workers.WorkerPool.
+
+    The jobs are dispatched corner by corner, so the later corners of a
+    circuit which already violates a hard constraint at more corners
+    than CornerSet.tolerated, or fails, at the first ones are still
+    pending and are skipped.
+
+    Args:
+        workers (workers.WorkerPool): folders and threads.
+        corner_set (CornerSet): corners to simulate at.
+    """
+
+    def __init__(self, workers, corner_set: CornerSet):
+        self.workers = workers
+        self.corner_set = corner_set
+        # Corner simulations skipped or left unused by early abort
+        self.aborted = 0
+
+    @property
+    def dispatched(self) -> int:
+        return self.workers.dispatched
+
+    @property
+    def runtime(self) -> float:
+        return self.workers.runtime
+
+    @property
+    def monitor(self):
+        return self.workers.monitor
+
+    def close(self):
+        self.workers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, circuits) -> List[Optional[BaseException]]:
+        """
+        Simulate the circuits at every corner.
+
+        Returns:
+            List[Optional[BaseException]]: None for each circuit which is
+                simulated, the exception of the first failed corner of
+                the failed ones.
+        """
+        n = len(circuits)
+        jobs = [self.corner_set.job(circuit, corner)
+                for corner in self.corner_set.corners for circuit in circuits]
+
+        violations = [0] * n
+
+        def cancel(index, exception):
+            if exception is None:
+                if not self.corner_set.violates_hard(jobs[index]):
+                    return ()
+                violations[index % n] += 1
+                if violations[index % n] <= self.corner_set.tolerated:
+                    return ()
+            return range(index % n, len(jobs), n)
+
+        outcomes = self.workers.run(jobs, cancel)
+        results = []
+        for i, circuit in enumerate(circuits):
+            group = outcomes[i::n]
+            failure = next((outcome for outcome in group if outcome is not None
+                            and not isinstance(outcome, JobCancelled)), None)
+            if failure is None:
+                self.aborted += sum(isinstance(outcome, JobCancelled) for outcome in group)
+                self.corner_set.aggregate(circuit, jobs[i::n], group)
+            results.append(failure)
+        return results
@@ -0,0 +1,341 @@
+import multiprocessing
+import pickle
+import threading
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from ..IC import AnalogCircuit, Circuit, DigitalCircuit, OP_FIELDS, SimulationFailedError
+from .workers import WorkerMonitor, WorkerPool
+
+
+class SharedBatch:
+    """
+    Parameters and outputs of a batch of circuits in one block of
+    shared memory, a row per circuit. The simulation processes get the
+    layout of the block once, as the header, and then only the row of
+    each circuit, and write its outputs into the row in place.
+
+    The first half of the rows are the circuits of the batch and the
+    second half their speculative copies, so that a straggler and its
+    copy do not write the same row.
+
+    Layout, each array aligned to 8 bytes:
+
+        parameters   (rows, topology + corner parameters) float64
+        screening    (rows,) uint8, 1 for low fidelity jobs
+        outputs      (rows, outputs) float64, nan if not measured
+        op           (rows, transistors, 12) float32, if captured
+
+    Args:
+        header (dict): layout of the block, see create.
+        shm (multiprocessing.shared_memory.SharedMemory): the block.
+    """
+
+    def __init__(self, header: dict, shm: shared_memory.SharedMemory):
+        self.header = header
+        self.shm = shm
+        self.name = shm.name
+        self.arrays = {}
+        offset = 0
+        for field, shape, dtype in self.fields(header):
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self.arrays[field] = np.ndarray(shape, dtype, shm.buf, offset)
+            offset += -(-size // 8) * 8
+        self.parameters = self.arrays["parameters"]
+        self.screening = self.arrays["screening"]
+        self.outputs = self.arrays["outputs"]
+        self.operating_point = self.arrays.get("op")
+        # Jobs of the batch in flight, the block is released after the last one.
+        self.active = 0
+        self.closed = False
+
+    @staticmethod
+    def fields(header: dict) -> list:
+        rows = header["rows"]
+        fields = [("parameters", (rows, header["topology"] + len(header["corner"])), np.float64),
+                  ("screening", (rows,), np.uint8),
+                  ("outputs", (rows, len(header["outputs"])), np.float64)]
+        if header["transistors"]:
+            fields.append(("op", (rows, header["transistors"], len(OP_FIELDS)), np.float32))
+        return fields
+
+    @classmethod
+    def nbytes(cls, header: dict) -> int:
+        return sum(-(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8
+                   for _, shape, dtype in cls.fields(header))
+
+    @classmethod
+    def create(cls, circuits, outputs: List[str], transistors: int = 0) -> "SharedBatch":
+        """
+        Block of the circuits, their parameters and conditions written.
+
+        Args:
+            circuits (List[Circuit]): circuits of the batch.
+            outputs (List[str]): names of the outputs.
+            transistors (int): number of transistors whose operating
+                points are captured, 0 if they are not.
+        """
+        n = len(circuits)
+        corner = []
+        fidelity = None
+        for circuit in circuits:
+            for name in getattr(circuit, 'corner', None) or ():
+                if name not in corner:
+                    corner.append(name)
+            if fidelity is None:
+                fidelity = getattr(circuit, 'fidelity', None)
+        topology = len(circuits[0].parameters) if n else 0
+        header = {"rows": 2 * n, "topology": topology, "corner": corner,
+                  "outputs": list(outputs), "transistors": transistors,
+                  "fidelity": fidelity}
+        shm = shared_memory.SharedMemory(create=True, size=max(cls.nbytes(header), 1))
+        header["name"] = shm.name
+        batch = cls(header, shm)
+        if n:
+            parameters = batch.parameters[:n]
+            parameters[:, :topology] = np.stack([circuit.parameters for circuit in circuits])
+            parameters[:, topology:] = np.nan
+            for k, circuit in enumerate(circuits):
+                for name, value in (getattr(circuit, 'corner', None) or {}).items():
+                    parameters[k, topology + corner.index(name)] = value
+                batch.screening[k] = getattr(circuit, 'fidelity', None) is not None
+            batch.parameters[n:] = parameters
+            batch.screening[n:] = batch.screening[:n]
+        return batch
+
+    @classmethod
+    def attach(cls, header: dict) -> "SharedBatch":
+        """ Block created by another process. """
+        return cls(header, shared_memory.SharedMemory(name=header["name"]))
+
+    def circuit(self, row: int, circuit_type):
+        """ Circuit of the row to simulate, in the simulation process. """
+        topology = self.header["topology"]
+        circuit = circuit_type.from_trusted(self.parameters[row, :topology].copy())
+        corner = {name: float(value) for name, value in
+                  zip(self.header["corner"], self.parameters[row, topology:])
+                  if not np.isnan(value)}
+        circuit.corner = corner or None
+        if self.screening[row]:
+            circuit.fidelity = self.header["fidelity"]
+        return circuit
+
+    def write(self, row: int, circuit):
+        """ Write the outputs of the simulated circuit into its row. """
+        self.outputs[row] = [getattr(circuit, name, np.nan) for name in self.header["outputs"]]
+        if self.operating_point is not None:
+            op = getattr(circuit, 'operating_point', None)
+            self.operating_point[row] = np.nan if op is None else op
+
+    def read(self, row: int, circuit):
+        """ Set the outputs written into the row to the circuit. """
+        for name, value in zip(self.header["outputs"], self.outputs[row]):
+            if not np.isnan(value):
+                setattr(circuit, name, float(value))
+        if self.operating_point is not None and not np.isnan(self.operating_point[row]).all():
+            circuit.operating_point = self.operating_point[row].copy()
+
+    def close(self):
+        self.arrays = self.parameters = self.screening = self.outputs = None
+        self.operating_point = None
+        self.shm.close()
+
+    def release(self):
+        """ Close and remove the block, by the process which created it. """
+        self.close()
+        self.shm.unlink()
+
+
+def _serve(conn, circuit_config: dict, path: str):
+    """
+    Simulation process of one folder. Each message is the row of a
+    circuit and, for the first row of a batch, the header of the
+    batch. The reply is None or the kind and message of the failure.
+    """
+    Circuit.PROPERTIES = circuit_config
+    circuit_type = AnalogCircuit if circuit_config["type"] == 'analog' else DigitalCircuit
+    batch = None
+    try:
+        while True:
+            message = pickle.loads(conn.recv_bytes())
+            if message is None:
+                return
+            row, header = message
+            if header is not None:
+                if batch is not None:
+                    batch.close()
+                batch = SharedBatch.attach(header)
+            circuit = batch.circuit(row, circuit_type)
+            try:
+                circuit.simulate(path, None)
+                batch.write(row, circuit)
+                reply = None
+            except SimulationFailedError as e:
+                reply = ('failed', e.message)
+            except Exception as e:
+                reply = ('error', repr(e))
+            conn.send_bytes(pickle.dumps(reply))
+    except (EOFError, KeyboardInterrupt):
+        return
+    finally:
+        if batch is not None:
+            batch.close()
+        conn.close()
+
+
+class ProcessWorkerPool(WorkerPool):
+    """
+    Worker pool whose circuits are simulated by a process per folder
+    instead of in the threads of the main process, e.g. for simulators
+    which hold the GIL or are not thread safe.
+
+    The parameters of each run are written into a SharedBatch and the
+    processes are sent only the rows of the circuits, so the messages
+    of a job are a few dozen bytes regardless of the population size
+    and no Circuit or Individual is pickled. The threads of WorkerPool
+    dispatch the jobs and wait for the processes, so the straggler
+    handling and the quarantine work as they do for the threads.
+
+    Only the outputs of the configuration, and the operating point if
+    it is captured, are passed back from the processes.
+
+    Args:
+        path (str): see WorkerPool.
+        multithread (int): number of folders and processes.
+        monitor (WorkerMonitor): see WorkerPool.
+        repair (Callable[[str], None]): see WorkerPool.
+        circuit_config (dict): Circuit configuration the processes
+            simulate with.
+        join_timeout (float): seconds to wait for a process to stop at
+            close before it is terminated.
+    """
+
+    def __init__(self, path: str, multithread: int = 1,
+                 monitor: Optional[WorkerMonitor] = None,
+                 repair: Optional[Callable[[str], None]] = None,
+                 circuit_config: dict = None, join_timeout: float = 1.0):
+        super().__init__(path, multithread, monitor, repair)
+        self.circuit_config = Circuit.PROPERTIES if circuit_config is None else circuit_config
+        self.join_timeout = join_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._batch_lock = threading.Lock()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.jobs = 0
+        self.restarts = 0
+        self._closed = False
+        self._processes = [None] * len(self.paths)
+        self._connections = [None] * len(self.paths)
+        # Name of the batch each process is attached to.
+        self._attached = [None] * len(self.paths)
+        for worker in range(len(self.paths)):
+            self._start(worker)
+
+    def _start(self, worker: int):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve, name=f"spea2-simulation-{worker}",
+            args=(child, self.circuit_config, self.paths[worker]), daemon=True)
+        process.start()
+        child.close()
+        self._processes[worker] = process
+        self._connections[worker] = parent
+        self._attached[worker] = None
+
+    def close(self):
+        """ Stop the processes, terminating those still simulating stragglers. """
+        super().close()
+        self._closed = True
+        for conn in self._connections:
+            try:
+                conn.send_bytes(pickle.dumps(None))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(self.join_timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for conn in self._connections:
+            conn.close()
+
+    def summary(self) -> dict:
+        with self._batch_lock:
+            jobs = max(self.jobs, 1)
+            return {"jobs": self.jobs, "bytes_sent": self.bytes_sent,
+                    "bytes_received": self.bytes_received,
+                    "bytes_per_job": (self.bytes_sent + self.bytes_received) / jobs,
+                    "restarts": self.restarts}
+
+    def report(self) -> str:
+        """ Human readable summary for the end of the run. """
+        summary = self.summary()
+        return (f"Simulation processes: {summary['jobs']} jobs, "
+                f"{summary['bytes_per_job']:.1f} bytes of messages per job, "
+                f"restarted {summary['restarts']} times")
+
+    def run(self, circuits, cancel: Optional[Callable] = None
+            ) -> List[Optional[BaseException]]:
+        """ See WorkerPool.run. """
+        transistors = 0
+        if self.circuit_config.get("operating_point", False):
+            transistors = self.circuit_config["transistor_number"]
+        batch = SharedBatch.create(circuits, self.circuit_config["output"], transistors)
+        self._local.batch = (batch, circuits)
+        try:
+            return super().run(circuits, cancel)
+        finally:
+            self._local.batch = None
+            with self._batch_lock:
+                batch.closed = True
+                if batch.active == 0:
+                    batch.release()
+
+    def _simulation(self, circuit, index) -> Callable[[int], None]:
+        batch, circuits = self._local.batch
+        row = index if circuit is circuits[index] else len(circuits) + index
+        with self._batch_lock:
+            batch.active += 1
+
+        def simulation(worker):
+            try:
+                self._remote(batch, row, circuit, worker)
+            finally:
+                with self._batch_lock:
+                    batch.active -= 1
+                    if batch.closed and batch.active == 0:
+                        batch.release()
+        return simulation
+
+    def _remote(self, batch: SharedBatch, row: int, circuit, worker: int):
+        """ Simulate the row in the process of the worker and read its outputs. """
+        header = None
+        if self._attached[worker] != batch.name:
+            header = batch.header
+        message = pickle.dumps((row, header))
+        conn = self._connections[worker]
+        try:
+            conn.send_bytes(message)
+            self._attached[worker] = batch.name
+            reply = conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            if not self._closed:
+                with self._batch_lock:
+                    self.restarts += 1
+                self._processes[worker].join(self.join_timeout)
+                self._start(worker)
+            raise RuntimeError(f"Simulation process of {self.paths[worker]} "
+                               f"stopped.") from e
+        with self._batch_lock:
+            self.jobs += 1
+            self.bytes_sent += len(message)
+            self.bytes_received += len(reply)
+        reply = pickle.loads(reply)
+        if reply is None:
+            batch.read(row, circuit)
+        elif reply[0] == 'failed':
+            raise SimulationFailedError(reply[1])
+        else:
+            raise RuntimeError(f"Unexpected error occured! {reply[1]}")
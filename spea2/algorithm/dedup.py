@@ -0,0 +1,123 @@
+from collections import deque
+
+import numpy as np
+
+
+class DuplicateIndex:
+    """
+    Hash index over quantized parameter vectors which is used to
+    eliminate duplicated offspring before they are simulated.
+    Parameters are normalized between lower and upper bound and
+    rounded to the resolution, so near-duplicates share the same key.
+
+    The index covers the generation being produced, the archive of
+    the last generation and the simulated individuals of the last
+    `history` generations.
+
+    Args:
+        lower_bound (List[float]): lower bound of the parameters.
+        upper_bound (List[float]): upper bound of the parameters.
+        policy (str): what to do when an offspring was simulated before.
+            'regenerate' discards it and produces another one, 'reuse'
+            copies the results of the simulated circuit.
+        resolution (float): quantization step relative to the range
+            of each parameter.
+        history (int): number of past generations to look up.
+        max_attempts (int): number of consecutive duplicates after which
+            the offspring is accepted anyway, in order not to stall when
+            the archive has converged.
+    """
+
+    POLICIES = ('regenerate', 'reuse')
+
+    def __init__(self, lower_bound, upper_bound, policy='regenerate',
+                 resolution=1e-9, history=5, max_attempts=10):
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy should be one of {self.POLICIES} "
+                             f"but given {policy}")
+        self.lower_bound = np.asarray(lower_bound, dtype=float)
+        span = np.asarray(upper_bound, dtype=float) - self.lower_bound
+        span[span == 0] = 1.0
+        self.span = span
+        self.policy = policy
+        self.resolution = resolution
+        self.max_attempts = max_attempts
+
+        self.history = deque(maxlen=history)
+        self.archive = {}
+        self.batch = set()
+        self.avoided = 0
+        self._rejections = 0
+
+    @classmethod
+    def from_config(cls, circuit_config: dict, spea2_config: dict):
+        """
+        Create from the 'deduplication' section of the SPEA2
+        configuration. Returns None if it is set to false.
+        """
+        config = spea2_config.get("deduplication", {})
+        if config is False:
+            return None
+        return cls(circuit_config["lower_bound"],
+                   circuit_config["upper_bound"],
+                   **(config or {}))
+
+    def key(self, parameters) -> bytes:
+        quantized = np.rint(
+            (np.asarray(parameters, dtype=float) - self.lower_bound)
+            / self.span / self.resolution)
+        return quantized.astype(np.int64).tobytes()
+
+    def _index(self, inds) -> dict:
+        return {self.key(ind.circuit.parameters): ind.circuit
+                for ind in inds if ind.status == 'simulated'}
+
+    def start_generation(self, last_gen):
+        """
+        Start producing a new generation after last_gen has been
+        simulated and its archive has been selected.
+        """
+        self.history.append(self._index(last_gen.individuals))
+        self.archive = self._index(last_gen.archive_inds)
+        self.batch = set()
+        self._rejections = 0
+
+    def lookup(self, key):
+        """ Return the simulated circuit with the key or None. """
+        if key in self.archive:
+            return self.archive[key]
+        for index in reversed(self.history):
+            if key in index:
+                return index[key]
+        return None
+
+    def admit(self, ind) -> bool:
+        """
+        Decide whether ind is added to the generation being produced.
+        If results of a simulated duplicate are reused ind is marked
+        as simulated.
+
+        Returns:
+            bool: False if ind should be discarded and regenerated.
+        """
+        key = self.key(ind.circuit.parameters)
+        give_up = self._rejections >= self.max_attempts
+
+        if key in self.batch and not give_up:
+            self.avoided += 1
+            self._rejections += 1
+            return False
+
+        known = self.lookup(key)
+        if known is not None:
+            if self.policy == 'regenerate' and not give_up:
+                self.avoided += 1
+                self._rejections += 1
+                return False
+            self.avoided += 1
+            ind.circuit.copy_results(known)
+            ind.status = 'simulated'
+
+        self.batch.add(key)
+        self._rejections = 0
+        return True
@@ -0,0 +1,149 @@
+from typing import Dict, List
+
+import numpy as np
+
+from .constraints import Constraint, ConstraintSet, Expression
+
+
+class ParameterConstraints:
+    """
+    Constraints which depend only on the parameters, evaluated for a
+    whole batch of circuits before they are simulated.
+
+    Derived outputs are expressions of the parameters, e.g. the area
+    '2*WM1*LM1 + 2*WM2*LM2 + 2*WM3*LM3', which may use the derived
+    outputs before them. They are set on the circuits which are
+    simulated, the simulator overwrites those it measures as well.
+
+    A violating circuit is either resampled, i.e. replaced as if its
+    simulation failed, or repaired: it is moved towards the nearest
+    feasible circuit of the batch, by bisection on the line between
+    them, until it is feasible, and snapped to the grid. Those without
+    a feasible circuit in the batch, or which violate the constraints
+    again on the grid, are resampled.
+
+    Args:
+        topology (List[str]): names of the parameters.
+        lower_bound (List[float]): lower bound of the parameters.
+        upper_bound (List[float]): upper bound of the parameters.
+        constraints (List[str]): comparisons of the parameters and the
+            derived outputs such as 'zsarea <= 5e-9'.
+        derived (Dict[str, str]): name -> expression.
+        policy (str): 'resample' or 'repair'.
+        max_attempts (int): rounds of a batch after which the violators
+            are simulated anyway, in order not to stall when the
+            feasible region is hard to hit.
+        bisections (int): steps of the repair.
+    """
+
+    POLICIES = ('resample', 'repair')
+
+    def __init__(self, topology: List[str], lower_bound, upper_bound,
+                 constraints: List[str] = (), derived: Dict[str, str] = None,
+                 policy: str = 'resample', max_attempts: int = 10,
+                 bisections: int = 20):
+        if policy not in self.POLICIES:
+            raise ValueError(f"policy should be one of {self.POLICIES} "
+                             f"but given {policy}")
+        self.topology = list(topology)
+        self.lower_bound = np.asarray(lower_bound, dtype=float)
+        span = np.asarray(upper_bound, dtype=float) - self.lower_bound
+        span[span == 0] = 1.0
+        self.span = span
+
+        names = list(self.topology)
+        self.derived = {}
+        for name, source in (derived or {}).items():
+            if name in names:
+                raise ValueError(f"Derived output {name} is already a name.")
+            self.derived[name] = Expression(str(source), names)
+            names.append(name)
+        self.constraint_set = ConstraintSet([Constraint.parse(c) for c in constraints])
+        for constraint in self.constraint_set.constraints:
+            for name in constraint.names:
+                if name not in names:
+                    raise ValueError(f"{name} of the constraint {constraint} is "
+                                     f"neither a parameter nor a derived output.")
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.bisections = bisections
+        self.rejected = 0
+        self.repaired = 0
+
+    @classmethod
+    def from_config(cls, circuit_config: dict, spea2_config: dict):
+        """
+        Create from the 'parameter_constraints' section of the SPEA2
+        configuration. Returns None if it is not given.
+        """
+        config = spea2_config.get("parameter_constraints", None)
+        if not config:
+            return None
+        return cls(circuit_config["topology"], circuit_config["lower_bound"],
+                   circuit_config["upper_bound"], **config)
+
+    def columns(self, parameters: np.ndarray) -> Dict[str, np.ndarray]:
+        """ Parameters and derived outputs of the (n, parameters) matrix. """
+        parameters = np.asarray(parameters, dtype=float).reshape(-1, len(self.topology))
+        columns = {name: parameters[:, i] for i, name in enumerate(self.topology)}
+        for name, expression in self.derived.items():
+            columns[name] = np.broadcast_to(
+                np.asarray(expression(columns), dtype=float), (len(parameters),))
+        return columns
+
+    def error(self, parameters: np.ndarray) -> np.ndarray:
+        """ Total error of each row of the parameter matrix. """
+        parameters = np.asarray(parameters, dtype=float).reshape(-1, len(self.topology))
+        return self.constraint_set.total_error(self.columns(parameters), n=len(parameters))
+
+    def _repair(self, parameters: np.ndarray, feasible: np.ndarray, violators: np.ndarray):
+        """ Feasible points towards the nearest feasible rows, None if there is none. """
+        if not feasible.any():
+            return None
+        anchors = parameters[feasible]
+        normalized = parameters / self.span
+        distances = np.linalg.norm(normalized[violators][:, None, :]
+                                   - normalized[feasible][None, :, :], axis=2)
+        start = parameters[violators]
+        direction = anchors[np.argmin(distances, axis=1)] - start
+        # The violators are at 0, the anchors at 1.
+        low, high = np.zeros(len(start)), np.ones(len(start))
+        for _ in range(self.bisections):
+            middle = (low + high) / 2
+            ok = self.error(start + middle[:, None] * direction) == 0
+            high = np.where(ok, middle, high)
+            low = np.where(ok, low, middle)
+        return start + high[:, None] * direction
+
+    def apply(self, inds) -> List[bool]:
+        """
+        Check the circuits of the individuals before they are simulated,
+        repair the violators if the policy is 'repair' and set the
+        derived outputs.
+
+        Returns:
+            List[bool]: True for each individual which violates the
+                constraints and should be replaced.
+        """
+        if not inds:
+            return []
+        parameters = np.array([ind.circuit.parameters for ind in inds])
+        violators = self.error(parameters) > 0
+        if violators.any() and self.policy == 'repair':
+            repaired = self._repair(parameters, ~violators, violators)
+            if repaired is not None:
+                for n, params in zip(np.flatnonzero(violators), repaired):
+                    inds[n].circuit = type(inds[n].circuit).on_grid(params)
+                    parameters[n] = inds[n].circuit.parameters
+                # Snapped to the grid, a repaired circuit may violate again.
+                still = self.error(parameters) > 0
+                self.repaired += int((violators & ~still).sum())
+                violators = still
+
+        self.rejected += int(violators.sum())
+        columns = self.columns(parameters)
+        for n, ind in enumerate(inds):
+            if not violators[n]:
+                for name in self.derived:
+                    setattr(ind.circuit, name, float(columns[name][n]))
+        return violators.tolist()
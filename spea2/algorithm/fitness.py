@@ -13,5 +13,13 @@ class Fitness:
         self.distance = [0.0] * N
         self.fitness = 0.0
 
+    def copy(self):
+        """ Copy whose distance list, if not assigned yet, is not shared. """
+        fitness = Fitness.__new__(Fitness)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(fitness, name, list(value) if isinstance(value, list) else value)
+        return fitness
+
     def __repr__(self) -> str:
         return f"Fitness(error:{self.total_error}, rawfitness:{self.rawfitness})"
@@ -1,38 +1,51 @@
-import copy
-import itertools as it
 import pickle
-from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from threading import Lock
 from typing import List
 
 import numpy as np
 
-from ..IC import CircuitCreator, SimulationFailedError
+from ..IC import OP_FIELDS, CircuitCreator
+from .fitness import Fitness
 from .individual import Individual
+from .metrics import front_metrics, get_reference_point
+from .paretoindex import ParetoIndex
+from .storage import CompressedStore, InstanceStore
+from .workers import WorkerPool
 
 
 class Generation:
     PROPERTIES = {}
+    # Checks the parameters before simulation, see feasibility.ParameterConstraints
+    parameter_constraints = None
 
-    def __init__(self, N, kii):
+    def __init__(self, N, kii, archive_size=None):
         self.N = N
         self.kii = kii
+        self.archive_size = N if archive_size is None else archive_size
         self.individuals: List[Individual] = []
         self.archive_inds: List[Individual] = []
+        self.simulation_count = 0
+        self.avoided_simulations = 0
 
-    def population_initialize(self, initializer_type: str):
-        """ Initialize the first generation. """
+    def population_initialize(self, initializer_type: str, rng=None):
+        """
+        Initialize the first generation.
+
+        Args:
+            initializer_type (str): see IC.CircuitCreator.create
+            rng (numpy.random.Generator): source of randomness.
+        """
         for _ in range(self.N):
             circuit = CircuitCreator.create(
                 circuit_type=self.PROPERTIES['type'],
-                initializer_type=initializer_type
+                initializer_type=initializer_type,
+                rng=rng
             )
             new_individual = Individual(circuit, self.N)
             self.individuals.append(new_individual)
 
     @classmethod
-    def new_generation_from_parameters(cls, parameters, N, kii):
+    def new_generation_from_parameters(cls, parameters, N, kii, archive_size=None):
         """
         Form a generation when all parameters for individual.circuit
         is given.
@@ -41,11 +54,12 @@ class Generation:
             parameters (List[Union[List[float], numpy.ndarray]]):
             N (int): number of individuals each generation has.
             kii (int): generation number.
+            archive_size (int): number of archive individuals. Defaults to N.
 
         Returns:
             gen(generation.Generation)
         """
-        gen = Generation(N=N, kii=kii)
+        gen = Generation(N=N, kii=kii, archive_size=archive_size)
         for params in parameters:
             circuit = CircuitCreator.create(
                 circuit_type=cls.PROPERTIES['type'],
@@ -56,56 +70,65 @@ class Generation:
             gen.individuals.append(new_individual)
         return gen
 
-    def simulate(self, path, multithread=1, algorithm=None):
-        """ Simulate each individual inside the generation """
-        if multithread == 1:
-            for ind in self.individuals:
-                while ind.status != 'simulated':
-                    try:
-                        ind.circuit.simulate(path)
-                    except SimulationFailedError:
-                        if algorithm is not None:
-                            ind = algorithm.produce_new_individual()
-                        else:
-                            circuit = CircuitCreator.create(
-                                circuit_type=self.PROPERTIES['type'],
-                                initializer_type='Random'
-                            )
-                            ind = Individual(circuit, self.N)
-                    else:
-                        ind.status = 'simulated'
+    def simulate(self, path, multithread=1, algorithm=None, rng=None, workers=None):
+        """
+        Simulate each individual inside the generation. Failed individuals
+        are replaced in the order of their position in the generation
+        once all of the individuals are simulated, so the result does not
+        depend on the number of threads or the order of completion.
+
+        Args:
+            path (str): path to circuit folder or, if multithread > 1,
+                to the folder of the duplicated circuit folders.
+            multithread (int): number of threads to be used
+            algorithm (algorithm.EvolutionaryAlgorithm): If a circuit
+                fails, algorithm is being used to generate new individual.
+            rng (numpy.random.Generator): source of randomness for new
+                random individuals when algorithm is None.
+            workers (workers.WorkerPool): folders and threads which are
+                kept during the whole run. If None a pool is created for
+                this generation from path and multithread.
+        """
+        if workers is None:
+            with WorkerPool(path, multithread) as workers:
+                self._simulate_inds(workers, self.individuals, algorithm, rng)
         else:
-            self._simulate_inds(path, self.individuals, multithread, algorithm)
+            self._simulate_inds(workers, self.individuals, algorithm, rng)
 
-    def _simulate_inds(self, path, inds, multithread, algorithm=None):
+    def _simulate_inds(self, workers, inds, algorithm=None, rng=None):
         """
-        When multithread process is activated the given individuals are
-        simulated in this method. For each thread to perform simulation
-        in one folder, duplicates folders have been created and each thread
-        has its own path. In order to avoid race condition Lock objects
-        are created and assigned to each thread.
+        The given individuals are simulated in this method. Each thread
+        simulates in its own duplicated circuit folder, see
+        workers.WorkerPool. Individuals violating the parameter
+        constraints are repaired or replaced before they are simulated.
 
         Args:
-            path (str): path to root circuit folder
+            workers (workers.WorkerPool): folders and threads.
             inds (List[Individual]): individuals to simulate
-            multithread (int): number of threads to be used
             algorithm (algorithm.EvolutionaryAlgorithm): If a circuit
                 fails, algorithm is being used to generate new individual.
+            rng (numpy.random.Generator): source of randomness for new
+                random individuals when algorithm is None.
         """
-        path_pool = tuple(path + str(x) + '\\' for x in range(8))
-        lock_pool = tuple(Lock() for _ in range(8))
-        indx_to_sim = range(len(inds))
+        indx_to_sim = [n for n, ind in enumerate(inds)
+                       if ind.status != 'simulated']
+        if algorithm is not None:
+            ind_generator = algorithm.produce_new_individual()
+        checks = self.parameter_constraints
+        attempts = 0
         while True:
             failed_inds = []
-            futures = []
-            with ThreadPoolExecutor(max_workers=multithread) as executor:
-                for x, path_, lock_ in zip(
-                        indx_to_sim, it.cycle(path_pool), it.cycle(lock_pool)):
-                    futures.append(
-                        executor.submit(inds[x].circuit.simulate, path_, lock_))
-            wait(futures)
-            for n, future in zip(indx_to_sim, futures):
-                if future.exception() is not None:
+            if checks is not None and attempts < checks.max_attempts:
+                violators = checks.apply([inds[x] for x in indx_to_sim])
+                failed_inds = [n for n, bad in zip(indx_to_sim, violators) if bad]
+                indx_to_sim = [n for n, bad in zip(indx_to_sim, violators) if not bad]
+                for n in failed_inds:
+                    inds[n].status = 'failed'
+                attempts += 1
+            outcomes = workers.run([inds[x].circuit for x in indx_to_sim])
+            self.simulation_count += workers.dispatched
+            for n, exception in zip(indx_to_sim, outcomes):
+                if exception is not None:
                     inds[n].status = 'failed'
                     failed_inds.append(n)
                 else:
@@ -114,18 +137,31 @@ class Generation:
             if failed_inds:
                 indx_to_sim = failed_inds
                 if algorithm is not None:
-                    ind_generator = algorithm.produce_new_individual()
                     for n in failed_inds:
                         inds[n], _ = next(ind_generator)
                 else:
                     for n in failed_inds:
                         circuit = CircuitCreator.create(
                             self.PROPERTIES['type'],
-                            initializer_type='Random')
+                            initializer_type='Random',
+                            rng=rng)
                         inds[n] = Individual(circuit, self.N)
             else:
                 return
 
+    @property
+    def operating_points(self) -> np.ndarray:
+        """
+        (N, transistor_number, 12) float32 operating points of the
+        individuals, nan for those without one. See IC.OP_FIELDS.
+        """
+        shape = (self.PROPERTIES["transistor_number"], len(OP_FIELDS))
+        op = np.full((len(self.individuals),) + shape, np.nan, dtype=np.float32)
+        for n, ind in enumerate(self.individuals):
+            if ind.circuit.operating_point is not None:
+                op[n] = ind.circuit.operating_point
+        return op
+
     def reset_arch_fitness(self):
         for ind in self.archive_inds:
             ind.reset_arch_fitness(self.N)
@@ -144,60 +180,247 @@ class GenerationPool:
         self.only_cct = only_cct
         self.saved_file_path = None
         self.circuit_config = circuit_config
-        self.pool = []
+        # Generations in instance saving format, see storage.InstanceStore,
+        # or in compressed saving format, see storage.CompressedStore
+        if saving_format == 'compressed':
+            self.pool = CompressedStore.from_config(circuit_config, spea2_config)
+        else:
+            self.pool = InstanceStore.from_config(only_cct, spea2_config)
+
+        # Quality of the archive of each generation. See metrics.front_metrics
+        self.metrics = []
+        self.reference_point = get_reference_point(
+            spea2_config["targets"], spea2_config.get("reference_point"))
+        self._last_front = None
+
+        # Query index over every individual. It is saved next to the
+        # pool as <saved_file_path>.index.npz instead of being pickled.
+        self.index = ParetoIndex.from_config(circuit_config, spea2_config)
+
+        # workers.WorkerMonitor.summary of the run
+        self.worker_summary = None
 
         m = spea2_config["maximum_generation"]
         n = spea2_config["N"]
+        a = spea2_config.get("archive_size", n)
         l = len(circuit_config["topology"])
 
+        # Generations and archives may be smaller or larger than N.
+        # Empty slots are left as nan and the arrays grow if needed.
         if saving_format == 'numpy':
-            self.parameters = np.zeros((m, n, l), dtype=float)
-            self.arch_parameters = np.zeros((m, n, l), dtype=float)
+            self.parameters = np.full((m, n, l), np.nan, dtype=float)
+            self.arch_parameters = np.full((m, a, l), np.nan, dtype=float)
             for k in circuit_config["output"]:
-                setattr(self, k, np.zeros((m, n), dtype=float))
-                setattr(self, "arch_" + k, np.zeros((m, n), dtype=float))
+                setattr(self, k, np.full((m, n), np.nan, dtype=float))
+                setattr(self, "arch_" + k, np.full((m, a), np.nan, dtype=float))
+            # (generation, individual, transistor, OP_FIELDS) tensor of
+            # the operating points, float32 to keep it compact.
+            if circuit_config.get("operating_point", False):
+                op_shape = (circuit_config["transistor_number"], len(OP_FIELDS))
+                self.operating_point = np.full((m, n) + op_shape, np.nan,
+                                               dtype=np.float32)
+                self.arch_operating_point = np.full((m, a) + op_shape, np.nan,
+                                                    dtype=np.float32)
 
     def append(self, generation):
         """ Append the generation to generationpool. """
+        self._track_metrics(generation)
+        self.index.add(generation)
         if self.saving_format == 'instance':
             self._append_as_instance(generation)
         elif self.saving_format == 'numpy':
             self._append_as_nparray(generation)
+        elif self.saving_format == 'compressed':
+            self.pool.append(generation)
         else:
             raise ValueError(f"Could not recognized {self.saving_format}")
 
+    def finalize(self, kii):
+        """
+        Discard the space allocated for the generations after kii
+        when the process stops before the maximum generation.
+        """
+        for attr, attr_obj in list(self.__dict__.items()):
+            if isinstance(attr_obj, np.ndarray):
+                setattr(self, attr, attr_obj[:kii + 1])
+
+    def _track_metrics(self, generation):
+        """ Calculate the quality metrics of the archive. """
+        # Kept as list since every ndarray attribute of the pool is
+        # regarded as storage of a circuit attribute.
+        front = [ind.targets for ind in generation.archive_inds]
+        metrics = front_metrics(front, self.reference_point, self._last_front)
+        metrics["kii"] = generation.kii
+        self.metrics.append(metrics)
+        self._last_front = front
+
+    @property
+    def hypervolume(self) -> np.ndarray:
+        """ Hypervolume of the archive for each generation. """
+        return np.array([m["hypervolume"] for m in self.metrics])
+
     def save(self, saving_path, cct_name, kii):
         today = datetime.now()
         file_name = today.strftime(cct_name + " d-%Y.%m.%d h-%H.%M ")
         file_name += 'gen-0to' + str(kii)
+        self.saved_file_path = saving_path + file_name
+        if self.saving_format == 'compressed':
+            self.pool.save(self.data_path)
         with open(saving_path + file_name, 'wb') as f:
             pickle.dump(self, f)
-        self.saved_file_path = saving_path + file_name
+        self.index.save(self.index_path)
+
+    def release(self):
+        """ Delete the temporary files of the pool once it is saved. """
+        self.pool.cleanup()
+
+    @property
+    def index_path(self):
+        return self.saved_file_path + '.index.npz'
+
+    @property
+    def data_path(self):
+        """ File of the generations in compressed saving format. """
+        return self.saved_file_path + '.gens'
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['index'] = None
+        return state
+
+    def load_index(self) -> ParetoIndex:
+        """ Load the index saved next to the pool. """
+        if self.index is None:
+            self.index = ParetoIndex.load(self.index_path)
+        return self.index
+
+    def iter_tables(self):
+        """
+        Yield the individuals and the archive of each generation as a
+        table, i.e. dict of equal-length numpy arrays. See spea2.export
+        for the columns.
+        """
+        if self.saving_format == 'instance':
+            tables = (self._instance_table(gen) for gen in self.pool)
+        elif self.saving_format == 'compressed':
+            tables = (self._nparray_table(kii, values)
+                      for kii, values in enumerate(self.pool))
+        else:
+            tables = (self._nparray_table(kii)
+                      for kii in range(len(self.parameters)))
+        for table in tables:
+            if len(table["generation"]):
+                yield table
+
+    def to_table(self, path, file_format='parquet', chunk_rows=None) -> int:
+        """
+        Write the pool as a columnar table in Arrow IPC, Parquet or csv
+        format, one generation at a time.
+
+        Args:
+            path (str): output file.
+            file_format (str): 'arrow', 'parquet' or 'csv'.
+            chunk_rows (int): maximum number of rows per csv file.
+
+        Returns:
+            int: number of rows written.
+        """
+        from ..export import get_writer
+
+        rows = 0
+        with get_writer(path, file_format, chunk_rows) as writer:
+            for table in self.iter_tables():
+                writer.write(table)
+                rows += len(table["generation"])
+        return rows
+
+    def _table(self, kii, parameters, outputs, fitness, archive):
+        n = len(parameters)
+        table = {
+            "generation": np.full(n, kii, dtype=np.int64),
+            "index": np.arange(n, dtype=np.int64),
+            "archive": np.full(n, archive, dtype=bool),
+        }
+        parameters = np.asarray(parameters, dtype=float).reshape(n, -1)
+        for i, name in enumerate(self.circuit_config["topology"]):
+            table[name] = parameters[:, i]
+        for name in self.circuit_config["output"]:
+            table[name] = np.asarray(outputs[name], dtype=float)
+        for name in Fitness.__slots__:
+            table[name] = np.asarray(fitness.get(name, np.full(n, np.nan)),
+                                     dtype=float)
+        return table
+
+    def _instance_table(self, generation):
+        tables = []
+        for archive, inds in ((False, generation.individuals),
+                              (True, generation.archive_inds)):
+            circuits = [getattr(ind, 'circuit', ind) for ind in inds]
+            outputs = {name: [getattr(cct, name, np.nan) for cct in circuits]
+                       for name in self.circuit_config["output"]}
+            fitness = {}
+            if not self.only_cct:
+                fitnesses = [ind.arch_fitness
+                             if getattr(ind, 'coming_from', None) == 'last_arch'
+                             and archive else ind.fitness for ind in inds]
+                fitness = {name: [getattr(fit, name) for fit in fitnesses]
+                           for name in Fitness.__slots__}
+            tables.append(self._table(
+                generation.kii, [cct.parameters for cct in circuits],
+                outputs, fitness, archive))
+        return {name: np.concatenate([t[name] for t in tables])
+                for name in tables[0]}
+
+    def _nparray_table(self, kii, values=None):
+        """ values are those of CompressedStore, the arrays of the pool if None. """
+        if values is None:
+            values = {name: array[kii] for name, array in vars(self).items()
+                      if isinstance(array, np.ndarray)}
+        tables = []
+        for archive, prefix in ((False, ''), (True, 'arch_')):
+            parameters = values[prefix + 'parameters']
+            # Empty slots of smaller generations are nan.
+            mask = ~np.isnan(parameters).all(axis=1)
+            outputs = {name: values[prefix + name][mask]
+                       for name in self.circuit_config["output"]}
+            tables.append(self._table(kii, parameters[mask], outputs, {}, archive))
+        return {name: np.concatenate([t[name] for t in tables])
+                for name in tables[0]}
 
     @classmethod
     def load(cls, loading_path):
         with open(loading_path, 'rb') as f:
-            return pickle.load(f)
+            pool = pickle.load(f)
+        if pool.saving_format == 'compressed':
+            pool.pool.open(loading_path + '.gens')
+        return pool
 
     def _append_as_instance(self, generation):
-        """ Append the generation object itself. """
-        generation_ = copy.deepcopy(generation)
-        if self.only_cct:
-            generation_.individuals = [copy.deepcopy(ind).circuit
-                                       for ind in generation.individuals]
-            generation_.archive_inds = [copy.deepcopy(ind).circuit
-                                        for ind in generation.archive_inds]
-        self.pool.append(generation_)
+        """ Append a snapshot of the generation. """
+        self.pool.append(generation)
 
     def _append_as_nparray(self, generation):
         """ Append only float values in generaiton.individuals. """
-        for attr in self.__dict__:
+        for attr in list(self.__dict__):
             attr_obj = getattr(self, attr)
             if isinstance(attr_obj, np.ndarray):
                 if attr.startswith('arch_'):
-                    attr_obj[generation.kii] = [getattr(ind.circuit,
-                                                        attr.replace('arch_', ''))
-                                                for ind in generation.archive_inds]
+                    inds = generation.archive_inds
+                    name = attr.replace('arch_', '')
                 else:
-                    attr_obj[generation.kii] = [getattr(ind.circuit, attr)
-                                                for ind in generation.individuals]
+                    inds = generation.individuals
+                    name = attr
+                if len(inds) > attr_obj.shape[1]:
+                    attr_obj = self._grow(attr, len(inds))
+                attr_obj[generation.kii, :len(inds)] = [
+                    getattr(ind.circuit, name) for ind in inds]
+
+    def _grow(self, attr, n):
+        """ Enlarge the individual axis of the array attr to n. """
+        attr_obj = getattr(self, attr)
+        shape = list(attr_obj.shape)
+        shape[1] = n - shape[1]
+        attr_obj = np.concatenate(
+            (attr_obj, np.full(shape, np.nan, dtype=attr_obj.dtype)), axis=1)
+        setattr(self, attr, attr_obj)
+        return attr_obj
@@ -1,37 +1,35 @@
 from operator import attrgetter
-from random import choices, randrange, uniform
 from typing import List
 
 import numpy as np
 
+from .fitness import Fitness
 from .generation import Generation
 from .individual import Individual
 
 
-def parent_fitness(parent):
-    """ Decide id parent is in last archive or last generation. Return
-        the fitness value of it.
+def selection_fitness(ind) -> Fitness:
+    """ Decide if ind is in last archive or last generation. Return the
+        Fitness it is selected with, its fitness if it is not known.
     """
-    if parent.coming_from == 'last_gen':
-        fitness = parent.fitness.fitness
-    elif parent.coming_from == 'last_arch':
-        fitness = parent.arch_fitness.fitness
-    else:
-        raise ValueError(f"Can not recognized ind.coming_from")
-    return fitness
+    coming_from = getattr(ind, 'coming_from', None)
+    if coming_from == 'last_arch':
+        return ind.arch_fitness
+    elif coming_from in ('last_gen', None):
+        return ind.fitness
+    raise ValueError(f"Can not recognized ind.coming_from")
 
 
-def _single_mating(gen: Generation) -> Individual:
-    """ Choose a parent from archive randomly. """
-    parent1, parent2 = choices(gen.archive_inds, k=2)
-    if hasattr(parent1, 'coming_from') and hasattr(parent2, 'coming_from'):
-        fitness1 = parent_fitness(parent1)
-        fitness2 = parent_fitness(parent2)
-    else:
-        fitness1 = parent1.fitness.fitness
-        fitness2 = parent2.fitness.fitness
+def parent_fitness(parent):
+    """ Fitness value the parent is selected with. """
+    return selection_fitness(parent).fitness
+
 
-    if fitness1 > fitness2:
+def _single_mating(gen: Generation, rng: np.random.Generator) -> Individual:
+    """ Choose a parent from archive randomly. """
+    i, j = rng.integers(len(gen.archive_inds), size=2)
+    parent1, parent2 = gen.archive_inds[i], gen.archive_inds[j]
+    if parent_fitness(parent1) > parent_fitness(parent2):
         return parent2
     else:
         return parent1
@@ -40,26 +38,27 @@ def _single_mating(gen: Generation) -> Individual:
 def _single_mutation(
         ind: Individual,
         upper_bound: List[float],
-        lower_bound: List[float]
+        lower_bound: List[float],
+        rng: np.random.Generator
 ) -> Individual:
     """
     Randomly assign boolean to mutation, if true change the parameters
     of the individual.circuit randomly between upper and lower bound.
     """
-    mutation_step_size = 0.1 + 0.2 * uniform(0, 1)
-    mutation = True if uniform(0, 1) > mutation_step_size else False
+    mutation_step_size = 0.1 + 0.2 * rng.random()
+    mutation = True if rng.random() > mutation_step_size else False
 
     if mutation:
-        param_index_to_be_mutated = randrange(0, len(ind.circuit.parameters))
-        difference_bound = np.subtract(upper_bound[param_index_to_be_mutated],
-                                       lower_bound[param_index_to_be_mutated])
-        multiplied_difference_bound = np.multiply(difference_bound, uniform(0, 1))
+        param_index_to_be_mutated = rng.integers(0, len(ind.circuit.parameters))
+        difference_bound = upper_bound[param_index_to_be_mutated] - \
+            lower_bound[param_index_to_be_mutated]
+        multiplied_difference_bound = difference_bound * rng.random()
 
-        parameters = list(ind.circuit.parameters)
+        parameters = ind.circuit.parameters.copy()
         parameters[param_index_to_be_mutated] = \
-            np.add(lower_bound[param_index_to_be_mutated], multiplied_difference_bound)
+            lower_bound[param_index_to_be_mutated] + multiplied_difference_bound
 
-        ind.circuit = type(ind.circuit).__call__(parameters)
+        ind.circuit = type(ind.circuit).on_grid(parameters)
     return ind
 
 
@@ -69,11 +68,16 @@ class EvolutionaryAlgorithm:
     def __init__(
             self,
             generation,
-            next_generation=None
+            next_generation=None,
+            duplicate_index=None,
+            rng=None
     ):
         self.gen = generation
         self.next_gen = next_generation
         self.N = generation.N
+        self.new_archive_members = 0
+        self.duplicate_index = duplicate_index
+        self.rng = np.random.default_rng() if rng is None else rng
 
     def mating_pool(self):
         """
@@ -82,7 +86,7 @@ class EvolutionaryAlgorithm:
         """
         # seen = set()
         while True:
-            selected_parent = _single_mating(self.next_gen)
+            selected_parent = _single_mating(self.next_gen, self.rng)
             yield selected_parent
             # if id(selected_parent) not in seen:
             #     seen.add(id(selected_parent))
@@ -96,23 +100,33 @@ class EvolutionaryAlgorithm:
         while True:
             parent1, parent2 = yield
 
-            circuit1 = parent1.circuit * recombination_coefficient + \
-                       parent2.circuit * (1 - recombination_coefficient)
+            # Equivalent of parent1.circuit * r + parent2.circuit * (1 - r)
+            # without forming the intermediate circuits.
+            params1 = parent1.circuit.parameters
+            params2 = parent2.circuit.parameters
+            circuit_type = type(parent1.circuit)
+
+            circuit1 = circuit_type.on_grid(
+                params1 * recombination_coefficient +
+                params2 * (1 - recombination_coefficient))
             child1 = Individual(circuit1, self.N)
 
-            circuit2 = parent2.circuit * recombination_coefficient + \
-                       parent1.circuit * (1 - recombination_coefficient)
+            circuit2 = circuit_type.on_grid(
+                params2 * recombination_coefficient +
+                params1 * (1 - recombination_coefficient))
             child2 = Individual(circuit2, self.N)
 
             mutated_child1 = _single_mutation(
                 child1,
                 circuit1.PROPERTIES['upper_bound'],
-                circuit1.PROPERTIES['lower_bound']
+                circuit1.PROPERTIES['lower_bound'],
+                self.rng
             )
             mutated_child2 = _single_mutation(
                 child2,
                 circuit2.PROPERTIES['upper_bound'],
-                circuit2.PROPERTIES['lower_bound']
+                circuit2.PROPERTIES['lower_bound'],
+                self.rng
             )
             yield mutated_child1, mutated_child2
 
@@ -134,28 +148,37 @@ class EvolutionaryAlgorithm:
                     archive_inds_temp.add(arch_ind)
                     arch_ind.coming_from = 'last_arch'
 
-        if len(archive_inds_temp) < self.next_gen.N:
+        archive_size = self.next_gen.archive_size
+        if len(archive_inds_temp) < archive_size:
             i = 0
             sorted_next_gen_inds = sorted(self.next_gen.individuals,
                                           key=attrgetter('fitness.fitness'))
             gen_archive_inds = sorted(self.gen.archive_inds,
                                       key=attrgetter('arch_fitness.fitness'))
-            while len(archive_inds_temp) < self.next_gen.N:
-                if i < self.next_gen.N:
+            n_next_gen = len(sorted_next_gen_inds)
+            n_candidates = n_next_gen + len(gen_archive_inds)
+            while len(archive_inds_temp) < archive_size and i < n_candidates:
+                if i < n_next_gen:
                     if sorted_next_gen_inds[i] not in archive_inds_temp:
                         ind_to_append = sorted_next_gen_inds[i]
                         archive_inds_temp.add(ind_to_append)
                         ind_to_append.coming_from = 'last_gen'
                 else:
-                    if gen_archive_inds[i - self.gen.N] not in archive_inds_temp:
-                        ind_to_append = gen_archive_inds[i - self.gen.N]
+                    if gen_archive_inds[i - n_next_gen] not in archive_inds_temp:
+                        ind_to_append = gen_archive_inds[i - n_next_gen]
                         archive_inds_temp.add(ind_to_append)
                         ind_to_append.coming_from = 'last_arch'
                 i += 1
-        elif len(archive_inds_temp) > self.gen.N:
-            while len(archive_inds_temp) > self.gen.N:
+        elif len(archive_inds_temp) > archive_size:
+            while len(archive_inds_temp) > archive_size:
                 archive_inds_temp.pop()
 
+        # Non-dominated individuals of the new generation which survived
+        # the truncation, those filling the archive are not counted.
+        self.new_archive_members = sum(
+            1 for ind in archive_inds_temp
+            if ind.coming_from == 'last_gen' and ind.fitness.rawfitness == 0
+            and ind.fitness.total_error == 0)
         return list(archive_inds_temp)
 
     def produce_new_individual(self):
@@ -175,13 +198,36 @@ class EvolutionaryAlgorithm:
                 yield child1, child2
                 next(cross_mut)
 
-    def produce(self):
-        new_generation = Generation(self.N, self.next_gen.kii + 1)
+    def produce(self, N=None, archive_size=None):
+        """
+        Produce the next generation.
+
+        Args:
+            N (int): number of individuals of the next generation.
+                Defaults to the size of the last generation.
+            archive_size (int): number of archive individuals of the
+                next generation. Defaults to the last archive size.
+        """
+        N = self.N if N is None else N
+        if archive_size is None:
+            archive_size = self.next_gen.archive_size
+        new_generation = Generation(N, self.next_gen.kii + 1, archive_size)
         new_ind_it = self.produce_new_individual()
-        while len(new_generation.individuals) < self.N:
-            ind1, ind2 = next(new_ind_it)
-            new_generation.individuals.append(ind1)
-            new_generation.individuals.append(ind2)
-        if len(new_generation.individuals) > self.N:
-            del new_generation.individuals[-1]
+
+        # Offspring which were produced or simulated before are
+        # discarded or take over the results of their duplicates.
+        index = self.duplicate_index
+        if index is not None:
+            index.start_generation(self.next_gen)
+            avoided = index.avoided
+
+        while len(new_generation.individuals) < N:
+            for ind in next(new_ind_it):
+                if index is None or index.admit(ind):
+                    new_generation.individuals.append(ind)
+        if len(new_generation.individuals) > N:
+            del new_generation.individuals[N:]
+
+        if index is not None:
+            new_generation.avoided_simulations = index.avoided - avoided
         return new_generation
@@ -72,18 +72,7 @@ def calculate_fitness_value(
 def calculate_total_error(ind) -> float:
     """
     Calculate total error which occurs when the involved values
-    of the individuals exceeds constraint limits.
+    of the individuals exceeds constraint limits. See
+    constraints.ConstraintSet.evaluate for a whole generation.
     """
-    total_error = 0.0
-    for i in range(len(ind.CONSTRAINTS)):
-        if ind.constraint_operations[i] == 'max':
-            if ind.constraint_values[i] > ind.constraint_constants[i]:
-                total_error += abs(
-                    ind.constraint_values[i] - ind.constraint_constants[i]
-                ) / ind.constraint_constants[i]
-        elif ind.constraint_operations[i] == 'min':
-            if ind.constraint_values[i] < ind.constraint_constants[i]:
-                total_error += abs(
-                    ind.constraint_values[i] - ind.constraint_constants[i]
-                ) / ind.constraint_constants[i]
-    return total_error
+    return float(ind.constraint_set.evaluate([ind])[0])
@@ -1,11 +1,11 @@
+from .constraints import ConstraintSet
 from .fitness import Fitness
 
 
 class Individual:
     TARGETS = {}
-    CONSTRAINTS = {}
-    constraint_operations = []
-    constraint_constants = []
+    # Compiled constraints of the configuration, see constraints.ConstraintSet
+    constraint_set = ConstraintSet()
 
     def __init__(self, circuit, N):
         self.circuit = circuit
@@ -32,10 +32,5 @@ class Individual:
                                  f"but given {operation}")
         return t
 
-    @property
-    def constraint_values(self):
-        return [getattr(self.circuit, cons_name) 
-                for cons_name in self.CONSTRAINTS.keys()]
-
     def reset_arch_fitness(self, N):
         self.arch_fitness = Fitness(N)
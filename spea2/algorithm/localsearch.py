@@ -0,0 +1,176 @@
+from typing import List
+
+import numpy as np
+
+from .generation import Generation
+from .genetic import selection_fitness
+from .individual import Individual
+
+
+class LocalSearch:
+    """
+    Memetic refinement of the best archive members with finite
+    differences.
+
+    Every interval generations the best archive members take one step
+    along the direction in which they improve, estimated by perturbing
+    each parameter by delta. Feasible members improve a weighted sum of
+    their relative target changes, the weights are drawn for each member
+    so that the members spread along the front, and a perturbation which
+    violates the constraints is penalized by its error. Infeasible
+    members reduce their constraint error instead.
+
+    The perturbations of all members are simulated in one batch, then
+    the steps of all members in another one, so the worker pool is kept
+    busy. The steps are added to the simulated generation before its
+    fitness is assigned and its archive is selected. Steps which were
+    simulated before are handled by the duplicate index, if given, as
+    offspring are.
+
+    Args:
+        lower_bound (List[float]): lower bound of the parameters.
+        upper_bound (List[float]): upper bound of the parameters.
+        interval (int): generations between refinements.
+        members (int): number of archive members refined.
+        delta (float): finite difference step relative to the range of
+            each parameter.
+        step (float): length of the step relative to the ranges.
+        penalty (float): weight of the constraint error of the
+            perturbations of a feasible member.
+    """
+
+    def __init__(self, lower_bound, upper_bound, interval=10, members=4,
+                 delta=0.01, step=0.05, penalty=1.0):
+        if interval < 1 or members < 1:
+            raise ValueError("interval and members should be at least 1.")
+        if not 0 < delta <= 0.5 or not 0 < step <= 1:
+            raise ValueError("delta should be in (0, 0.5] and step in (0, 1].")
+        self.lower_bound = np.asarray(lower_bound, dtype=float)
+        self.span = np.asarray(upper_bound, dtype=float) - self.lower_bound
+        self.interval = interval
+        self.members = members
+        self.delta = delta
+        self.step = step
+        self.penalty = penalty
+        # Simulations of the perturbations and the steps
+        self.simulations = 0
+
+    @classmethod
+    def from_config(cls, circuit_config: dict, spea2_config: dict):
+        """
+        Create from the 'local_search' section of the SPEA2
+        configuration. Returns None if it is not given.
+        """
+        config = spea2_config.get("local_search", None)
+        if not config:
+            return None
+        return cls(circuit_config["lower_bound"], circuit_config["upper_bound"],
+                   **(config if isinstance(config, dict) else {}))
+
+    def due(self, kii: int) -> bool:
+        return kii % self.interval == 0
+
+    def _normalize(self, parameters) -> np.ndarray:
+        span = np.where(self.span == 0, 1.0, self.span)
+        return (np.asarray(parameters, dtype=float) - self.lower_bound) / span
+
+    def _circuit(self, circuit, u: np.ndarray):
+        return type(circuit).on_grid(self.lower_bound + np.clip(u, 0.0, 1.0) * self.span)
+
+    def select(self, archive_inds) -> List[Individual]:
+        """ Best simulated archive members, at most members of them. """
+        candidates = [ind for ind in archive_inds if ind.status == 'simulated']
+        candidates.sort(key=lambda ind: selection_fitness(ind).fitness)
+        return candidates[:self.members]
+
+    def _merit(self, member, error, weights, inds, errors) -> np.ndarray:
+        """ Improvement of the individuals over their member, 0 if equal. """
+        if error > 0:
+            return error - errors
+        base = np.asarray(member.targets, dtype=float)
+        scale = np.where(base == 0, 1.0, np.abs(base))
+        targets = np.array([ind.targets for ind in inds], dtype=float)
+        return ((targets - base) / scale) @ weights - self.penalty * errors
+
+    def _simulate(self, workers, circuits, generation) -> List[bool]:
+        outcomes = workers.run(circuits)
+        generation.simulation_count += workers.dispatched
+        self.simulations += workers.dispatched
+        return [outcome is None for outcome in outcomes]
+
+    def refine(self, generation, archive_inds, workers, rng,
+               duplicate_index=None) -> List[Individual]:
+        """
+        Refine the best archive members and add the steps to the
+        simulated generation.
+
+        Args:
+            generation (generation.Generation): simulated, not yet
+                assigned generation the steps are added to.
+            archive_inds (List[Individual]): archive of the generation
+                before, whose fitness is assigned.
+            workers (workers.WorkerPool): simulates the circuits.
+            rng (numpy.random.Generator): weights of the targets.
+            duplicate_index (dedup.DuplicateIndex): steps simulated
+                before are dropped or take over their results.
+
+        Returns:
+            List[Individual]: the added steps.
+        """
+        members = self.select(archive_inds)
+        if not members:
+            return []
+        constraint_set = Individual.constraint_set
+        member_errors = constraint_set.evaluate(members)
+        n_targets = len(Individual.TARGETS)
+
+        # Forward differences, backward at the upper bound.
+        origins, signs, probes = [], [], []
+        for member in members:
+            u = self._normalize(member.circuit.parameters)
+            sign = np.where(u + self.delta <= 1.0, 1.0, -1.0)
+            for i in range(len(u)):
+                moved = u.copy()
+                moved[i] += sign[i] * self.delta
+                probes.append(Individual(self._circuit(member.circuit, moved), generation.N))
+            origins.append(u)
+            signs.append(sign)
+        simulated = self._simulate(workers, [ind.circuit for ind in probes], generation)
+
+        n_params = len(origins[0])
+        steps = []
+        for m, member in enumerate(members):
+            block = slice(m * n_params, (m + 1) * n_params)
+            ok = np.array(simulated[block])
+            if not ok.any():
+                continue
+            inds = [ind for ind, good in zip(probes[block], ok) if good]
+            weights = rng.dirichlet(np.ones(n_targets))
+            merit = np.zeros(n_params)
+            merit[ok] = self._merit(member, member_errors[m], weights, inds,
+                                    constraint_set.evaluate(inds))
+            gradient = np.nan_to_num(merit * signs[m] / self.delta,
+                                     nan=0.0, posinf=0.0, neginf=0.0)
+            norm = np.linalg.norm(gradient)
+            if norm == 0:
+                continue
+            u = origins[m] + self.step * gradient / norm
+            steps.append(Individual(self._circuit(member.circuit, u), generation.N))
+
+        # Steps violating the parameter constraints are repaired or dropped.
+        if Generation.parameter_constraints is not None:
+            violators = Generation.parameter_constraints.apply(steps)
+            steps = [ind for ind, bad in zip(steps, violators) if not bad]
+        # Steps simulated before are dropped or take over their results.
+        if duplicate_index is not None:
+            steps = [ind for ind in steps if duplicate_index.admit(ind)]
+        pending = [ind for ind in steps if ind.status != 'simulated']
+        if pending:
+            simulated = self._simulate(workers, [ind.circuit for ind in pending],
+                                       generation)
+            for ind, good in zip(pending, simulated):
+                if good:
+                    ind.status = 'simulated'
+        steps = [ind for ind in steps if ind.status == 'simulated']
+        generation.individuals.extend(steps)
+        return steps
@@ -0,0 +1,235 @@
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _dominated(front: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """ Mark the rows of points which a row of front dominates. """
+    if len(front) == 0:
+        return np.zeros(len(points), dtype=bool)
+    # ge[j, i] is True when front[j] is not worse than points[i] in all
+    # objectives, gt[j, i] when it is better in at least one.
+    ge = (front[:, None, :] >= points[None, :, :]).all(axis=2)
+    gt = (front[:, None, :] > points[None, :, :]).any(axis=2)
+    return (ge & gt).any(axis=0)
+
+
+def nondominated_mask(points: np.ndarray, chunk_size: int = 256) -> np.ndarray:
+    """
+    Mark the non-dominated rows of points where every column is
+    to be maximized. Only the first one of duplicate rows is marked.
+
+    A point can only be dominated by the points before it in
+    descending lexicographic order, so the points are swept in that
+    order, chunk_size at a time, and compared with the front found
+    so far. Memory is bounded by the front size times chunk_size.
+
+    Args:
+        points (numpy.ndarray): (n, m) objective values.
+        chunk_size (int): number of points compared at once.
+
+    Returns:
+        numpy.ndarray: (n,) boolean mask.
+    """
+    points = np.asarray(points, dtype=float)
+    mask = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return mask
+    _, first = np.unique(points, axis=0, return_index=True)
+    # np.lexsort sorts by its last key first.
+    order = first[np.lexsort(-points[first].T[::-1])]
+    front = points[:0]
+    for start in range(0, len(order), chunk_size):
+        rows = order[start:start + chunk_size]
+        chunk = points[rows]
+        kept = ~_dominated(front, chunk)
+        rows, chunk = rows[kept], chunk[kept]
+        kept = ~_dominated(chunk, chunk)
+        mask[rows[kept]] = True
+        front = np.concatenate((front, chunk[kept]))
+    return mask
+
+
+def nondominated(points: np.ndarray) -> np.ndarray:
+    """
+    Filter the non-dominated rows of points where every column
+    is to be maximized. Duplicate rows are kept only once.
+
+    Args:
+        points (numpy.ndarray): (n, m) objective values.
+
+    Returns:
+        numpy.ndarray: (k, m) non-dominated objective values.
+    """
+    points = np.asarray(points, dtype=float)
+    return points[nondominated_mask(points)]
+
+
+def _minimization_nondominated(points):
+    return -nondominated(-points)
+
+
+def _hypervolume_2d(points, reference):
+    """ Dimension sweep for two objectives which are minimized. """
+    points = points[np.argsort(points[:, 0])]
+    x_next = np.append(points[1:, 0], reference[0])
+    return float(np.sum((x_next - points[:, 0]) * (reference[1] - points[:, 1])))
+
+
+def _wfg(points, reference):
+    """
+    WFG algorithm (While, Bradstreet and Barone, 2012) for
+    non-dominated points which are minimized.
+    """
+    if points.shape[1] == 2:
+        return _hypervolume_2d(points, reference)
+    if len(points) == 1:
+        return float(np.prod(reference - points[0]))
+
+    # Processing the points from the worst in the last objective
+    # keeps the limited sets small.
+    points = points[np.argsort(-points[:, -1])]
+    volume = 0.0
+    for k in range(len(points)):
+        volume += float(np.prod(reference - points[k]))
+        if k + 1 < len(points):
+            limited = np.maximum(points[k + 1:], points[k])
+            volume -= _wfg(_minimization_nondominated(limited), reference)
+    return volume
+
+
+def hypervolume(points, reference) -> float:
+    """
+    Hypervolume dominated by the points where every objective
+    is to be maximized.
+
+    Args:
+        points (numpy.ndarray): (n, m) objective values.
+        reference (List[float]): reference point which is worse
+            than the points in all of the objectives. Points which
+            do not dominate it do not contribute to the volume.
+
+    Returns:
+        float: hypervolume
+    """
+    points = np.asarray(points, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    if len(points) == 0:
+        return 0.0
+    points = points[(points > reference).all(axis=1)]
+    if len(points) == 0:
+        return 0.0
+    # Work on minimization problem by negating the objectives.
+    return _wfg(_minimization_nondominated(-points), -reference)
+
+
+def _normalize(points, *others):
+    stacked = np.vstack((points,) + others)
+    low = stacked.min(axis=0)
+    span = stacked.max(axis=0) - low
+    span[span == 0] = 1.0
+    return [(p - low) / span for p in (points,) + others]
+
+
+def _nearest_distances(points, order):
+    """ Distance of each point to its nearest neighbour. """
+    diff = points[:, None, :] - points[None, :, :]
+    if order == 1:
+        dist = np.abs(diff).sum(axis=2)
+    else:
+        dist = np.sqrt((diff ** 2).sum(axis=2))
+    np.fill_diagonal(dist, np.inf)
+    return dist.min(axis=1)
+
+
+def spacing(points) -> float:
+    """
+    Schott's spacing metric on the normalized objectives. It is zero
+    when the points are equally spaced.
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return 0.0
+    points, = _normalize(points)
+    d = _nearest_distances(points, order=1)
+    return float(np.sqrt(np.sum((d.mean() - d) ** 2) / (len(d) - 1)))
+
+
+def spread(points) -> float:
+    """
+    Spread (diversity) metric on the normalized objectives. Since
+    the true front is unknown the extreme points of the front are
+    taken as its own boundaries, so the metric reduces to the mean
+    absolute deviation of nearest neighbour distances relative to
+    their mean. It is zero for a uniformly distributed front.
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return 0.0
+    points, = _normalize(points)
+    d = _nearest_distances(points, order=2)
+    if d.mean() == 0:
+        return 0.0
+    return float(np.sum(np.abs(d - d.mean())) / (len(d) * d.mean()))
+
+
+def generational_distance(points, previous_points) -> float:
+    """
+    Generational distance of the points to the previous front. The
+    objectives are normalized with the range of both fronts.
+    """
+    points = np.asarray(points, dtype=float)
+    previous_points = np.asarray(previous_points, dtype=float)
+    if len(points) == 0 or len(previous_points) == 0:
+        return 0.0
+    points, previous_points = _normalize(points, previous_points)
+    diff = points[:, None, :] - previous_points[None, :, :]
+    d = np.sqrt((diff ** 2).sum(axis=2)).min(axis=1)
+    return float(math.sqrt(np.sum(d ** 2)) / len(d))
+
+
+def get_reference_point(targets: Dict[str, str],
+                        reference: Optional[Dict[str, float]] = None) -> List[float]:
+    """
+    Convert the reference point given in the units of the outputs
+    to the space of Individual.targets where 'min' targets are
+    inverted. Missing values default to 0 which corresponds to
+    infinitely bad 'min' targets as well.
+    """
+    reference = {} if reference is None else reference
+    point = []
+    for target_name, operation in targets.items():
+        value = float(reference.get(target_name, 0.0))
+        if operation == 'min':
+            value = 1 / value if value != 0 else 0.0
+        point.append(value)
+    return point
+
+
+def front_metrics(points, reference, previous_points=None) -> dict:
+    """
+    Quality metrics of a front.
+
+    Args:
+        points (numpy.ndarray): (n, m) target values of the archive.
+        reference (List[float]): reference point for the hypervolume.
+        previous_points (numpy.ndarray): target values of the previous
+            archive. If None generational distance is not calculated.
+
+    Returns:
+        dict: hypervolume, spread, spacing, generational_distance
+            and front_size.
+    """
+    front = nondominated(points)
+    metrics = {
+        "hypervolume": hypervolume(front, reference),
+        "spread": spread(front),
+        "spacing": spacing(front),
+        "generational_distance": None,
+        "front_size": len(front),
+    }
+    if previous_points is not None:
+        metrics["generational_distance"] = generational_distance(
+            front, nondominated(previous_points))
+    return metrics
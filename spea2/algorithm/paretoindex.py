@@ -0,0 +1,261 @@
+import operator
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .constraints import ConstraintSet
+from .metrics import nondominated_mask
+
+OPERATORS = {
+    '<=': operator.le,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '<': operator.lt,
+    '>': operator.gt,
+}
+
+_CONDITION = re.compile(r'^\s*(\w+)\s*(<=|>=|==|<|>)\s*(\S+)\s*$')
+
+
+def parse_condition(condition: str) -> Tuple[str, str, float]:
+    """ Parse conditions such as 'gain>40' or 'zsarea <= 3e-9'. """
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise ValueError(f"Can not parse the condition {condition}. It should "
+                         f"be like 'gain>40' or 'zsarea<=3e-9'.")
+    name, op, value = match.groups()
+    return name, op, float(value)
+
+
+class ParetoIndex:
+    """
+    Index of every individual simulated during the process which
+    supports range queries on any column and keeps the all-time
+    non-dominated set of feasible individuals up to date. The front
+    is updated as each generation is added by merging its feasible
+    individuals into the front so far.
+
+    Each row is one individual of one generation; archive individuals
+    are indexed separately with archive=True. Range queries use the
+    sorted order of each column which is built on the first query of
+    that column and kept until new rows are added.
+
+    Args:
+        parameter_names (List[str]): topology of the circuit.
+        output_names (List[str]): outputs, constraints and other
+            circuit attributes to be indexed.
+        target_names (List[str]): names of the targets in the order
+            of Individual.targets.
+    """
+
+    def __init__(self, parameter_names: List[str], output_names: List[str],
+                 target_names: List[str]):
+        self.parameter_names = list(parameter_names)
+        self.output_names = list(output_names)
+        self.target_names = list(target_names)
+
+        self._chunks = []
+        self._columns = {name: np.empty(0) for name in self.column_names}
+        self._targets = np.empty((0, len(self.target_names)))
+        self._sorted = {}
+        self._rows = 0
+        self.front = np.empty(0, dtype=np.int64)
+        self._front_targets = np.empty((0, len(self.target_names)))
+
+    @classmethod
+    def from_config(cls, circuit_config: dict, spea2_config: dict):
+        outputs = list(circuit_config["output"])
+        constraints = ConstraintSet.from_config(spea2_config.get("constraints"))
+        for name in list(spea2_config["targets"]) + constraints.names:
+            if name not in outputs:
+                outputs.append(name)
+        return cls(circuit_config["topology"], outputs,
+                   list(spea2_config["targets"]))
+
+    @property
+    def column_names(self) -> List[str]:
+        return (["generation", "archive", "total_error"]
+                + self.parameter_names + self.output_names)
+
+    def __len__(self):
+        self._consolidate()
+        return len(self._columns["generation"])
+
+    def add(self, generation):
+        """ Index the individuals and the archive of the generation. """
+        for archive, inds in ((False, generation.individuals),
+                              (True, generation.archive_inds)):
+            if not inds:
+                continue
+            n = len(inds)
+            fitnesses = [ind.arch_fitness
+                         if archive and getattr(ind, 'coming_from', None) == 'last_arch'
+                         else ind.fitness for ind in inds]
+            chunk = {
+                "generation": np.full(n, generation.kii, dtype=float),
+                "archive": np.full(n, archive, dtype=float),
+                "total_error": np.array([fit.total_error for fit in fitnesses],
+                                        dtype=float),
+            }
+            parameters = np.array([ind.circuit.parameters for ind in inds],
+                                  dtype=float)
+            for i, name in enumerate(self.parameter_names):
+                chunk[name] = parameters[:, i]
+            for name in self.output_names:
+                chunk[name] = np.array(
+                    [_get(ind.circuit, name) for ind in inds], dtype=float)
+            chunk["_targets"] = np.array([ind.targets for ind in inds],
+                                         dtype=float)
+            self._chunks.append(chunk)
+
+            feasible = chunk["total_error"] == 0
+            self._update_front(self._rows + np.flatnonzero(feasible),
+                               chunk["_targets"][feasible])
+            self._rows += n
+
+    def _update_front(self, rows: np.ndarray, targets: np.ndarray):
+        """
+        Merge the feasible rows into the all-time front. Only the old
+        front and the new rows can be on it.
+        """
+        candidates = np.concatenate((self.front, rows))
+        targets = np.concatenate((self._front_targets, targets))
+        mask = nondominated_mask(targets)
+        self.front = candidates[mask]
+        self._front_targets = targets[mask]
+
+    def _consolidate(self):
+        """ Merge the added chunks into the columns. """
+        if not self._chunks:
+            return
+        for name in self.column_names:
+            self._columns[name] = np.concatenate(
+                [self._columns[name]] + [c[name] for c in self._chunks])
+        self._targets = np.concatenate(
+            [self._targets] + [c["_targets"] for c in self._chunks])
+        self._chunks = []
+        self._sorted = {}
+
+    def _sorted_order(self, name):
+        if name not in self._sorted:
+            self._sorted[name] = np.argsort(self._columns[name], kind='stable')
+        return self._sorted[name]
+
+    def query(self, conditions=None, archive=None, pareto=False) -> np.ndarray:
+        """
+        Find the rows which satisfy all of the conditions.
+
+        Args:
+            conditions (Union[Dict[str, Tuple[float, float]], List]): either
+                column -> (low, high) inclusive ranges where None means
+                unbounded, or list of (column, operator, value) tuples or
+                strings such as 'gain>40'.
+            archive (bool): if True only archive rows, if False only
+                generation rows are returned.
+            pareto (bool): if True only rows on the all-time front.
+
+        Returns:
+            numpy.ndarray: indices of the rows in ascending order.
+        """
+        self._consolidate()
+        conditions = self._normalize_conditions(conditions)
+        if archive is not None:
+            conditions.append(("archive", '==', float(archive)))
+
+        rows = None
+        for name, op, value in conditions:
+            if name not in self._columns:
+                raise KeyError(f"{name} is not indexed. Indexed columns "
+                               f"are {self.column_names}")
+            if rows is None:
+                rows = self._range(name, op, value)
+            else:
+                rows = rows[OPERATORS[op](self._columns[name][rows], value)]
+
+        if rows is None:
+            rows = np.arange(len(self._columns["generation"]))
+        rows = np.sort(rows)
+        if pareto:
+            rows = rows[np.isin(rows, self.front)]
+        return rows
+
+    @staticmethod
+    def _normalize_conditions(conditions) -> list:
+        if conditions is None:
+            return []
+        if isinstance(conditions, dict):
+            normalized = []
+            for name, (low, high) in conditions.items():
+                if low is not None:
+                    normalized.append((name, '>=', low))
+                if high is not None:
+                    normalized.append((name, '<=', high))
+            return normalized
+        return [parse_condition(c) if isinstance(c, str) else tuple(c)
+                for c in conditions]
+
+    def _range(self, name, op, value) -> np.ndarray:
+        """ Rows satisfying one condition using the sorted column. """
+        order = self._sorted_order(name)
+        values = self._columns[name][order]
+        if op == '>':
+            return order[np.searchsorted(values, value, 'right'):]
+        elif op == '>=':
+            return order[np.searchsorted(values, value, 'left'):]
+        elif op == '<':
+            return order[:np.searchsorted(values, value, 'left')]
+        elif op == '<=':
+            return order[:np.searchsorted(values, value, 'right')]
+        elif op == '==':
+            return order[np.searchsorted(values, value, 'left'):
+                         np.searchsorted(values, value, 'right')]
+        raise ValueError(f"Unknown operator {op}. Should be one of {list(OPERATORS)}")
+
+    def pareto_front(self) -> np.ndarray:
+        """ Rows of the non-dominated feasible individuals of all generations. """
+        self._consolidate()
+        return np.sort(self.front)
+
+    def table(self, rows) -> Dict[str, np.ndarray]:
+        """ Columns of the given rows. """
+        self._consolidate()
+        table = {name: self._columns[name][rows] for name in self.column_names}
+        table["generation"] = table["generation"].astype(np.int64)
+        table["archive"] = table["archive"].astype(bool)
+        return table
+
+    def save(self, path):
+        """ Save the columns, the front and the sorted orders as .npz file. """
+        self._consolidate()
+        arrays = {"column_" + name: self._columns[name] for name in self.column_names}
+        arrays.update({"sorted_" + name: order for name, order in self._sorted.items()})
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     parameter_names=np.array(self.parameter_names),
+                     output_names=np.array(self.output_names),
+                     target_names=np.array(self.target_names),
+                     targets=self._targets,
+                     front=self.front,
+                     **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls([str(x) for x in data["parameter_names"]],
+                        [str(x) for x in data["output_names"]],
+                        [str(x) for x in data["target_names"]])
+            index._columns = {name: data["column_" + name]
+                              for name in index.column_names}
+            index._sorted = {key[len("sorted_"):]: data[key]
+                             for key in data.files if key.startswith("sorted_")}
+            index._targets = data["targets"]
+            index.front = data["front"]
+            index._rows = len(index._targets)
+            index._front_targets = index._targets[index.front]
+        return index
+
+
+def _get(circuit, name):
+    value = getattr(circuit, name, None)
+    return np.nan if value is None else value
@@ -0,0 +1,78 @@
+import threading
+from typing import Callable, List, Optional
+
+from ..IC import SimulationFailedError, SimulationTrace
+from .workers import StragglerError
+
+
+class RecordingPool:
+    """
+    Worker pool which records every simulation of the pool it wraps
+    into a trace, which is saved when the pool is closed. The trace
+    is replayed by the 'replay' simulator, see IC.ReplaySimulator.
+
+    The simulated circuits are recorded with their outputs and the
+    failed ones as failures. Cancelled jobs, unexpected errors and
+    stragglers which are cut off do not tell anything about the
+    circuit and are not recorded. It is used in place of
+    workers.WorkerPool, below corners.CornerPool and
+    screening.ScreeningPool so that each corner and fidelity is
+    recorded separately.
+
+    Args:
+        workers (workers.WorkerPool): folders and threads.
+        trace (IC.SimulationTrace): trace to add the simulations to.
+        path (str): file the trace is saved to.
+    """
+
+    def __init__(self, workers, trace: SimulationTrace, path: str):
+        self.workers = workers
+        self.trace = trace
+        self.path = path
+        self.recorded = 0
+        self._saved = None
+        self._lock = threading.Lock()
+
+    @property
+    def dispatched(self) -> int:
+        return self.workers.dispatched
+
+    @property
+    def runtime(self) -> float:
+        return self.workers.runtime
+
+    @property
+    def monitor(self):
+        return self.workers.monitor
+
+    def close(self):
+        """ Stop the workers and save the trace, if it has new simulations. """
+        self.workers.close()
+        with self._lock:
+            if self._saved != len(self.trace):
+                self.trace.save(self.path)
+                self._saved = len(self.trace)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, circuits, cancel: Optional[Callable] = None
+            ) -> List[Optional[BaseException]]:
+        """ Simulate the circuits, see workers.WorkerPool.run, and record them. """
+        outcomes = self.workers.run(circuits, cancel)
+        recorded = 0
+        for circuit, outcome in zip(circuits, outcomes):
+            if outcome is None:
+                self.trace.add(circuit)
+            elif isinstance(outcome, SimulationFailedError) and \
+                    not isinstance(outcome, StragglerError):
+                self.trace.add(circuit, failed=True)
+            else:
+                continue
+            recorded += 1
+        with self._lock:
+            self.recorded += recorded
+        return outcomes
@@ -0,0 +1,191 @@
+import math
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from ..IC import ScreeningNetlist
+from .constraints import ConstraintSet
+
+
+class ScreenedOut(Exception):
+    """ The circuit failed the low fidelity screening. """
+
+
+class Screening:
+    """
+    Low fidelity screening of the circuits before their full analysis.
+
+    A circuit passes if its low fidelity outputs satisfy the screening
+    constraints. Constraints of outputs which the low fidelity netlist
+    does not measure, e.g. the transient ones, are not screened. The
+    circuits which fail with the smallest errors are promoted, so that
+    at least promote of each batch gets the full analysis.
+
+    Args:
+        netlist (IC.ScreeningNetlist): the low fidelity netlist.
+        constraint_set (constraints.ConstraintSet): screening constraints.
+        promote (float): between 0 and 1, the least fraction of a batch
+            which is fully simulated.
+    """
+
+    def __init__(self, netlist: ScreeningNetlist, constraint_set: ConstraintSet,
+                 promote: float = 0.1):
+        if not 0 <= promote <= 1:
+            raise ValueError(f"promote should be between 0 and 1 but given {promote}")
+        self.netlist = netlist
+        self.constraint_set = constraint_set
+        self.promote = promote
+
+    @classmethod
+    def from_config(cls, spea2_config: dict, constraint_set: ConstraintSet):
+        """
+        Create from the 'screening' section of the SPEA2 configuration.
+        Returns None if it is not given.
+        """
+        config = spea2_config.get("screening", None)
+        if not config:
+            return None
+        config = config if isinstance(config, dict) else {}
+        netlist = ScreeningNetlist(config.get("ac_points", 10),
+                                   config.get("transient", False),
+                                   config.get("netlist"))
+        if config.get("constraints") is not None:
+            constraint_set = ConstraintSet.from_config(config["constraints"])
+        return cls(netlist, constraint_set, config.get("promote", 0.1))
+
+    def job(self, circuit):
+        """ Copy of the circuit to simulate with the low fidelity netlist. """
+        job = type(circuit).from_trusted(circuit.parameters)
+        job.corner = getattr(circuit, 'corner', None)
+        job.fidelity = self.netlist
+        return job
+
+    def error(self, jobs) -> np.ndarray:
+        """ Total error of the screening constraints of the measured outputs. """
+        columns = self.constraint_set.columns(jobs)
+        error = np.zeros(len(jobs))
+        for constraint in self.constraint_set.constraints:
+            violation = constraint.violation(constraint.expression(columns))
+            error += np.nan_to_num(violation, nan=0.0)
+        return error
+
+    def select(self, jobs) -> np.ndarray:
+        """ Whether each of the simulated jobs gets the full analysis. """
+        if not jobs:
+            return np.zeros(0, dtype=bool)
+        error = self.error(jobs)
+        passed = error <= 0
+        missing = math.ceil(self.promote * len(jobs)) - int(passed.sum())
+        if missing > 0:
+            failed = np.flatnonzero(~passed)
+            passed[failed[np.argsort(error[failed], kind='stable')[:missing]]] = True
+        return passed
+
+
+class ScreeningPool:
+    """
+    Worker pool which simulates the circuits with the low fidelity
+    netlist first and only those which pass the screening with the
+    full one. It is used in place of workers.WorkerPool, the circuits
+    which are screened out fail with ScreenedOut so that they are
+    replaced. The simulations and the simulator time of each tier and
+    the rejections are counted, see summary.
+
+    Args:
+        workers (workers.WorkerPool): folders and threads.
+        screening (Screening): the low fidelity tier.
+        full (Union[workers.WorkerPool, corners.CornerPool]): simulates
+            the full analysis. Defaults to workers.
+    """
+
+    TIERS = ('screen', 'full')
+
+    def __init__(self, workers, screening: Screening, full=None):
+        self.workers = workers
+        self.screening = screening
+        self.full = workers if full is None else full
+        self.stats = {tier: {"simulations": 0, "seconds": 0.0} for tier in self.TIERS}
+        self.screened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def dispatched(self) -> int:
+        """ Simulations of both tiers of the last run of the calling thread. """
+        return getattr(self._local, 'dispatched', 0)
+
+    @property
+    def runtime(self) -> float:
+        return getattr(self._local, 'runtime', 0.0)
+
+    @property
+    def monitor(self):
+        return self.workers.monitor
+
+    def close(self):
+        self.full.close()
+        self.workers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count(self, tier: str, pool):
+        self._local.dispatched += pool.dispatched
+        self._local.runtime += pool.runtime
+        with self._lock:
+            self.stats[tier]["simulations"] += pool.dispatched
+            self.stats[tier]["seconds"] += pool.runtime
+
+    def run(self, circuits) -> List[Optional[BaseException]]:
+        """
+        Screen the circuits and fully simulate those which pass.
+
+        Returns:
+            List[Optional[BaseException]]: None for each circuit which is
+                fully simulated, ScreenedOut for the rejected ones and
+                the exception of the failed ones.
+        """
+        self._local.dispatched = 0
+        self._local.runtime = 0.0
+        jobs = [self.screening.job(circuit) for circuit in circuits]
+        results = self.workers.run(jobs)
+        self._count('screen', self.workers)
+
+        simulated = [n for n, outcome in enumerate(results) if outcome is None]
+        passed = self.screening.select([jobs[n] for n in simulated])
+        with self._lock:
+            self.screened += len(simulated)
+            self.rejected += int((~passed).sum())
+        for n, ok in zip(simulated, passed):
+            if not ok:
+                results[n] = ScreenedOut()
+
+        selected = [n for n, ok in zip(simulated, passed) if ok]
+        outcomes = self.full.run([circuits[n] for n in selected])
+        self._count('full', self.full)
+        for n, outcome in zip(selected, outcomes):
+            results[n] = outcome
+        return results
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {tier: dict(stats) for tier, stats in self.stats.items()}
+            summary["screened"] = self.screened
+            summary["rejected"] = self.rejected
+            summary["rejection_rate"] = self.rejected / self.screened if self.screened else 0.0
+        return summary
+
+    def report(self) -> str:
+        """ Human readable summary for the end of the run. """
+        summary = self.summary()
+        lines = [f"{tier}: {summary[tier]['simulations']} simulations, "
+                 f"{summary[tier]['seconds']:.3g} s of simulator time"
+                 for tier in self.TIERS]
+        lines.append(f"Rejected by screening: {summary['rejected']} of "
+                     f"{summary['screened']} ({summary['rejection_rate']:.1%})")
+        return "\n".join(lines)
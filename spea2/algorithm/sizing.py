@@ -0,0 +1,76 @@
+import math
+
+
+class PopulationSizing:
+    """
+    Decide the number of individuals of each generation and the
+    size of the archive. Both can be changed during the process
+    with resize(), or with adapt() to the throughput of the workers.
+
+    Args:
+        N (int): requested number of individuals per generation.
+        archive_size (int): number of archive individuals. Defaults to N
+            and then follows N when it is adapted.
+        round_to_workers (bool): if True the number of individuals
+            is rounded up to a multiple of the available workers so
+            that every simulation wave keeps all of them busy.
+        generation_seconds (float): if given, N is adapted so that a
+            generation is simulated in about this many seconds.
+        min_N (int): lower limit of the adapted N. Defaults to N.
+        max_N (int): upper limit of the adapted N. Defaults to N.
+    """
+
+    def __init__(self, N: int, archive_size: int = None,
+                 round_to_workers: bool = False,
+                 generation_seconds: float = None,
+                 min_N: int = None, max_N: int = None):
+        self.N = N
+        self.archive_size = N if archive_size is None else archive_size
+        self.round_to_workers = round_to_workers
+        self.generation_seconds = generation_seconds
+        self.min_N = N if min_N is None else min_N
+        self.max_N = N if max_N is None else max_N
+        self._archive_follows = archive_size is None
+
+    @classmethod
+    def from_config(cls, spea2_config: dict):
+        return cls(spea2_config["N"],
+                   spea2_config.get("archive_size"),
+                   spea2_config.get("round_to_workers", False),
+                   spea2_config.get("generation_seconds"),
+                   spea2_config.get("min_N"),
+                   spea2_config.get("max_N"))
+
+    def resize(self, N: int = None, archive_size: int = None):
+        """ Change the sizes for the following generations. """
+        if N is not None:
+            self.N = N
+        if archive_size is not None:
+            self.archive_size = archive_size
+
+    def adapt(self, throughput: float = None):
+        """
+        Resize N to the simulations the workers finish in
+        generation_seconds, within min_N and max_N.
+
+        Args:
+            throughput (float): simulations per second of all of the
+                workers, None if it is not known yet.
+        """
+        if self.generation_seconds is None or throughput is None:
+            return
+        N = round(throughput * self.generation_seconds)
+        N = min(max(N, self.min_N), self.max_N)
+        self.resize(N, N if self._archive_follows else None)
+
+    def population_size(self, workers: int = 1) -> int:
+        """
+        Args:
+            workers (int): number of workers available for simulation.
+
+        Returns:
+            int: number of individuals of the next generation.
+        """
+        if self.round_to_workers and workers > 1:
+            return math.ceil(self.N / workers) * workers
+        return self.N
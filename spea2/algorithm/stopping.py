@@ -0,0 +1,99 @@
+import time
+from typing import Optional
+
+
+class EarlyStopping:
+    """
+    Decide whether the optimization should stop before
+    maximum_generation is reached. Each criterion is disabled
+    when its value is None.
+
+    Args:
+        hypervolume_epsilon (float): relative hypervolume improvement
+            below which a generation counts as stalled.
+        patience (int): number of consecutive stalled generations
+            after which the process stops.
+        archive_patience (int): number of consecutive generations
+            without a new non-dominated feasible archive member
+            after which the process stops.
+        max_time (float): wall-clock budget in minutes.
+        max_simulations (int): budget of simulator calls.
+    """
+
+    def __init__(
+            self,
+            hypervolume_epsilon: Optional[float] = None,
+            patience: Optional[int] = None,
+            archive_patience: Optional[int] = None,
+            max_time: Optional[float] = None,
+            max_simulations: Optional[int] = None
+    ):
+        if hypervolume_epsilon is not None and patience is None:
+            raise ValueError("patience should be given together "
+                             "with hypervolume_epsilon.")
+        self.hypervolume_epsilon = hypervolume_epsilon
+        self.patience = patience
+        self.archive_patience = archive_patience
+        self.max_time = max_time
+        self.max_simulations = max_simulations
+
+        self.start = time.perf_counter()
+        self.best_hypervolume = None
+        self.stalled_generations = 0
+        self.generations_without_new_member = 0
+        self.simulations = 0
+        self.reason = None
+
+    @classmethod
+    def from_config(cls, spea2_config: dict):
+        """ Create from the 'stopping' section of the SPEA2 configuration. """
+        return cls(**spea2_config.get("stopping", None) or {})
+
+    def update(self, metrics: dict, new_members: int, simulations: int) -> Optional[str]:
+        """
+        Update the criteria with the results of the last generation.
+
+        Args:
+            metrics (dict): quality metrics of the last archive.
+            new_members (int): number of new non-dominated feasible
+                individuals in the last archive.
+            simulations (int): number of simulator calls of the
+                last generation.
+
+        Returns:
+            str: the reason to stop or None if the process should go on.
+        """
+        self.simulations += simulations
+
+        if self.hypervolume_epsilon is not None:
+            hv = metrics["hypervolume"]
+            if self.best_hypervolume is None or \
+                    hv > self.best_hypervolume + \
+                    self.hypervolume_epsilon * abs(self.best_hypervolume):
+                self.best_hypervolume = hv
+                self.stalled_generations = 0
+            else:
+                self.stalled_generations += 1
+            if self.stalled_generations >= self.patience:
+                self.reason = (f"hypervolume improved less than "
+                               f"{self.hypervolume_epsilon} for "
+                               f"{self.patience} generations")
+
+        if self.archive_patience is not None:
+            if new_members:
+                self.generations_without_new_member = 0
+            else:
+                self.generations_without_new_member += 1
+            if self.generations_without_new_member >= self.archive_patience:
+                self.reason = (f"no new archive member for "
+                               f"{self.archive_patience} generations")
+
+        if self.max_time is not None and \
+                (time.perf_counter() - self.start) / 60 >= self.max_time:
+            self.reason = f"wall-clock budget of {self.max_time} min is spent"
+
+        if self.max_simulations is not None and \
+                self.simulations >= self.max_simulations:
+            self.reason = f"budget of {self.max_simulations} simulations is spent"
+
+        return self.reason
@@ -0,0 +1,508 @@
+import copy
+import json
+import lzma
+import os
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..IC import OP_FIELDS
+from .fitness import Fitness
+
+# Rough footprint of an Individual and its two Fitness objects.
+_INDIVIDUAL_SIZE = 600
+
+
+def _fitness_key(fitness) -> tuple:
+    return tuple(tuple(v) if isinstance(v, list) else v
+                 for v in (getattr(fitness, name) for name in Fitness.__slots__))
+
+
+def _circuit_size(circuit) -> int:
+    size = sys.getsizeof(circuit) + sys.getsizeof(circuit.__dict__)
+    for value in vars(circuit).values():
+        size += getattr(value, 'nbytes', 0) + sys.getsizeof(value)
+    return size
+
+
+class _Spilled:
+    """ Generation pickled to a file, or to bytes once the pool is saved. """
+
+    __slots__ = ("path", "blob")
+
+    def __init__(self, path=None, blob=None):
+        self.path = path
+        self.blob = blob
+
+    def load(self):
+        if self.blob is not None:
+            return pickle.loads(self.blob)
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+    def read_blob(self) -> bytes:
+        if self.blob is not None:
+            return self.blob
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class InstanceStore:
+    """
+    Snapshots of the generations for the instance saving format.
+
+    Circuits are not copied since they are never changed once they are
+    simulated, so a circuit carried over in the archive is stored once
+    and shared by every generation referring to it. Only the mutable
+    parts of an individual, i.e. its fitness and status, are copied and
+    an individual whose snapshot did not change since the last
+    generation is shared as well. With only_cct the snapshots are the
+    circuits themselves.
+
+    When memory_limit is given, the oldest generations are pickled to
+    spill_path once the estimated size of the generations in memory
+    exceeds it. They are loaded again on access, so sharing between
+    a spilled generation and the others is lost after loading.
+
+    Args:
+        only_cct (bool): keep only the circuits of the individuals.
+        memory_limit (float): memory ceiling in MB. None for no limit.
+        spill_path (str): folder in which a temporary folder for the
+            spilled generations is created. Defaults to the system's
+            temporary folder.
+    """
+
+    def __init__(self, only_cct=False, memory_limit: Optional[float] = None,
+                 spill_path: Optional[str] = None):
+        self.only_cct = only_cct
+        self.memory_limit = None if memory_limit is None else memory_limit * 2 ** 20
+        self.spill_path = spill_path
+        self._generations = []
+        self._sizes = []
+        self._snapshots = {}
+        self._spill_folder = None
+        self.spilled = 0
+
+    @classmethod
+    def from_config(cls, only_cct, spea2_config: dict):
+        """ Create from the 'storage' section of the SPEA2 configuration. """
+        config = spea2_config.get("storage", None) or {}
+        return cls(only_cct, config.get("memory_limit"), config.get("spill_path"))
+
+    def __len__(self):
+        return len(self._generations)
+
+    def __getitem__(self, kii):
+        if isinstance(kii, slice):
+            return [self[k] for k in range(*kii.indices(len(self)))]
+        generation = self._generations[kii]
+        if isinstance(generation, _Spilled):
+            return generation.load()
+        return generation
+
+    def __iter__(self):
+        for kii in range(len(self)):
+            yield self[kii]
+
+    def append(self, generation):
+        """ Append a snapshot of the generation. """
+        snapshots = {}
+        snapshot = copy.copy(generation)
+        snapshot.individuals = [self._snapshot(ind, snapshots)
+                                for ind in generation.individuals]
+        snapshot.archive_inds = [self._snapshot(ind, snapshots)
+                                 for ind in generation.archive_inds]
+        # Only the last generation can share its snapshots with the next one.
+        self._snapshots = snapshots
+        self._generations.append(snapshot)
+        self._sizes.append(self._size(snapshot))
+        if self.memory_limit is not None:
+            self._spill()
+
+    def _snapshot(self, ind, snapshots):
+        if self.only_cct:
+            return ind.circuit
+        key = (id(ind.circuit), _fitness_key(ind.fitness),
+               _fitness_key(ind.arch_fitness), ind.status,
+               getattr(ind, 'coming_from', None))
+        snapshot = self._snapshots.get(key) or snapshots.get(key)
+        if snapshot is None:
+            snapshot = copy.copy(ind)
+            snapshot.fitness = ind.fitness.copy()
+            snapshot.arch_fitness = ind.arch_fitness.copy()
+        snapshots[key] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _size(snapshot) -> int:
+        """ Estimated memory of the circuits and individuals of a generation. """
+        size = 0
+        seen = set()
+        for item in snapshot.individuals + snapshot.archive_inds:
+            circuit = getattr(item, 'circuit', item)
+            if circuit is not item and id(item) not in seen:
+                seen.add(id(item))
+                size += _INDIVIDUAL_SIZE
+            if id(circuit) not in seen:
+                seen.add(id(circuit))
+                size += _circuit_size(circuit)
+        return size
+
+    def _spill(self):
+        """ Pickle the oldest generations until the rest fits in memory. """
+        resident = [k for k, gen in enumerate(self._generations)
+                    if not isinstance(gen, _Spilled)]
+        total = sum(self._sizes[k] for k in resident)
+        # The last generation is kept for the snapshots of the next one.
+        for kii in resident[:-1]:
+            if total <= self.memory_limit:
+                break
+            if self._spill_folder is None:
+                if self.spill_path is not None:
+                    os.makedirs(self.spill_path, exist_ok=True)
+                self._spill_folder = tempfile.mkdtemp(prefix='spea2_pool_',
+                                                      dir=self.spill_path)
+            path = os.path.join(self._spill_folder, f"gen-{kii}.pkl")
+            with open(path, 'wb') as f:
+                pickle.dump(self._generations[kii], f, pickle.HIGHEST_PROTOCOL)
+            self._generations[kii] = _Spilled(path)
+            total -= self._sizes[kii]
+            self.spilled += 1
+
+    def __getstate__(self):
+        # Spilled generations are saved as pickled bytes so that the
+        # saved pool does not depend on the spill files, and are still
+        # loaded one at a time after loading the pool.
+        state = self.__dict__.copy()
+        state["_generations"] = [_Spilled(blob=gen.read_blob())
+                                 if isinstance(gen, _Spilled) else gen
+                                 for gen in self._generations]
+        state["_snapshots"] = {}
+        state["_spill_folder"] = None
+        return state
+
+    def cleanup(self):
+        """
+        Delete the spill files. Spilled generations can not be accessed
+        afterwards unless the store has been pickled before.
+        """
+        if self._spill_folder is not None:
+            shutil.rmtree(self._spill_folder, ignore_errors=True)
+            self._spill_folder = None
+
+
+def _shuffle(array: np.ndarray) -> bytes:
+    """ Bytes of the values grouped by their position, which compress better. """
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype, shape) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    array = np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(array).view(dtype).reshape(shape)
+
+
+class CompressedStore:
+    """
+    Generations of the compressed saving format: the values the numpy
+    format keeps, i.e. the parameters, the outputs and the operating
+    points of the individuals and the archive, written to one file as
+    the run goes.
+
+    Every field of a generation is a separately compressed chunk, so a
+    generation, or one field of it, is read without decompressing the
+    others. An archive is mostly the archive of the generation before,
+    so it is stored as its membership: each member is a reference to a
+    row of the previous archive or of the individuals of the same
+    generation with the same values, and only the other members are
+    stored. Every keyframe_interval generations the archive is stored
+    in full so that reading a generation decodes at most that many
+    archives.
+
+    The file is the chunks followed by the directory of their offsets,
+    compressed json, and the offset of the directory:
+
+        b'SPEA2GZ1' chunk ... chunk directory <directory offset, 8 bytes>
+
+    Args:
+        topology (List[str]): names of the parameters.
+        outputs (List[str]): names of the outputs.
+        op_shape (tuple): (transistors, 12) if the operating points are
+            stored, None otherwise.
+        codec (str): 'zlib' or 'lzma'.
+        level (int): compression level of the codec, None for its
+            default.
+        keyframe_interval (int): generations between the archives
+            stored in full.
+        shuffle (bool): group the bytes of the values by position
+            before compressing them.
+        spill_path (str): folder in which the file is written until the
+            pool is saved. Defaults to the system's temporary folder.
+    """
+
+    CODECS = ('zlib', 'lzma')
+    MAGIC = b'SPEA2GZ1'
+    _TRAILER = struct.Struct('<Q')
+
+    def __init__(self, topology: List[str], outputs: List[str], op_shape=None,
+                 codec: str = 'zlib', level: Optional[int] = None,
+                 keyframe_interval: int = 16, shuffle: bool = True,
+                 spill_path: Optional[str] = None):
+        if codec not in self.CODECS:
+            raise ValueError(f"codec should be one of {self.CODECS} but given {codec}")
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval should be at least 1 "
+                             f"but given {keyframe_interval}")
+        self.topology = list(topology)
+        self.outputs = list(outputs)
+        self.op_shape = None if op_shape is None else tuple(op_shape)
+        self.codec = codec
+        self.level = level
+        self.keyframe_interval = keyframe_interval
+        self.shuffle = shuffle
+        self.spill_path = spill_path
+        self.path = None
+        self.generations = []
+        # Bytes of the values before and after compression
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self._file = None
+        self._temporary = False
+        self._last_keys = {}
+        self._cache = None
+
+    @classmethod
+    def from_config(cls, circuit_config: dict, spea2_config: dict):
+        """ Create from the 'storage' section of the SPEA2 configuration. """
+        config = spea2_config.get("storage", None) or {}
+        op_shape = None
+        if circuit_config.get("operating_point", False):
+            op_shape = (circuit_config["transistor_number"], len(OP_FIELDS))
+        return cls(circuit_config["topology"], circuit_config["output"], op_shape,
+                   config.get("codec", 'zlib'), config.get("level"),
+                   config.get("keyframe_interval", 16), config.get("shuffle", True),
+                   config.get("spill_path"))
+
+    def __len__(self):
+        return len(self.generations)
+
+    def __iter__(self):
+        for kii in range(len(self)):
+            yield self[kii]
+
+    @property
+    def fields(self) -> List[str]:
+        fields = ["parameters"] + self.outputs
+        return fields + ["operating_point"] if self.op_shape is not None else fields
+
+    def _arrays(self, inds) -> Dict[str, np.ndarray]:
+        """ Values of the circuits of the individuals, a row per individual. """
+        circuits = [ind.circuit for ind in inds]
+        arrays = {"parameters": np.array([c.parameters for c in circuits], dtype=float)
+                  .reshape(len(circuits), len(self.topology))}
+        for name in self.outputs:
+            arrays[name] = np.array([getattr(c, name, np.nan) for c in circuits],
+                                    dtype=float)
+        if self.op_shape is not None:
+            op = np.full((len(circuits),) + self.op_shape, np.nan, dtype=np.float32)
+            for n, c in enumerate(circuits):
+                if getattr(c, 'operating_point', None) is not None:
+                    op[n] = c.operating_point
+            arrays["operating_point"] = op
+        return arrays
+
+    def _keys(self, arrays: Dict[str, np.ndarray]) -> List[bytes]:
+        """ Bytes of all values of each row, equal rows are the same member. """
+        n = len(arrays["parameters"])
+        if n == 0:
+            return []
+        rows = np.concatenate([arrays[field].reshape(n, -1).view(np.uint8)
+                               for field in self.fields], axis=1)
+        return [row.tobytes() for row in rows]
+
+    def _open(self):
+        if self._file is None:
+            if self.spill_path is not None:
+                os.makedirs(self.spill_path, exist_ok=True)
+            descriptor, self.path = tempfile.mkstemp(prefix='spea2_pool_', suffix='.gens',
+                                                     dir=self.spill_path)
+            self._file = os.fdopen(descriptor, 'w+b')
+            self._file.write(self.MAGIC)
+            self._temporary = True
+        return self._file
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'lzma':
+            return lzma.compress(data, preset=self.level)
+        return zlib.compress(data, -1 if self.level is None else self.level)
+
+    def _decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data) if self.codec == 'lzma' else zlib.decompress(data)
+
+    def _write(self, array: np.ndarray) -> list:
+        """ Append the array as a chunk, returns its directory entry. """
+        array = np.ascontiguousarray(array)
+        data = _shuffle(array) if self.shuffle else array.tobytes()
+        chunk = self._compress(data)
+        file = self._open()
+        file.seek(0, os.SEEK_END)
+        offset = file.tell()
+        file.write(chunk)
+        self.raw_bytes += array.nbytes
+        self.compressed_bytes += len(chunk)
+        return [offset, len(chunk), list(array.shape), array.dtype.str]
+
+    def _read(self, entry: list) -> np.ndarray:
+        offset, size, shape, dtype = entry
+        self._file.seek(offset)
+        data = self._decompress(self._file.read(size))
+        if self.shuffle:
+            return _unshuffle(data, dtype, shape)
+        return np.frombuffer(data, dtype).reshape(shape).copy()
+
+    def append(self, generation):
+        """ Compress the values of the generation and write them to the file. """
+        kii = len(self.generations)
+        population = self._arrays(generation.individuals)
+        archive = self._arrays(generation.archive_inds)
+        entry = {field: self._write(population[field]) for field in self.fields}
+
+        keys = self._keys(archive)
+        keyframe = kii % self.keyframe_interval == 0
+        # source of each member: 0 stored, 1 previous archive, 2 individuals
+        source = np.zeros(len(keys), dtype=np.int8)
+        reference = np.zeros(len(keys), dtype=np.int32)
+        if not keyframe:
+            own = {}
+            for n, key in enumerate(self._keys(population)):
+                own.setdefault(key, n)
+            for n, key in enumerate(keys):
+                if key in self._last_keys:
+                    source[n], reference[n] = 1, self._last_keys[key]
+                elif key in own:
+                    source[n], reference[n] = 2, own[key]
+        stored = source == 0
+        entry["keyframe"] = keyframe
+        entry["arch_source"] = self._write(source)
+        entry["arch_reference"] = self._write(reference)
+        for field in self.fields:
+            entry["arch_" + field] = self._write(archive[field][stored])
+
+        self._last_keys = {}
+        for n, key in enumerate(keys):
+            self._last_keys.setdefault(key, n)
+        self.generations.append(entry)
+
+    def _population(self, kii: int, fields=None) -> Dict[str, np.ndarray]:
+        entry = self.generations[kii]
+        return {field: self._read(entry[field]) for field in fields or self.fields}
+
+    def _archive(self, kii: int) -> Dict[str, np.ndarray]:
+        """ Archive of the generation, decoded from the last keyframe before it. """
+        cached, cached_kii = None, None
+        if self._cache is not None:
+            cached_kii, cached = self._cache
+            if cached_kii == kii:
+                return cached
+        # Continue from the cached archive if it is on the way, e.g.
+        # when the generations are read in order.
+        start = kii
+        while not self.generations[start]["keyframe"] and cached_kii != start - 1:
+            start -= 1
+        archive = None if self.generations[start]["keyframe"] else cached
+        for k in range(start, kii + 1):
+            entry = self.generations[k]
+            source = self._read(entry["arch_source"])
+            reference = self._read(entry["arch_reference"])
+            stored = {field: self._read(entry["arch_" + field]) for field in self.fields}
+            if entry["keyframe"]:
+                archive = stored
+                continue
+            population = None
+            if (source == 2).any():
+                population = self._population(k)
+            decoded = {}
+            for field in self.fields:
+                values = np.empty((len(source),) + stored[field].shape[1:],
+                                  dtype=stored[field].dtype)
+                values[source == 0] = stored[field]
+                if (source == 1).any():
+                    values[source == 1] = archive[field][reference[source == 1]]
+                if population is not None:
+                    values[source == 2] = population[field][reference[source == 2]]
+                decoded[field] = values
+            archive = decoded
+        self._cache = (kii, archive)
+        return archive
+
+    def __getitem__(self, kii) -> Dict[str, np.ndarray]:
+        """
+        Values of the generation as the numpy format names them, e.g.
+        parameters, gain, arch_parameters and arch_gain, a row per
+        individual and per archive member.
+        """
+        if isinstance(kii, slice):
+            return [self[k] for k in range(*kii.indices(len(self)))]
+        if kii < 0:
+            kii += len(self)
+        if not 0 <= kii < len(self):
+            raise IndexError(f"Generation {kii} is not stored.")
+        values = self._population(kii)
+        values.update({"arch_" + field: array
+                       for field, array in self._archive(kii).items()})
+        return values
+
+    def save(self, path: str):
+        """ Write the directory and move the file to path. """
+        file = self._open()
+        file.seek(0, os.SEEK_END)
+        offset = file.tell()
+        file.write(self._compress(json.dumps(self.generations).encode()))
+        file.write(self._TRAILER.pack(offset))
+        file.close()
+        shutil.move(self.path, path)
+        self._temporary = False
+        self.open(path)
+
+    def open(self, path: str):
+        """ Read the directory of the saved file at path. """
+        if self._file is not None:
+            self._file.close()
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(self.MAGIC)) != self.MAGIC:
+            raise ValueError(f"{path} is not a compressed generation file.")
+        self._file.seek(-self._TRAILER.size, os.SEEK_END)
+        end = self._file.tell()
+        offset, = self._TRAILER.unpack(self._file.read(self._TRAILER.size))
+        self._file.seek(offset)
+        self.generations = json.loads(self._decompress(self._file.read(end - offset)))
+        self._cache = None
+
+    def summary(self) -> dict:
+        return {"generations": len(self), "raw_bytes": self.raw_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "ratio": self.raw_bytes / self.compressed_bytes
+                if self.compressed_bytes else 0.0}
+
+    def __getstate__(self):
+        # The values are in the file saved next to the pool, see open.
+        state = self.__dict__.copy()
+        state.update(_file=None, _cache=None, _last_keys={}, generations=[], path=None)
+        return state
+
+    def cleanup(self):
+        """ Close the file, and delete it if the pool is not saved. """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._temporary and self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self._temporary = False
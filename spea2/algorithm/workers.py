@@ -0,0 +1,386 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+from ..IC import SimulationFailedError
+
+
+class StragglerError(SimulationFailedError):
+    """ Raised for a simulation which is cut off for running too long. """
+
+
+class JobCancelled(Exception):
+    """ Outcome of a job which is cancelled before its result is used. """
+
+
+class WorkerMonitor:
+    """
+    Health of the simulation workers, i.e. of the simulation folders.
+
+    Every job sends a heartbeat when it starts and when it ends. Runtimes
+    are kept in a log-scale histogram per worker and the recent ones
+    are used to find stragglers: jobs running longer than
+    straggler_factor times the straggler_percentile of the runtimes.
+    A worker whose jobs fail quarantine_after times in a row is
+    quarantined and its folder is recreated.
+
+    Args:
+        straggler_percentile (float): percentile of the runtimes, between
+            0 and 100, which the straggler deadline is based on. None
+            disables straggler handling.
+        straggler_factor (float): deadline is this many times the
+            percentile.
+        straggler_policy (str): 'redispatch' simulates a straggler in
+            another free folder too and takes the first result,
+            'cutoff' regards it as failed so that it is replaced.
+        min_samples (int): number of finished jobs before stragglers
+            are looked for.
+        quarantine_after (int): consecutive failures of a worker after
+            which its folder is recreated. None disables it.
+        heartbeat_interval (float): seconds between the checks for
+            stragglers while waiting for the jobs.
+    """
+
+    POLICIES = ('redispatch', 'cutoff')
+    # 1 ms to 10^4 s, four bins per decade
+    BINS = np.logspace(-3, 4, 29)
+
+    def __init__(
+            self,
+            straggler_percentile: Optional[float] = None,
+            straggler_factor: float = 3.0,
+            straggler_policy: str = 'redispatch',
+            min_samples: int = 20,
+            quarantine_after: Optional[int] = 5,
+            heartbeat_interval: float = 1.0
+    ):
+        if straggler_policy not in self.POLICIES:
+            raise ValueError(f"straggler_policy should be one of {self.POLICIES} "
+                             f"but given {straggler_policy}")
+        self.straggler_percentile = straggler_percentile
+        self.straggler_factor = straggler_factor
+        self.straggler_policy = straggler_policy
+        self.min_samples = min_samples
+        self.quarantine_after = quarantine_after
+        self.heartbeat_interval = heartbeat_interval
+
+        self._lock = threading.Lock()
+        self.runtimes = deque(maxlen=1000)
+        self.histograms = {}
+        self.heartbeats = {}
+        self.running_since = {}
+        self.jobs = {}
+        self.failures = {}
+        self.consecutive_failures = {}
+        self.quarantines = {}
+        self.stragglers = 0
+        self.redispatched = 0
+        self.cutoff = 0
+
+    @classmethod
+    def from_config(cls, spea2_config: dict):
+        """
+        Create from the 'workers' section of the SPEA2 configuration,
+        except its processes option which is the kind of the pool.
+        """
+        config = dict(spea2_config.get("workers", None) or {})
+        config.pop("processes", None)
+        return cls(**config)
+
+    def started(self, worker):
+        with self._lock:
+            now = time.perf_counter()
+            self.heartbeats[worker] = now
+            self.running_since[worker] = now
+
+    def finished(self, worker, runtime: float, ok: bool) -> bool:
+        """
+        Record a finished job of the worker.
+
+        Returns:
+            bool: True if the worker should be quarantined.
+        """
+        with self._lock:
+            self.heartbeats[worker] = time.perf_counter()
+            self.running_since.pop(worker, None)
+            self.jobs[worker] = self.jobs.get(worker, 0) + 1
+            histogram = self.histograms.setdefault(
+                worker, np.zeros(len(self.BINS) + 1, dtype=np.int64))
+            histogram[np.searchsorted(self.BINS, runtime)] += 1
+            if ok:
+                self.runtimes.append(runtime)
+                self.consecutive_failures[worker] = 0
+                return False
+            self.failures[worker] = self.failures.get(worker, 0) + 1
+            self.consecutive_failures[worker] = \
+                self.consecutive_failures.get(worker, 0) + 1
+            if self.quarantine_after is not None and \
+                    self.consecutive_failures[worker] >= self.quarantine_after:
+                self.consecutive_failures[worker] = 0
+                self.quarantines[worker] = self.quarantines.get(worker, 0) + 1
+                return True
+            return False
+
+    def deadline(self) -> Optional[float]:
+        """ Runtime in seconds after which a job is a straggler. """
+        if self.straggler_percentile is None or len(self.runtimes) < self.min_samples:
+            return None
+        with self._lock:
+            runtimes = np.array(self.runtimes)
+        return float(np.percentile(runtimes, self.straggler_percentile)
+                     * self.straggler_factor)
+
+    def throughput(self, workers: int = 1) -> Optional[float]:
+        """
+        Simulations per second the workers finish, from the median of
+        the recent runtimes. None before min_samples jobs finished.
+        """
+        if len(self.runtimes) < self.min_samples:
+            return None
+        with self._lock:
+            runtimes = np.array(self.runtimes)
+        return workers / max(float(np.median(runtimes)), 1e-9)
+
+    def summary(self) -> dict:
+        with self._lock:
+            runtimes = np.array(self.runtimes)
+            percentiles = {}
+            if len(runtimes):
+                percentiles = {f"p{p}": float(np.percentile(runtimes, p))
+                               for p in (50, 90, 99)}
+                percentiles["max"] = float(runtimes.max())
+            return {
+                "jobs": sum(self.jobs.values()),
+                "failures": sum(self.failures.values()),
+                "stragglers": self.stragglers,
+                "redispatched": self.redispatched,
+                "cutoff": self.cutoff,
+                "quarantines": dict(self.quarantines),
+                "runtime": percentiles,
+                "workers": {
+                    worker: {"jobs": self.jobs[worker],
+                             "failures": self.failures.get(worker, 0),
+                             "histogram": self.histograms[worker].tolist()}
+                    for worker in sorted(self.jobs)},
+            }
+
+    def report(self) -> str:
+        """ Human readable summary for the end of the run. """
+        summary = self.summary()
+        lines = [f"Simulations: {summary['jobs']}, failed: {summary['failures']}, "
+                 f"stragglers: {summary['stragglers']} "
+                 f"(redispatched: {summary['redispatched']}, "
+                 f"cut off: {summary['cutoff']})"]
+        if summary["runtime"]:
+            lines.append("Runtime (s): " + ", ".join(
+                f"{k} {v:.3g}" for k, v in summary["runtime"].items()))
+        for worker, stats in summary["workers"].items():
+            lines.append(f"Worker {worker}: {stats['jobs']} jobs, "
+                         f"{stats['failures']} failed, "
+                         f"quarantined {summary['quarantines'].get(worker, 0)} times")
+        return "\n".join(lines)
+
+
+class WorkerPool:
+    """
+    Simulation folders and the threads simulating circuits in them.
+    A job is given to a folder as soon as the folder is free, so a
+    slow circuit holds up only its own folder. Batches run by several
+    threads at once share the folders. The pool is kept for
+    the whole run so that the folders of stragglers left running in
+    the background are not used until they finish.
+
+    Args:
+        path (str): path to circuit folder or, if multithread > 1,
+            to the folder of the duplicated circuit folders.
+        multithread (int): number of folders and threads.
+        monitor (WorkerMonitor): health of the workers. Defaults to
+            one without straggler handling.
+        repair (Callable[[str], None]): recreates the given folder of a
+            quarantined worker. If None workers are not quarantined.
+    """
+
+    def __init__(self, path: str, multithread: int = 1,
+                 monitor: Optional[WorkerMonitor] = None,
+                 repair: Optional[Callable[[str], None]] = None):
+        if multithread == 1:
+            self.paths = (path,)
+        else:
+            self.paths = tuple(path + str(x) + os.sep for x in range(multithread))
+        self.locks = tuple(threading.Lock() for _ in self.paths)
+        self.monitor = WorkerMonitor() if monitor is None else monitor
+        self.repair = repair
+        self._free = queue.Queue()
+        for worker in range(len(self.paths)):
+            self._free.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=len(self.paths))
+        # Several threads may run batches at the same time, see dispatched.
+        self._local = threading.local()
+
+    @property
+    def dispatched(self) -> int:
+        """ Number of simulations started by the last run of the calling thread. """
+        return getattr(self._local, 'dispatched', 0)
+
+    @dispatched.setter
+    def dispatched(self, value: int):
+        self._local.dispatched = value
+
+    @property
+    def runtime(self) -> float:
+        """ Seconds spent simulating by the last run of the calling thread. """
+        return getattr(self._local, 'runtime', 0.0)
+
+    @runtime.setter
+    def runtime(self, value: float):
+        self._local.runtime = value
+
+    def close(self):
+        """ Stop without waiting for the stragglers left running. """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _simulation(self, circuit, index) -> Callable[[int], None]:
+        """
+        Simulation of the circuit, the index-th one of the run of the
+        calling thread or its speculative copy, which the job runs
+        with the worker it is given.
+        """
+        return lambda worker: circuit.simulate(self.paths[worker], self.locks[worker])
+
+    def _job(self, simulation, worker):
+        self.monitor.started(worker)
+        start = time.perf_counter()
+        ok = False
+        try:
+            simulation(worker)
+            ok = True
+        finally:
+            quarantine = self.monitor.finished(
+                worker, time.perf_counter() - start, ok)
+            if quarantine and self.repair is not None:
+                self.repair(self.paths[worker])
+            # The folder is free before the result is seen by run.
+            self._free.put(worker)
+
+    def _submit(self, circuit, index, running, block=False):
+        try:
+            worker = self._free.get(block)
+        except queue.Empty:
+            return False
+        future = self._executor.submit(self._job, self._simulation(circuit, index), worker)
+        running[future] = (index, circuit, time.perf_counter())
+        return True
+
+    def run(self, circuits, cancel: Optional[Callable] = None
+            ) -> List[Optional[BaseException]]:
+        """
+        Simulate the circuits.
+
+        Args:
+            circuits (List[Circuit]): circuits to simulate.
+            cancel (Callable[[int, Optional[BaseException]], Iterable[int]]):
+                called with the index and the outcome of each circuit
+                once it is resolved, returns the indices of the circuits
+                whose simulations are not needed anymore. Those not yet
+                started are skipped, running ones are left to finish in
+                the background.
+
+        Returns:
+            List[Optional[BaseException]]: None for each circuit which is
+                simulated, the exception of the failed ones and
+                JobCancelled for the cancelled ones.
+        """
+        pending = deque(range(len(circuits)))
+        outcomes = [None] * len(circuits)
+        unresolved = set(pending)
+        running = {}
+        redispatched = set()
+        self.dispatched = 0
+        self.runtime = 0.0
+
+        while unresolved:
+            # If nothing is running, wait for the folders of the
+            # stragglers which were cut off before.
+            while pending and self._submit(circuits[pending[0]], pending[0],
+                                           running, block=not running):
+                pending.popleft()
+                self.dispatched += 1
+
+            deadline = self.monitor.deadline()
+            if deadline is not None:
+                self._handle_stragglers(circuits, running, unresolved,
+                                        redispatched, outcomes, deadline,
+                                        idle=not pending)
+                if not unresolved:
+                    break
+
+            timeout = None if deadline is None else self.monitor.heartbeat_interval
+            done, _ = wait(list(running), timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, circuit, start = running.pop(future)
+                self.runtime += time.perf_counter() - start
+                if index not in unresolved:
+                    continue
+                exception = future.exception()
+                if exception is None:
+                    if circuit is not circuits[index]:
+                        circuits[index].copy_results(circuit)
+                elif not any(i == index for i, _, _ in running.values()):
+                    outcomes[index] = exception
+                else:
+                    continue
+                unresolved.discard(index)
+                if cancel is not None:
+                    self._cancel(cancel(index, exception), pending,
+                                 unresolved, outcomes)
+        return outcomes
+
+    @staticmethod
+    def _cancel(indices: Iterable[int], pending, unresolved, outcomes):
+        cancelled = {i for i in indices if i in unresolved}
+        if not cancelled:
+            return
+        for index in cancelled:
+            outcomes[index] = JobCancelled()
+        unresolved.difference_update(cancelled)
+        remaining = [i for i in pending if i not in cancelled]
+        pending.clear()
+        pending.extend(remaining)
+
+    def _handle_stragglers(self, circuits, running, unresolved, redispatched,
+                           outcomes, deadline, idle):
+        now = time.perf_counter()
+        for future, (index, circuit, start) in list(running.items()):
+            if index not in unresolved or now - start <= deadline:
+                continue
+            if self.monitor.straggler_policy == 'cutoff':
+                outcomes[index] = StragglerError(
+                    f"Simulation took longer than {deadline:.3g} s.")
+                unresolved.discard(index)
+                # Left running, its folder is free once it finishes.
+                del running[future]
+                self.monitor.stragglers += 1
+                self.monitor.cutoff += 1
+            elif idle and index not in redispatched:
+                # Speculative copy in another folder, the first result wins.
+                copy = type(circuit).from_trusted(circuit.parameters.copy())
+                copy.corner = getattr(circuit, 'corner', None)
+                copy.fidelity = getattr(circuit, 'fidelity', None)
+                if not self._submit(copy, index, running):
+                    return
+                redispatched.add(index)
+                self.dispatched += 1
+                self.monitor.stragglers += 1
+                self.monitor.redispatched += 1
@@ -0,0 +1,167 @@
+"""
+Export of GenerationPool to columnar formats.
+
+    $ python -m spea2 export <saved pool> --format parquet --output run.parquet
+
+Each row is one individual of one generation. Rows of the archive are
+marked with archive=True. Columns are
+
+    generation, index, archive, <topology>, <output>,
+    total_error, strength, rawfitness, distance, fitness
+
+Fitness columns are nan when the pool does not contain them, i.e.
+in numpy saving mode or when only_cct is set.
+"""
+import argparse
+import csv
+import os
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+
+FORMATS = ("arrow", "parquet", "csv")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Exporting to Arrow IPC and Parquet requires pyarrow. "
+                          "Install it with 'pip install pyarrow' "
+                          "or export as csv.") from None
+    return pyarrow
+
+
+class TableWriter(metaclass=ABCMeta):
+    """ Write tables, given as dict of columns, one after another. """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @abstractmethod
+    def write(self, table: dict):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrowWriter(TableWriter):
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.pa = _import_pyarrow()
+        self._writer = None
+
+    def _open(self, schema):
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.path, schema)
+
+    def write(self, table: dict):
+        batch = self.pa.RecordBatch.from_pydict(table)
+        if self._writer is None:
+            self._writer = self._open(batch.schema)
+        self._writer.write(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ParquetWriter(ArrowWriter):
+
+    def _open(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.path, schema)
+
+    def write(self, table: dict):
+        batch = self.pa.Table.from_pydict(table)
+        if self._writer is None:
+            self._writer = self._open(batch.schema)
+        self._writer.write_table(batch)
+
+
+class CsvWriter(TableWriter):
+    """
+    Write csv files with at most chunk_rows rows each. If chunk_rows
+    is given files are named <path>.<chunk number>.csv.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = None):
+        super().__init__(path)
+        self.chunk_rows = chunk_rows
+        self._file = None
+        self._writer = None
+        self._rows = 0
+        self._chunk = 0
+        self._header = None
+
+    def _next_file(self):
+        self.close()
+        if self.chunk_rows is None:
+            path = self.path
+        else:
+            root, _ = os.path.splitext(self.path)
+            path = f"{root}.{self._chunk}.csv"
+        self._chunk += 1
+        self._rows = 0
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self._header)
+
+    def write(self, table: dict):
+        if self._header is None:
+            self._header = list(table)
+        rows = zip(*[np.asarray(column).tolist() for column in table.values()])
+        for row in rows:
+            if self._file is None or (self.chunk_rows is not None
+                                      and self._rows >= self.chunk_rows):
+                self._next_file()
+            self._writer.writerow(row)
+            self._rows += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def get_writer(path: str, file_format: str, chunk_rows: int = None) -> TableWriter:
+    if file_format == 'arrow':
+        return ArrowWriter(path)
+    elif file_format == 'parquet':
+        return ParquetWriter(path)
+    elif file_format == 'csv':
+        return CsvWriter(path, chunk_rows)
+    raise ValueError(f"Format should be one of {FORMATS} but given {file_format}")
+
+
+def main(argv=None):
+    from .algorithm import GenerationPool
+
+    parser = argparse.ArgumentParser(prog="python -m spea2 export")
+    parser.add_argument("pool_path",
+                        help="path to the pickled GenerationPool.")
+    parser.add_argument("--format",
+                        choices=FORMATS,
+                        default="parquet",
+                        help="output format.")
+    parser.add_argument("--output",
+                        help="output file. Defaults to <pool_path>.<format>")
+    parser.add_argument("--chunk_rows",
+                        type=int,
+                        default=None,
+                        help="maximum number of rows per csv file.")
+    args = parser.parse_args(argv)
+
+    output = args.output or f"{args.pool_path}.{args.format}"
+    pool = GenerationPool.load(args.pool_path)
+    rows = pool.to_table(output, args.format, args.chunk_rows)
+    print(f"{rows} rows are written to {output}")
+    return 0
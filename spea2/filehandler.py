@@ -1,7 +1,10 @@
+import hashlib
+import json
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, suppress
-from shutil import copy2, copytree, rmtree
+from shutil import copy2, rmtree
 
 _local = threading.local()
 
@@ -29,16 +32,33 @@ def acquire(*locks):
 
 
 class FileHandler:
+    # Name of the file which records the fingerprint of the source
+    # tree a worker folder has been synchronized with.
+    MANIFEST = '.spea2_manifest'
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, scratch_path: str = None,
+                 keep_scratch: bool = False):
+        """
+        Args:
+            path (str): path to the circuit folder.
+            scratch_path (str): folder in which worker folders will be
+                formed. Defaults to <circuitname>_temp next to the
+                circuit folder.
+            keep_scratch (bool): if True the worker folders are not
+                deleted at the end so that the next run can reuse them.
+        """
         self.path = path
+        self.scratch_path = scratch_path
+        self.keep_scratch = keep_scratch
         self.multithread = 1
 
     def form_simulation_environment(self, multithread):
         """
         The circuit folders will be pasted and copied in order for
         one thread to lookup only one folder. The folders will
-        be in <circuitname>_temp folder.
+        be in <circuitname>_temp folder unless scratch_path is given.
+        Folders which are already up to date with the source files
+        are not copied again.
 
         Args:
             multithread (int): number of threads to be used
@@ -49,8 +69,8 @@ class FileHandler:
         if multithread == 1: return
 
         source = self.path
-        source_temp = source[:-1] + '_temp/'
-        dests = [source_temp + str(i) for i in range(8)]
+        source_temp = self._scratch_root()
+        dests = [os.path.join(source_temp, str(i)) for i in range(multithread)]
 
         assert os.path.isdir(source), \
             f"There is no direction as {source}. " \
@@ -63,27 +83,74 @@ class FileHandler:
         with suppress(FileExistsError):
             os.makedirs(source_temp)
 
-        for dest in dests:
-            with suppress(FileExistsError):
-                os.makedirs(dest)
-
-        for dest in dests:
-            self._copy_tree(source, dest)
+        fingerprint = self.fingerprint(source)
+        with ThreadPoolExecutor(max_workers=multithread) as executor:
+            # list() re-raises the first exception of the workers.
+            list(executor.map(
+                lambda dest: self._sync_tree(source, dest, fingerprint), dests))
 
     @staticmethod
-    def _copy_tree(source, destination):
-        for item in os.listdir(source):
-            s = os.path.join(source, item)
-            d = os.path.join(destination, item)
-            if os.path.isdir(s):
-                copytree(s, d)
-            else:
-                if not os.path.exists(d) or os.stat(s).st_mtime - os.stat(d).st_mtime > 1:
-                    copy2(s, d)
+    def fingerprint(source) -> dict:
+        """
+        Hash every file under source.
+
+        Returns:
+            dict: relative file path -> sha1 digest of its content.
+        """
+        files = {}
+        for root, _, names in os.walk(source):
+            for name in names:
+                full_path = os.path.join(root, name)
+                sha1 = hashlib.sha1()
+                with open(full_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        sha1.update(chunk)
+                files[os.path.relpath(full_path, source)] = sha1.hexdigest()
+        return files
+
+    @classmethod
+    def _read_manifest(cls, destination) -> dict:
+        try:
+            with open(os.path.join(destination, cls.MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def _sync_tree(cls, source, destination, fingerprint):
+        """
+        Copy the files of the source whose fingerprint differs from
+        the one recorded in the manifest of the destination, and remove
+        the files of the manifest which were deleted from the source.
+        """
+        manifest = cls._read_manifest(destination)
+        for rel_path in manifest.keys() - fingerprint.keys():
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(destination, rel_path))
+        for rel_path, digest in fingerprint.items():
+            d = os.path.join(destination, rel_path)
+            if manifest.get(rel_path) == digest and os.path.exists(d):
+                continue
+            os.makedirs(os.path.dirname(d), exist_ok=True)
+            copy2(os.path.join(source, rel_path), d)
+
+        if manifest != fingerprint:
+            with open(os.path.join(destination, cls.MANIFEST), 'w') as f:
+                json.dump(fingerprint, f)
+
+    @classmethod
+    def recreate_folder(cls, source, destination):
+        """
+        Delete the worker folder and copy the source files into it
+        again, e.g. after its simulations keep failing.
+        """
+        rmtree(destination, ignore_errors=True)
+        os.makedirs(destination, exist_ok=True)
+        cls._sync_tree(source, destination, cls.fingerprint(source))
 
     def delete_simulation_environment(self):
         """ The folders where simulations executed will be deleted. """
-        if self.multithread == 1: return
+        if self.multithread == 1 or self.keep_scratch: return
 
         path = self.get_folder_path()
         try:
@@ -91,11 +158,16 @@ class FileHandler:
         except OSError as e:
             print("Error ", path, ":", e.strerror)
 
+    def _scratch_root(self):
+        if self.scratch_path is not None:
+            return os.path.normpath(self.scratch_path)
+        return os.path.normpath(self.path) + '_temp'
+
     def get_folder_path(self):
         """
         Returns:
             path to the temporary simulation folder.
         """
         if self.multithread > 1:
-            return self.path[:-1] + '_temp\\'
+            return self._scratch_root() + os.sep
         return self.path
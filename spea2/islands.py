@@ -0,0 +1,318 @@
+"""
+Island model of SPEA2.
+
+Several populations, the islands, are evolved in separate processes
+with their own generations and archives, so the quadratic fitness and
+archive steps scale with the size of an island instead of the total
+population. The islands do not simulate themselves: their circuits are
+sent to the simulation folders of the main process which are shared by
+all of the islands. Every migration_interval generations the best
+non-dominated feasible archive members of each island migrate to the
+islands given by the topology, replacing the worst archive members
+there. The generations of the islands are merged into one
+GenerationPool, the k-th generation of the pool being the k-th
+generations of all islands.
+"""
+import json
+import logging
+import multiprocessing
+import threading
+import traceback
+from typing import Dict, List
+
+import numpy as np
+
+from .algorithm import (
+    DuplicateIndex, Generation, GenerationPool, Individual, LocalSearch, PopulationSizing
+)
+from .algorithm.genetic import selection_fitness
+from .profiling import Profiler
+from .runner import close_workers, configure, create_workers, evolve
+
+
+class MigrationTopology:
+    """
+    Islands each island receives migrants from.
+
+    Args:
+        islands (int): number of islands.
+        topology (Union[str, dict]): 'ring', each island sends to the
+            next one, 'fully_connected', each island sends to all, or
+            'random', a ring in a new random order for every migration.
+            A dict of island -> list of source islands is used as is.
+        rng (numpy.random.Generator): order of the random topology.
+    """
+
+    TOPOLOGIES = ('ring', 'fully_connected', 'random')
+
+    def __init__(self, islands: int, topology='ring', rng=None):
+        if isinstance(topology, dict):
+            self._sources = {int(k): [int(s) for s in v] for k, v in topology.items()}
+            if any(not 0 <= s < islands for v in self._sources.values() for s in v):
+                raise ValueError(f"Sources of the topology should be between 0 and "
+                                 f"{islands - 1}.")
+        elif topology not in self.TOPOLOGIES:
+            raise ValueError(f"topology should be one of {self.TOPOLOGIES} "
+                             f"or a dict but given {topology}")
+        self.islands = islands
+        self.topology = topology
+        self.rng = np.random.default_rng() if rng is None else rng
+
+    def sources(self) -> Dict[int, List[int]]:
+        """ Sources of each island for the next migration. """
+        n = self.islands
+        if isinstance(self.topology, dict):
+            return {i: self._sources.get(i, []) for i in range(n)}
+        if self.topology == 'fully_connected':
+            return {i: [j for j in range(n) if j != i] for i in range(n)}
+        if n == 1:
+            return {0: []}
+        order = list(range(n)) if self.topology == 'ring' else \
+            [int(i) for i in self.rng.permutation(n)]
+        return {order[k]: [order[k - 1]] for k in range(n)}
+
+
+def emigrants(generation, count: int) -> List[Individual]:
+    """
+    Copies of the best, at most count, non-dominated feasible archive
+    members of the generation.
+    """
+    candidates = [ind for ind in generation.archive_inds
+                  if selection_fitness(ind).rawfitness == 0
+                  and selection_fitness(ind).total_error == 0]
+    candidates.sort(key=lambda ind: selection_fitness(ind).fitness)
+    migrants = []
+    for ind in candidates[:count]:
+        migrant = Individual(ind.circuit, generation.N)
+        migrant.fitness = selection_fitness(ind).copy()
+        migrant.status = ind.status
+        migrant.coming_from = 'last_gen'
+        migrants.append(migrant)
+    return migrants
+
+
+def immigrate(generation, immigrants: List[Individual]):
+    """ Replace the worst archive members of the generation with immigrants. """
+    seen = set(ind.circuit for ind in generation.archive_inds)
+    newcomers = []
+    for ind in immigrants:
+        if ind.circuit not in seen:
+            seen.add(ind.circuit)
+            newcomers.append(ind)
+    newcomers = newcomers[:len(generation.archive_inds)]
+    if not newcomers:
+        return
+    archive = sorted(generation.archive_inds, key=lambda ind: selection_fitness(ind).fitness)
+    generation.archive_inds = archive[:len(archive) - len(newcomers)] + newcomers
+
+
+def merge_generations(generations: List[Generation]) -> Generation:
+    """ One generation of the k-th generations of the islands. """
+    merged = Generation(sum(gen.N for gen in generations), generations[0].kii,
+                        sum(gen.archive_size for gen in generations))
+    for gen in generations:
+        merged.individuals.extend(gen.individuals)
+        merged.archive_inds.extend(gen.archive_inds)
+        merged.simulation_count += gen.simulation_count
+        merged.avoided_simulations += gen.avoided_simulations
+    return merged
+
+
+class RemoteWorkers:
+    """ Workers of an island which simulate in the main process. """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.dispatched = 0
+
+    def run(self, circuits):
+        self.conn.send(('run', list(circuits)))
+        simulated, outcomes, self.dispatched = _receive(self.conn)
+        for circuit, result, outcome in zip(circuits, simulated, outcomes):
+            if outcome is None:
+                circuit.copy_results(result)
+        return outcomes
+
+
+def _receive(conn):
+    # Replies of the main process are ('ok', *payload).
+    return conn.recv()[1:]
+
+
+def _island(conn, index, circuit_config, spea2_config, thread, seed):
+    """ Evolve one island, run in its own process. """
+    try:
+        configure(circuit_config, spea2_config)
+        config = spea2_config["islands"]
+        interval = config.get("migration_interval", 10)
+        migrants = config.get("migrants", 2)
+        duplicate_index = DuplicateIndex.from_config(circuit_config, spea2_config)
+
+        def append(generation):
+            conn.send(('generation', generation))
+
+        def migration(kii, generation):
+            if kii % interval == 0:
+                conn.send(('migrate', emigrants(generation, migrants)))
+                immigrate(generation, _receive(conn)[0])
+
+        kii = evolve(append, RemoteWorkers(conn), PopulationSizing.from_config(spea2_config),
+                     np.random.default_rng(seed), spea2_config["maximum_generation"],
+                     thread, duplicate_index, migration=migration,
+                     local_search=LocalSearch.from_config(circuit_config, spea2_config))
+        conn.send(('done', kii, 0 if duplicate_index is None else duplicate_index.avoided))
+    except BaseException:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class IslandServer:
+    """
+    Main process side of the islands. A thread per island simulates
+    the circuits the island sends, exchanges its migrants and merges
+    its generations into the pool.
+
+    Args:
+        workers (workers.WorkerPool): shared by all islands.
+        topology (MigrationTopology): where the migrants go.
+        append (Callable[[Generation], None]): stores the merged
+            generations in order.
+    """
+
+    def __init__(self, workers, topology: MigrationTopology, append):
+        n = topology.islands
+        self.workers = workers
+        self.topology = topology
+        self.append = append
+        self.processes = []
+        self.results = [None] * n
+        self.errors = []
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._next_kii = 0
+        self._emigrants = [[] for _ in range(n)]
+        self._immigrants = {}
+        self._barrier = threading.Barrier(n, action=self._route)
+
+    def _route(self):
+        # Runs once all islands sent their emigrants.
+        self._immigrants = {
+            i: [m for source in sources for m in self._emigrants[source]]
+            for i, sources in self.topology.sources().items()}
+
+    def _collect(self, index, generation):
+        with self._lock:
+            self._generations.setdefault(generation.kii, {})[index] = generation
+            while len(self._generations.get(self._next_kii, ())) == self.topology.islands:
+                parts = self._generations.pop(self._next_kii)
+                self.append(merge_generations([parts[i] for i in sorted(parts)]))
+                self._next_kii += 1
+
+    def serve(self, index, conn):
+        try:
+            while True:
+                kind, *payload = conn.recv()
+                if kind == 'run':
+                    circuits = payload[0]
+                    outcomes = self.workers.run(circuits)
+                    conn.send(('ok', circuits, outcomes, self.workers.dispatched))
+                elif kind == 'migrate':
+                    self._emigrants[index] = payload[0]
+                    self._barrier.wait()
+                    conn.send(('ok', self._immigrants.get(index, [])))
+                elif kind == 'generation':
+                    self._collect(index, payload[0])
+                elif kind == 'done':
+                    self.results[index] = payload
+                    return
+                else:
+                    raise RuntimeError(f"Island {index} failed:\n{payload[0]}")
+        except BaseException as e:
+            self.errors.append(e)
+            self._barrier.abort()
+            for process in self.processes:
+                process.terminate()
+        finally:
+            conn.close()
+
+
+def process_islands(
+        circuit_config: dict,
+        spea2_config: dict,
+        path: str,
+        thread=1,
+        saving_format='instance',
+        only_cct=False,
+        seed=None,
+        profiler=None
+):
+    """
+    process() with the 'islands' section of spea2_config, i.e.
+
+        islands:
+          count: 4
+          migration_interval: 10
+          migrants: 2
+          topology: ring
+
+    N and archive_size are those of each island. Islands stop at
+    maximum_generation, the stopping criteria are not used. The
+    profiler samples the main process, i.e. the simulations.
+
+    Returns:
+        str: path of the saved GenerationPool.
+    """
+    config = spea2_config["islands"]
+    count = config.get("count", 2)
+    configure(circuit_config, spea2_config)
+    seeds = np.random.SeedSequence(
+        spea2_config.get("seed") if seed is None else seed).spawn(count + 1)
+    topology = MigrationTopology(count, config.get("topology", 'ring'),
+                                 np.random.default_rng(seeds[-1]))
+
+    n = spea2_config["N"]
+    pool_config = dict(spea2_config, N=count * n,
+                       archive_size=count * spea2_config.get("archive_size", n))
+    generation_pool = GenerationPool(saving_format, only_cct, circuit_config, pool_config)
+    metrics_logger = logging.getLogger("spea2.metrics")
+
+    def append(generation):
+        generation_pool.append(generation)
+        metrics_logger.info(json.dumps(generation_pool.metrics[-1]))
+
+    workers = create_workers(circuit_config, spea2_config, path, thread)
+    server = IslandServer(workers, topology, append)
+    # Islands are started fresh, the main process runs the worker threads.
+    context = multiprocessing.get_context('spawn')
+    threads = []
+    for index in range(count):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_island, name=f"spea2-island-{index}",
+            args=(child_conn, index, circuit_config, spea2_config, thread, seeds[index]))
+        server.processes.append(process)
+        process.start()
+        child_conn.close()
+        threads.append(threading.Thread(target=server.serve, args=(index, parent_conn),
+                                        name=f"spea2-island-{index}"))
+    profiler = Profiler() if profiler is None else profiler
+    with profiler.stage('islands', 0):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    for process in server.processes:
+        process.join()
+
+    close_workers(workers, generation_pool)
+    if server.errors:
+        raise server.errors[0]
+    kii = min(result[0] for result in server.results)
+    logging.getLogger().info(f"Simulations avoided by eliminating duplicated "
+                             f"offspring: {sum(result[1] for result in server.results)}")
+
+    generation_pool.finalize(kii)
+    generation_pool.save(circuit_config["path_to_output"], circuit_config["name"], kii)
+    generation_pool.release()
+    return generation_pool.saved_file_path
@@ -0,0 +1,146 @@
+"""
+Low overhead profiling of long runs.
+
+    $ python -m spea2 --config_path configs.yaml --profile profile/
+
+A background thread samples the stacks of all threads with
+sys._current_frames and tags each sample with the stage of process()
+(initialize, simulate, fitness, archive, produce, append) and the
+generation. Every `every` generations the samples are written as
+collapsed stacks,
+
+    profile/stacks.gen-0to9.collapsed
+
+one 'frame;frame;... count' line per stack which flamegraph.pl,
+speedscope or inferno read directly, and the main thread of each stage
+is profiled with cProfile,
+
+    profile/<stage>.gen-0to9.prof
+
+which pstats or snakeviz read. cProfile sees only the main thread, so
+the simulations run by the worker threads are found in the samples.
+"""
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)})"
+
+
+class Profiler:
+    """
+    Sampling and per-stage cProfile profiler. A profiler without
+    output_dir is disabled and costs nothing.
+
+    Args:
+        output_dir (str): folder of the output files.
+        interval (float): seconds between the samples.
+        every (int): number of generations per output file.
+    """
+
+    def __init__(self, output_dir: str = None, interval: float = 0.01,
+                 every: int = 10):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.every = every
+        self.enabled = output_dir is not None
+
+        self.stage_name = 'idle'
+        self.kii = 0
+        self._first_kii = 0
+        self._samples = Counter()
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop,
+                                        name='spea2-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling and write what is left. """
+        if not self.enabled or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str, kii: int):
+        """ Tag the samples and profile the main thread during the stage. """
+        if not self.enabled:
+            yield
+            return
+        previous = self.stage_name, self.kii
+        self.stage_name, self.kii = name, kii
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.stage_name, self.kii = previous
+
+    def generation_done(self, kii: int):
+        """ Write the output files after every `every` generations. """
+        if self.enabled and (kii + 1) % self.every == 0:
+            self.flush(kii)
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            tag = f"{self.stage_name};gen-{self.kii}"
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                labels.append(tag)
+                stacks.append(';'.join(reversed(labels)))
+            del frames
+            with self._lock:
+                self._samples.update(stacks)
+
+    def flush(self, kii: int = None):
+        """ Write the samples and the profiles collected since the last flush. """
+        if not self.enabled:
+            return
+        kii = self.kii if kii is None else kii
+        window = f"gen-{self._first_kii}to{kii}"
+        with self._lock:
+            samples, self._samples = self._samples, Counter()
+        if samples:
+            path = os.path.join(self.output_dir, f"stacks.{window}.collapsed")
+            with open(path, 'w') as f:
+                for stack, count in sorted(samples.items()):
+                    f.write(f"{stack} {count}\n")
+        for name, profile in self._profiles.items():
+            profile.dump_stats(os.path.join(self.output_dir, f"{name}.{window}.prof"))
+        self._profiles = {}
+        self._first_kii = kii + 1
@@ -0,0 +1,53 @@
+"""
+Query the index saved next to a GenerationPool.
+
+    $ python -m spea2 query <saved pool> --where "gain>40" --where "zsarea<3e-9" --archive
+    $ python -m spea2 query <saved pool> --pareto
+
+Matching rows are written as csv to the standard output or to --output.
+"""
+import argparse
+import csv
+import sys
+
+from .algorithm import ParetoIndex
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m spea2 query")
+    parser.add_argument("pool_path",
+                        help="path to the pickled GenerationPool or to its "
+                             ".index.npz file.")
+    parser.add_argument("--where",
+                        action='append',
+                        default=[],
+                        help="condition such as 'gain>40'. Can be repeated.")
+    parser.add_argument("--archive",
+                        action='store_true',
+                        help="only archive individuals.")
+    parser.add_argument("--pareto",
+                        action='store_true',
+                        help="only individuals on the front of all generations.")
+    parser.add_argument("--output",
+                        default=None,
+                        help="csv file to write. Defaults to standard output.")
+    args = parser.parse_args(argv)
+
+    path = args.pool_path
+    if not path.endswith('.index.npz'):
+        path += '.index.npz'
+    index = ParetoIndex.load(path)
+
+    rows = index.query(args.where, archive=True if args.archive else None,
+                       pareto=args.pareto)
+    table = index.table(rows)
+
+    f = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(list(table))
+        writer.writerows(zip(*[column.tolist() for column in table.values()]))
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return 0
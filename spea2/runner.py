@@ -0,0 +1,255 @@
+"""
+Steps of a run shared by the single population process of __main__
+and the islands: configuring the classes, forming the workers and
+evolving the generations of one population.
+"""
+import logging
+from functools import partial
+from operator import attrgetter
+
+import numpy as np
+
+from .filehandler import FileHandler
+from .profiling import Profiler
+from .IC import SIMULATORS, ParameterGrid, SimulationTrace, circuit
+from .algorithm import (
+    ConstraintSet, CornerPool, CornerSet, EvolutionaryAlgorithm, FitnessAssigner,
+    Generation, Individual, ParameterConstraints, PopulationSizing, ProcessWorkerPool,
+    RecordingPool, Screening, ScreeningPool, WorkerMonitor, WorkerPool
+)
+
+
+def configure(circuit_config: dict, spea2_config: dict):
+    """
+    Assign the configuration to the class variables and check it. Note
+    that these are runtime assignments and can not be pickled, so every
+    process running the algorithm should call it.
+    """
+    circuit.Circuit.PROPERTIES = circuit_config
+    circuit.Circuit.GRID = ParameterGrid.from_config(circuit_config)
+    Generation.PROPERTIES = circuit_config
+    Individual.TARGETS = spea2_config["targets"]
+    Individual.constraint_set = ConstraintSet.from_config(spea2_config["constraints"])
+    Generation.parameter_constraints = ParameterConstraints.from_config(
+        circuit_config, spea2_config)
+    if Individual.constraint_set.operating_point_constraints and \
+            not circuit_config.get("operating_point", False):
+        raise ValueError("Operating point constraints are given but operating "
+                         "point capture is not enabled. Set operating_point: "
+                         "true in the Circuit configuration.")
+    simulator = circuit_config.get("simulator", "hspice")
+    if simulator not in SIMULATORS:
+        raise ValueError(f"simulator should be one of {SIMULATORS} "
+                         f"but given {simulator}")
+    if simulator == "ngspice" and (circuit_config["type"] != "analog"
+                                   or circuit_config.get("operating_point", False)):
+        raise ValueError("ngspice reads only the .MEAS outputs, digital circuits "
+                         "and operating point capture need HSpice's .dp0 file.")
+    if simulator == "replay" and not (circuit_config.get("trace") or {}).get("path"):
+        raise ValueError("The replay simulator needs the path of a recorded "
+                         "trace in the trace section of the Circuit configuration.")
+    if simulator == "replay" and circuit_config.get("operating_point", False):
+        raise ValueError("Traces record the outputs only, operating point "
+                         "capture can not be replayed.")
+    if spea2_config.get("screening") and circuit_config["type"] != "analog":
+        raise ValueError("Screening derives a low fidelity netlist of the AC "
+                         "analysis, it is only available for analog circuits.")
+
+
+def create_workers(circuit_config: dict, spea2_config: dict, path: str, thread=1):
+    """
+    Folders and threads are kept during the whole run so that slow
+    or failing workers are tracked across generations. Only the
+    duplicated folders are recreated, never the circuit folder itself.
+    Each individual is simulated at every corner if corners are given
+    and, if screening is given, only once it passes the low fidelity
+    screening, which is simulated at the nominal condition. Every
+    simulation is recorded if a trace is given and the simulator is
+    not replaying one. With the processes option of the workers
+    section each folder is simulated by a process instead of a thread.
+    """
+    monitor = WorkerMonitor.from_config(spea2_config)
+    repair = None
+    if thread > 1 and circuit_config.get("simulator", "hspice") != "replay":
+        repair = partial(FileHandler.recreate_folder, circuit_config["path_to_circuit"])
+    if (spea2_config.get("workers") or {}).get("processes", False):
+        pool = workers = ProcessWorkerPool(path, thread, monitor, repair, circuit_config)
+    else:
+        pool = workers = WorkerPool(path, thread, monitor, repair)
+    if circuit_config.get("simulator", "hspice") != "replay":
+        trace = SimulationTrace.from_config(circuit_config)
+        if trace is not None:
+            pool = workers = RecordingPool(pool, trace, circuit_config["trace"]["path"])
+    corner_set = CornerSet.from_config(spea2_config, Individual.constraint_set)
+    if corner_set is not None:
+        workers = CornerPool(pool, corner_set)
+    screening = Screening.from_config(spea2_config, Individual.constraint_set)
+    if screening is not None:
+        workers = ScreeningPool(pool, screening, workers)
+    return workers
+
+
+def close_workers(workers, generation_pool):
+    """ Stop the workers and log their summary. """
+    workers.close()
+    generation_pool.worker_summary = workers.monitor.summary()
+    logging.getLogger().info(f"Workers:\n{workers.monitor.report()}")
+
+    if isinstance(workers, ScreeningPool):
+        generation_pool.worker_summary["screening"] = workers.summary()
+        logging.getLogger().info(f"Screening:\n{workers.report()}")
+        workers = workers.full
+    if isinstance(workers, CornerPool):
+        logging.getLogger().info(f"Corner simulations skipped by early abort: "
+                                 f"{workers.aborted}")
+        workers = workers.workers
+    if isinstance(workers, RecordingPool):
+        logging.getLogger().info(f"Simulations recorded: {workers.recorded}, "
+                                 f"trace of {len(workers.trace)} saved to {workers.path}")
+        workers = workers.workers
+    if isinstance(workers, ProcessWorkerPool):
+        generation_pool.worker_summary["processes"] = workers.summary()
+        logging.getLogger().info(workers.report())
+
+
+def evolve(
+        append,
+        workers,
+        sizing: PopulationSizing,
+        rng: np.random.Generator,
+        maximum_generation: int,
+        thread=1,
+        duplicate_index=None,
+        early_stopping=None,
+        migration=None,
+        local_search=None,
+        profiler=None
+) -> int:
+    """
+    Iterate the generations of one population.
+
+    Args:
+        append (Callable[[Generation], dict]): stores each generation
+            after its archive is selected and returns its metrics.
+        workers (workers.WorkerPool): simulates the circuits.
+        sizing (sizing.PopulationSizing): sizes of the generations,
+            adapted to the throughput of the workers after each one.
+        rng (numpy.random.Generator): all of the randomness.
+        maximum_generation (int): where to stop iteration.
+        thread (int): number of threads, see PopulationSizing.
+        duplicate_index (dedup.DuplicateIndex): offspring simulated
+            before are not simulated again.
+        early_stopping (stopping.EarlyStopping): stopping criteria.
+        migration (Callable[[int, Generation], None]): called with each
+            generation after its archive is selected, before the next
+            generation is produced from it.
+        local_search (localsearch.LocalSearch): refines the best archive
+            members and adds them to the simulated generations.
+        profiler (profiling.Profiler): tags and profiles the stages.
+
+    Returns:
+        int: number of the last generation.
+    """
+    profiler = Profiler() if profiler is None else profiler
+    kii = 0
+
+    # Create first generation with N individual
+    generation = Generation(sizing.population_size(thread), kii,
+                            sizing.archive_size)
+
+    # Initialize the first generation. Either with Randomly,
+    # or using Low-discrepancy sequence.
+    with profiler.stage('initialize', kii):
+        generation.population_initialize('Random', rng=rng)
+
+    # Simulate the individuals of the generation
+    with profiler.stage('simulate', kii):
+        generation.simulate(path=None, multithread=thread, rng=rng, workers=workers)
+
+    # Assign fitness instance to the each individual in the generation
+    with profiler.stage('fitness', kii):
+        FitnessAssigner.assign_fitness_first(generation)
+
+    # Since it is the first generation, archive individuals and individiuals
+    # will be the same unless the archive is smaller than the generation.
+    with profiler.stage('archive', kii):
+        generation.archive_inds = generation.individuals
+        if len(generation.individuals) > generation.archive_size:
+            generation.archive_inds = sorted(
+                generation.individuals,
+                key=attrgetter('fitness.fitness'))[:generation.archive_size]
+
+    # Append to the pool
+    with profiler.stage('append', kii):
+        append(generation)
+    if early_stopping is not None:
+        early_stopping.simulations += generation.simulation_count
+
+    # With the help of the assigned fitness values, the algorithm
+    # can now produce the next generation.
+    with profiler.stage('produce', kii):
+        algorithm = EvolutionaryAlgorithm(generation, generation, duplicate_index, rng)
+        next_generation = algorithm.produce(sizing.population_size(thread),
+                                            sizing.archive_size)
+    profiler.generation_done(kii)
+
+    while kii < maximum_generation - 1:
+        # Increase the current generation number
+        kii += 1
+        print("# Gen: ", kii)
+
+        # Now simulate the new generation in order to calculate
+        # performance values of the each circuit generation has.
+        with profiler.stage('simulate', kii):
+            next_generation.simulate(path=None, multithread=thread,
+                                     algorithm=algorithm, workers=workers)
+
+        # Add the refined archive members before the archive is selected.
+        if local_search is not None and local_search.due(kii):
+            with profiler.stage('local_search', kii):
+                local_search.refine(next_generation, generation.archive_inds,
+                                    workers, rng, duplicate_index)
+
+        # Assign fitness instance to the new generation and arch_fitness
+        # instance to the generation before.
+        with profiler.stage('fitness', kii):
+            FitnessAssigner().assign_fitness(next_generation, generation)
+
+        # Choose archive individuals based on the assigned fitness values
+        with profiler.stage('archive', kii):
+            algorithm = EvolutionaryAlgorithm(generation, next_generation,
+                                              duplicate_index, rng)
+            next_generation.archive_inds = algorithm.select_archive()
+
+        # Exchange archive members with the other populations, if any.
+        if migration is not None:
+            with profiler.stage('migrate', kii):
+                migration(kii, next_generation)
+
+        # Size the next generation to the throughput of the workers.
+        monitor = getattr(workers, 'monitor', None)
+        if monitor is not None:
+            sizing.adapt(monitor.throughput(thread))
+
+        # Iterate to the next generation.
+        with profiler.stage('produce', kii):
+            new_generation = algorithm.produce(sizing.population_size(thread),
+                                               sizing.archive_size)
+
+        # Create a shallow copy of new generation and overrides generation
+        generation = next_generation
+        next_generation = new_generation
+
+        # Append the last generation
+        with profiler.stage('append', kii):
+            metrics = append(generation)
+        profiler.generation_done(kii)
+
+        # Stop if the front does not improve any more or the budget is spent.
+        if early_stopping is not None:
+            reason = early_stopping.update(metrics, algorithm.new_archive_members,
+                                           generation.simulation_count)
+            if reason is not None:
+                logging.getLogger().info(f"Stopped at generation {kii}: {reason}.")
+                break
+    return kii
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from spea2.IC.circuit import AnalogCircuit, Circuit
+from spea2.algorithm import ConstraintSet, Generation, Individual
+
+CIRCUIT_CONFIG = {
+    "name": "amp",
+    "type": "analog",
+    "transistor_number": 6,
+    "path_to_circuit": "circuitfiles/amp/",
+    "path_to_output": None,
+    "technology_L": 130.0e-9,
+    "topology": ["LM1", "LM2", "LM3", "WM1", "WM2", "WM3", "Ib"],
+    "upper_bound": [130.0e-8, 130.0e-8, 130.0e-8, 975.0e-7, 975.0e-7, 975.0e-7, 1.0e-3],
+    "lower_bound": [130.0e-9, 130.0e-9, 130.0e-9, 650.0e-9, 650.0e-9, 650.0e-9, 10.0e-6],
+    "output": ["gain", "bw", "himg", "hreal", "zsarea"],
+}
+
+SPEA2_CONFIG = {
+    "maximum_generation": 6,
+    "N": 12,
+    "targets": {"gain": "max", "bw": "max"},
+    "constraints": {"pm": {"min": 45}, "zsarea": {"max": 5.0e-9}},
+}
+
+
+def fake_simulate(self, path, lock=None):
+    """ Analytic stand-in for HSpice with a gain/bandwidth trade-off. """
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    x = (np.asarray(self.parameters, dtype=float) - lower) / (upper - lower)
+    self.gain = 20 + 40 * x[0] + 5 * x[3]
+    self.bw = 1e6 * (1.2 - x[0]) + 1e5 * x[6]
+    self.himg = -1.0
+    self.hreal = -1.0 + 0.5 * x[2]
+    self.zsarea = 1e-9 * (1 + 5 * x[1])
+
+
+@pytest.fixture
+def configs(tmp_path):
+    circuit_config = dict(CIRCUIT_CONFIG, path_to_output=str(tmp_path) + '/')
+    spea2_config = dict(SPEA2_CONFIG)
+    Circuit.PROPERTIES = circuit_config
+    Circuit.GRID = None
+    Generation.PROPERTIES = circuit_config
+    Generation.parameter_constraints = None
+    Individual.TARGETS = spea2_config["targets"]
+    Individual.constraint_set = ConstraintSet.from_config(spea2_config["constraints"])
+    return circuit_config, spea2_config
+
+
+@pytest.fixture
+def fake_simulator(monkeypatch):
+    monkeypatch.setattr(AnalogCircuit, "simulate", fake_simulate)
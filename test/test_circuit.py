@@ -7,13 +7,13 @@ from spea2.IC.circuit import (
 
 # Test for these properties
 Circuit.PROPERTIES = {
-    "NAME": "comparator",
-    "TYPE": "analog",
-    "TRANSISTOR_NUMBER": 13,
-    "TECHNOLOGY_L": 130e-9,
-    "TOPOLOGY": ["LM", "W1", "W2", "W3", "W4", "W5", "W6", "W7", "W8"],
-    "UPPER_BOUND": [130e-9, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4],
-    "LOWER_BOUND": [130e-9, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6]
+    "name": "comparator",
+    "type": "analog",
+    "transistor_number": 13,
+    "technology_L": 130e-9,
+    "topology": ["LM", "W1", "W2", "W3", "W4", "W5", "W6", "W7", "W8"],
+    "upper_bound": [130e-9, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4, 1e-4],
+    "lower_bound": [130e-9, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6, 1e-6]
 }
 
 
@@ -77,3 +77,31 @@ def test_except_add_sub(first_cct, second_cct):
 
 def test_except_mul_div(first_cct, second_cct):
     pass
+
+
+def test_parameters_are_float64_and_frozen():
+    cct = AnalogCircuit([1.2e-9, 0.22, 0.433, 0.1123, 0.443, 0.123, 0.811, 1e-4, 5])
+    assert cct.parameters.dtype == np.float64
+    with pytest.raises(ValueError):
+        cct.parameters[0] = 1.0
+    with pytest.raises(TypeError):
+        AnalogCircuit([1.2e-9, 0.22, 0.433, 0.1123, 0.443, 0.123, 0.811, 1e-4, "5"])
+
+
+def test_from_trusted():
+    params = np.array([1.2e-9, 0.22, 0.433, 0.1123, 0.443, 0.123, 0.811, 1e-4, 0.5])
+    cct = AnalogCircuit.from_trusted(params)
+    assert cct == AnalogCircuit(list(params))
+    assert cct.t_values is None
+    assert not cct.parameters.flags.writeable
+    with pytest.raises(AttributeError):
+        cct.parameters = params
+
+
+def test_write_param_is_exact(tmp_path):
+    from spea2.IC.simulators import HSpiceSimulator
+    params = np.array([1.3e-7 + 1e-22, 0.1 + 0.2, 975.0e-7, 1.0e-3])
+    HSpiceSimulator(str(tmp_path) + '/', 'amp').write_param(
+        ["LM1", "LM2", "WM1", "Ib"], params)
+    lines = (tmp_path / 'param.cir').read_text().splitlines()[1:]
+    assert [float(line.split('=')[1]) for line in lines] == list(params)
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import Constraint, ConstraintSet, Individual
+from spea2.algorithm.constraints import Expression, phase_margin
+from spea2.algorithm.helperfuncs import calculate_total_error
+
+
+def legacy_total_error(circuit, constraints):
+    """ calculate_total_error before the constraints were compiled. """
+    total_error = 0.0
+    for name, limits in constraints.items():
+        (operation, constant), = limits.items()
+        value = getattr(circuit, name)
+        if operation == 'max' and value > constant or \
+                operation == 'min' and value < constant:
+            total_error += abs(value - constant) / constant
+    return total_error
+
+
+def random_circuits(n, seed=0):
+    rng = np.random.default_rng(seed)
+    circuits = []
+    for _ in range(n):
+        circuit = AnalogCircuit(list(rng.random(7)))
+        circuit.himg, circuit.hreal = rng.normal(size=2)
+        circuit.zsarea = rng.uniform(1e-9, 8e-9)
+        circuit.gain = rng.uniform(20, 60)
+        circuit.bw = rng.uniform(1e5, 1e7)
+        circuits.append(circuit)
+    return circuits
+
+
+def test_phase_margin_matches_property(configs):
+    circuits = random_circuits(200)
+    circuits[0].himg, circuits[0].hreal = 0.0, 1.0
+    pm = phase_margin([c.himg for c in circuits], [c.hreal for c in circuits])
+    assert list(pm) == [c.pm for c in circuits]
+
+
+def test_legacy_constraints(configs):
+    _, spea2_config = configs
+    circuits = random_circuits(100)
+    constraint_set = ConstraintSet.from_config(spea2_config["constraints"])
+    errors = constraint_set.evaluate([Individual(c, 1) for c in circuits])
+    expected = [legacy_total_error(c, spea2_config["constraints"]) for c in circuits]
+    np.testing.assert_allclose(errors, expected, rtol=1e-12)
+    assert calculate_total_error(Individual(circuits[3], 1)) == pytest.approx(expected[3])
+
+
+def test_expression_constraints(configs):
+    circuits = random_circuits(50)
+    constraint_set = ConstraintSet.from_config(
+        ["pm >= 45", "zsarea <= 5e-9", "gain - 20*log10(bw) >= -80", "gain > bw / 1e5"])
+    assert constraint_set.names == ["pm", "zsarea", "gain", "bw"]
+    assert constraint_set.output_names == ["himg", "hreal", "zsarea", "gain", "bw"]
+
+    errors = constraint_set.evaluate([Individual(c, 1) for c in circuits])
+    for circuit, error in zip(circuits, errors):
+        expected = legacy_total_error(circuit, {"pm": {"min": 45}, "zsarea": {"max": 5e-9}})
+        derived = circuit.gain - 20 * math.log10(circuit.bw)
+        expected += max(-80 - derived, 0) / 80
+        expected += max(circuit.bw / 1e5 - circuit.gain, 0)
+        assert error == pytest.approx(expected)
+
+
+def test_missing_output_is_infeasible(configs):
+    circuit = AnalogCircuit([1e-7] * 7)
+    constraint_set = ConstraintSet.from_config(["zsarea <= 5e-9"])
+    assert constraint_set.evaluate([Individual(circuit, 1)])[0] == np.inf
+
+
+@pytest.mark.parametrize('source', ['pm', 'pm == 45', '40 < pm < 50', 'pm >= ',
+                                    'open("x") > 1', 'gain.real >= 1'])
+def test_invalid_constraint(source):
+    with pytest.raises(ValueError):
+        Constraint.parse(source)
+
+
+def test_expression_restricted_names():
+    assert Expression('abs(Vds) - Vdsat', ['Vds', 'Vdsat']).names == ['Vds', 'Vdsat']
+    with pytest.raises(ValueError):
+        Expression('Vds - gain', ['Vds', 'Vdsat'])
@@ -0,0 +1,180 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import (
+    ConstraintSet, Corner, CornerPool, CornerSet, GenerationPool, Individual,
+    JobCancelled, WorkerPool
+)
+
+from conftest import fake_simulate
+
+CORNERS = [Corner('tt', {'vdd': 1.2}), Corner('ss', {'vdd': 1.0}),
+           Corner('ff', {'vdd': 1.4})]
+
+
+def corner_simulate(self, path, lock=None):
+    fake_simulate(self, path, lock)
+    scale = self.corner['vdd'] / 1.2
+    self.gain *= scale
+    self.zsarea *= scale
+
+
+@pytest.fixture
+def corner_simulator(monkeypatch):
+    monkeypatch.setattr(AnalogCircuit, "simulate", corner_simulate)
+
+
+def circuits(n):
+    return [AnalogCircuit.from_trusted(np.array([1.3e-7 + i * 1e-8, 1.3e-7, 1.3e-7,
+                                                 1e-6, 1e-6, 1e-6, 1e-4]))
+            for i in range(n)]
+
+
+def corner_set(configs, **kwargs):
+    _, spea2_config = configs
+    return CornerSet(CORNERS, spea2_config["targets"],
+                     ConstraintSet.from_config(spea2_config["constraints"]), **kwargs)
+
+
+def test_worst_case(configs, corner_simulator):
+    batch = circuits(3)
+    nominal = circuits(3)
+    for cct in nominal:
+        cct.corner = {'vdd': 1.2}
+        corner_simulate(cct, None)
+    with CornerPool(WorkerPool('scratch/', 2), corner_set(configs)) as workers:
+        assert workers.run(batch) == [None] * 3
+        assert workers.dispatched == 9 and workers.aborted == 0
+
+    for cct, nom in zip(batch, nominal):
+        assert cct.corner is None
+        # gain is maximized, so its worst is at the lowest vdd
+        assert cct.gain == pytest.approx(nom.gain / 1.2)
+        assert cct.bw == nom.bw
+        assert cct.corner_error == 0
+        assert cct.corner_outputs.shape == (3, 5)
+        np.testing.assert_allclose(cct.corner_outputs[:, 0],
+                                   [nom.gain, nom.gain / 1.2, nom.gain * 1.4 / 1.2])
+
+
+def test_error_of_the_worst_corner(configs, corner_simulator):
+    circuit_config, spea2_config = configs
+    constraints = ConstraintSet.from_config(["zsarea <= 0.9e-9"])
+    cset = CornerSet(CORNERS, spea2_config["targets"], constraints)
+    cct = circuits(1)[0]
+    jobs = [cset.job(cct, corner) for corner in CORNERS]
+    for job in jobs:
+        job.simulate(None)
+    cset.aggregate(cct, jobs, [None] * 3)
+    errors = constraints.evaluate_circuits(jobs)
+    assert errors[2] > errors[0] > 0
+    assert cct.corner_error == errors[2]
+    # outputs other than the targets are of the worst corner
+    assert cct.zsarea == jobs[2].zsarea
+    assert constraints.evaluate([Individual(cct, 1)])[0] == errors[2]
+
+
+def test_percentile(configs):
+    cset = corner_set(configs, aggregate='percentile', percentile=75)
+    values = np.arange(1.0, 6.0)
+    assert cset._aggregate(values, 'min') == 2.0
+    assert cset._aggregate(values, 'max') == 4.0
+    cset.percentile = 100
+    assert cset._aggregate(values, 'min') == 1.0
+
+
+def test_early_abort(configs, corner_simulator):
+    circuit_config, spea2_config = configs
+    hard = ConstraintSet.from_config(["gain >= 30"])
+    cset = CornerSet(CORNERS, spea2_config["targets"],
+                     ConstraintSet.from_config(spea2_config["constraints"]),
+                     hard_constraints=hard)
+    # The first circuit violates the hard constraint at tt already.
+    batch = [AnalogCircuit.from_trusted(np.array(circuit_config["lower_bound"])),
+             AnalogCircuit.from_trusted(np.array(circuit_config["upper_bound"]))]
+    with CornerPool(WorkerPool('scratch/', 1), cset) as workers:
+        outcomes = workers.run(batch)
+    assert outcomes == [None, None]
+    assert workers.dispatched == 4 and workers.aborted == 2
+    assert np.isnan(batch[0].corner_outputs[1:]).all()
+    # aggregated over the simulated corners only
+    assert batch[0].gain == batch[0].corner_outputs[0, 0]
+
+
+def test_early_abort_with_percentile(configs, corner_simulator):
+    circuit_config, spea2_config = configs
+    cct = AnalogCircuit.from_trusted(np.array(circuit_config["upper_bound"]))
+    nominal = AnalogCircuit.from_trusted(cct.parameters)
+    nominal.corner = {'vdd': 1.2}
+    corner_simulate(nominal, None)
+    # violated at ss only
+    hard = ConstraintSet.from_config([f"gain >= {nominal.gain * 0.9}"])
+
+    cset = CornerSet(CORNERS, spea2_config["targets"], hard, hard_constraints=hard)
+    with CornerPool(WorkerPool('scratch/', 1), cset) as workers:
+        assert workers.run([cct]) == [None]
+    assert workers.dispatched == 2 and workers.aborted == 1
+    assert cct.corner_error > 0
+
+    # one of the three corners may violate the 50th percentile
+    cset = CornerSet(CORNERS, spea2_config["targets"], hard, aggregate='percentile',
+                     percentile=50, hard_constraints=hard)
+    assert cset.tolerated == 1
+    with CornerPool(WorkerPool('scratch/', 1), cset) as workers:
+        assert workers.run([cct]) == [None]
+    assert workers.dispatched == 3 and workers.aborted == 0
+    assert cct.corner_error == 0
+
+    # violated at tt and ss, the percentile can not be met
+    cset.hard_constraints = cset.constraint_set = ConstraintSet.from_config(
+        [f"gain >= {nominal.gain * 1.1}"])
+    with CornerPool(WorkerPool('scratch/', 1), cset) as workers:
+        assert workers.run([cct]) == [None]
+    assert workers.dispatched == 2 and workers.aborted == 1
+    assert cct.corner_error > 0
+
+
+def test_cancel(configs, corner_simulator):
+    batch = circuits(4)
+    for cct in batch:
+        cct.corner = {'vdd': 1.2}
+    with WorkerPool('scratch/', 1) as workers:
+        outcomes = workers.run(batch, lambda index, _: [3] if index == 0 else ())
+    assert outcomes[:3] == [None] * 3 and isinstance(outcomes[3], JobCancelled)
+    assert workers.dispatched == 3
+
+
+def test_from_config(configs):
+    _, spea2_config = configs
+    spea2_config["corners"] = {
+        "aggregate": "worst",
+        "conditions": {"tt": {"vdd": 1.2, "temp": 27}, "ss": {"vdd": 1.08, "temp": 125}},
+        "monte_carlo": {"samples": 4, "seed": 1, "parameters": {"vdd": {"sigma": 0.05}}},
+        "hard_constraints": ["zsarea <= 5e-9"],
+    }
+    cset = CornerSet.from_config(spea2_config, ConstraintSet())
+    assert len(cset) == 6
+    assert [c.values["temp"] for c in cset.corners[2:]] == [27] * 4
+    vdd = [c.values["vdd"] for c in cset.corners[2:]]
+    assert vdd == [c.values["vdd"] for c in CornerSet.from_config(
+        spea2_config, ConstraintSet()).corners[2:]]
+    assert np.mean(vdd) == pytest.approx(1.2, abs=0.1)
+    assert [c.names for c in cset.hard_constraints.constraints] == [["zsarea"]]
+
+    with pytest.raises(ValueError):
+        CornerSet([Corner('a', {'vdd': 1}), Corner('b', {'temp': 1})], {}, ConstraintSet())
+    spea2_config["corners"] = None
+    assert CornerSet.from_config(spea2_config, ConstraintSet()) is None
+
+
+def test_process_with_corners(configs, corner_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    spea2_config["corners"] = {"conditions": {c.name: c.values for c in CORNERS}}
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=2)
+    pool = GenerationPool.load(saved)
+    for ind in pool.pool[-1].individuals:
+        assert ind.circuit.corner_outputs.shape == (3, 5)
+        assert ind.circuit.gain == np.nanmin(ind.circuit.corner_outputs[:, 0])
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import AnalogCircuit, ScreeningNetlist, SimulationFailedError, SimulationTrace
+from spea2.algorithm import GenerationPool, ProcessWorkerPool, SharedBatch
+
+from conftest import CIRCUIT_CONFIG, fake_simulate
+
+
+def circuits(n, seed=0):
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    rng = np.random.default_rng(seed)
+    return [AnalogCircuit.from_trusted(lower + (upper - lower) * rng.random(7))
+            for _ in range(n)]
+
+
+def test_shared_batch(configs):
+    batch_circuits = circuits(3)
+    batch_circuits[1].corner = {"temp": 125.0, "vdd": 1.1}
+    batch_circuits[2].fidelity = ScreeningNetlist(5)
+    batch = SharedBatch.create(batch_circuits, CIRCUIT_CONFIG["output"])
+    try:
+        attached = SharedBatch.attach(batch.header)
+        for row in (0, 1, 2, 4):
+            job = attached.circuit(row, AnalogCircuit)
+            original = batch_circuits[row % 3]
+            np.testing.assert_array_equal(job.parameters, original.parameters)
+            assert job.corner == original.corner
+            assert (job.fidelity is None) == (row % 3 != 2)
+        job = attached.circuit(1, AnalogCircuit)
+        fake_simulate(job, None)
+        del job.zsarea
+        attached.write(1, job)
+        attached.close()
+
+        batch.read(1, batch_circuits[1])
+        assert batch_circuits[1].gain == job.gain
+        assert not hasattr(batch_circuits[1], 'zsarea')
+    finally:
+        batch.release()
+
+
+@pytest.fixture
+def replay_config(configs, tmp_path):
+    """ Circuit configuration replaying a trace of fake_simulate. """
+    circuit_config, _ = configs
+    trace = SimulationTrace(CIRCUIT_CONFIG["topology"], CIRCUIT_CONFIG["output"],
+                            CIRCUIT_CONFIG["lower_bound"], CIRCUIT_CONFIG["upper_bound"])
+    for circuit in circuits(200):
+        fake_simulate(circuit, None)
+        trace.add(circuit)
+    trace.save(str(tmp_path / 'trace.npz'))
+    return dict(circuit_config, simulator='replay',
+                trace={"path": str(tmp_path / 'trace.npz'), "miss": 'fail'})
+
+
+def test_process_workers(replay_config):
+    with ProcessWorkerPool('scratch/', 2, circuit_config=replay_config) as workers:
+        small = circuits(10) + circuits(1, seed=1)
+        outcomes = workers.run(small)
+        assert outcomes[:10] == [None] * 10
+        assert isinstance(outcomes[10], SimulationFailedError)
+        for circuit in small[:10]:
+            expected = AnalogCircuit.from_trusted(circuit.parameters.copy())
+            fake_simulate(expected, None)
+            assert circuit.gain == expected.gain and circuit.zsarea == expected.zsarea
+        small_bytes = workers.summary()["bytes_per_job"]
+
+        outcomes = workers.run(circuits(200))
+        assert outcomes == [None] * 200
+        summary = workers.summary()
+    # the messages of a job do not grow with the batch
+    assert summary["jobs"] == 211
+    assert summary["bytes_per_job"] < 100
+    assert summary["bytes_per_job"] <= small_bytes
+
+
+def test_process_with_process_workers(configs, monkeypatch, tmp_path):
+    circuit_config, spea2_config = configs
+    circuit_config["trace"] = {"path": str(tmp_path / 'trace.npz')}
+    monkeypatch.setattr(AnalogCircuit, "simulate", fake_simulate)
+    recorded = GenerationPool.load(process(circuit_config, spea2_config,
+                                           path=str(tmp_path) + '/', thread=2, seed=4))
+
+    monkeypatch.undo()
+    circuit_config["simulator"] = "replay"
+    circuit_config["path_to_output"] = str(tmp_path / 'processes') + '/'
+    (tmp_path / 'processes').mkdir()
+    spea2_config["workers"] = {"processes": True}
+    replayed = GenerationPool.load(process(circuit_config, spea2_config,
+                                           path=str(tmp_path) + '/', thread=2, seed=4))
+    for k in range(6):
+        for a, b in zip(recorded.pool[k].individuals, replayed.pool[k].individuals):
+            np.testing.assert_array_equal(a.circuit.parameters, b.circuit.parameters)
+            assert a.circuit.gain == b.circuit.gain
+    assert replayed.worker_summary["processes"]["jobs"] == \
+        sum(replayed.pool[k].simulation_count for k in range(6))
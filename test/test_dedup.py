@@ -0,0 +1,83 @@
+import numpy as np
+
+from spea2.__main__ import process
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import DuplicateIndex, Generation, GenerationPool, Individual
+from spea2.algorithm.genetic import EvolutionaryAlgorithm
+
+
+def _individual(parameters, simulated=False):
+    ind = Individual(AnalogCircuit(parameters), 1)
+    if simulated:
+        ind.circuit.gain = 10.0
+        ind.status = 'simulated'
+    return ind
+
+
+def _last_gen(inds):
+    gen = Generation(len(inds), 0)
+    gen.individuals = inds
+    gen.archive_inds = inds
+    return gen
+
+
+def test_near_duplicates_share_key(configs):
+    circuit_config, _ = configs
+    index = DuplicateIndex(circuit_config["lower_bound"],
+                           circuit_config["upper_bound"], resolution=1e-6)
+    params = np.array(circuit_config["lower_bound"]) * 2
+    assert index.key(params) == index.key(params * (1 + 1e-12))
+    assert index.key(params) != index.key(params * 1.1)
+
+
+def test_regenerate_policy(configs):
+    circuit_config, _ = configs
+    index = DuplicateIndex(circuit_config["lower_bound"],
+                           circuit_config["upper_bound"])
+    params = list(np.array(circuit_config["lower_bound"]) * 2)
+    index.start_generation(_last_gen([_individual(params, simulated=True)]))
+
+    assert not index.admit(_individual(params))
+    new = _individual(list(np.array(params) * 1.5))
+    assert index.admit(new)
+    assert not index.admit(_individual(list(np.array(params) * 1.5)))
+    assert index.avoided == 2
+
+
+def test_reuse_policy(configs):
+    circuit_config, _ = configs
+    index = DuplicateIndex(circuit_config["lower_bound"],
+                           circuit_config["upper_bound"], policy='reuse')
+    params = list(np.array(circuit_config["lower_bound"]) * 2)
+    index.start_generation(_last_gen([_individual(params, simulated=True)]))
+
+    duplicate = _individual(params)
+    assert index.admit(duplicate)
+    assert duplicate.status == 'simulated'
+    assert duplicate.circuit.gain == 10.0
+    assert index.avoided == 1
+
+
+def test_produce_without_duplicates(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    gen = Generation(4, 0)
+    gen.population_initialize('Random')
+    gen.simulate(path=None)
+    for ind in gen.individuals:
+        ind.fitness.fitness = 1.0
+    # An archive of one individual only produces copies of it when
+    # mutation is skipped.
+    gen.archive_inds = gen.individuals[:1]
+    index = DuplicateIndex(circuit_config["lower_bound"],
+                           circuit_config["upper_bound"])
+    next_gen = EvolutionaryAlgorithm(gen, gen, index).produce(N=20)
+    keys = {index.key(ind.circuit.parameters) for ind in next_gen.individuals}
+    assert len(keys) == 20
+    assert next_gen.avoided_simulations > 0
+
+
+def test_process_with_reuse(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    spea2_config["deduplication"] = {"policy": "reuse"}
+    saved_file_path = process(circuit_config, spea2_config, path=None)
+    assert len(GenerationPool.load(saved_file_path).pool) == 6
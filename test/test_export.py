@@ -0,0 +1,61 @@
+import csv
+import glob
+
+import numpy as np
+import pytest
+
+from spea2 import export
+from spea2.__main__ import process
+from spea2.algorithm import GenerationPool
+
+
+@pytest.fixture(params=['numpy', 'instance'])
+def saved_pool(request, configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    return process(circuit_config, spea2_config, path=None,
+                   saving_format=request.param)
+
+
+def test_iter_tables(saved_pool, configs):
+    circuit_config, spea2_config = configs
+    pool = GenerationPool.load(saved_pool)
+    tables = list(pool.iter_tables())
+    assert len(tables) == spea2_config["maximum_generation"]
+    table = tables[-1]
+    assert table["archive"].sum() == spea2_config["N"]
+    assert len(table["generation"]) == 2 * spea2_config["N"]
+    for name in circuit_config["topology"] + circuit_config["output"]:
+        assert not np.isnan(table[name]).any()
+    if pool.saving_format == 'instance':
+        assert not np.isnan(table["fitness"]).any()
+    else:
+        assert np.isnan(table["fitness"]).all()
+
+
+def test_chunked_csv(saved_pool, tmp_path):
+    output = str(tmp_path / 'run.csv')
+    assert export.main([saved_pool, '--format', 'csv', '--output', output,
+                        '--chunk_rows', '50']) == 0
+    files = sorted(glob.glob(str(tmp_path / 'run.*.csv')))
+    rows = []
+    for file in files:
+        with open(file) as f:
+            rows.extend(csv.DictReader(f))
+    assert len(files) == 3
+    assert len(rows) == 6 * 2 * 12
+    assert rows[0]["generation"] == "0"
+
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_arrow_and_parquet(saved_pool, tmp_path, file_format):
+    pa = pytest.importorskip("pyarrow")
+    output = str(tmp_path / ('run.' + file_format))
+    rows = GenerationPool.load(saved_pool).to_table(output, file_format)
+    if file_format == 'arrow':
+        import pyarrow.ipc
+        table = pyarrow.ipc.open_file(output).read_all()
+    else:
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(output)
+    assert table.num_rows == rows == 6 * 2 * 12
+    assert table.column("LM1").type == pa.float64()
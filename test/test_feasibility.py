@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import (
+    Generation, GenerationPool, Individual, ParameterConstraints, WorkerPool
+)
+
+from conftest import CIRCUIT_CONFIG
+
+AREA = "2*WM1*LM1 + 2*WM2*LM2 + 2*WM3*LM3"
+
+
+def checks(constraints, derived=None, **kwargs):
+    return ParameterConstraints(CIRCUIT_CONFIG["topology"], CIRCUIT_CONFIG["lower_bound"],
+                                CIRCUIT_CONFIG["upper_bound"], constraints, derived,
+                                **kwargs)
+
+
+def individuals(rows):
+    return [Individual(AnalogCircuit.from_trusted(np.array(row, dtype=float)), 1)
+            for row in rows]
+
+
+ROWS = [[1.3e-7, 1.3e-7, 1.3e-7, 1e-6, 1e-6, 1e-6, 1e-4],
+        [1.3e-6, 1.3e-6, 1.3e-6, 9e-5, 9e-5, 9e-5, 1e-4],
+        [5e-7, 5e-7, 5e-7, 5e-6, 5e-6, 5e-6, 1e-4]]
+
+
+def test_derived_outputs_are_vectorized(configs):
+    parameter_constraints = checks(["zsarea <= 5e-11", "WM1 / LM1 >= 5"],
+                                   {"zsarea": AREA, "half": "zsarea / 2"})
+    columns = parameter_constraints.columns(np.array(ROWS))
+    area = [2 * 3 * r[0] * r[3] for r in ROWS]
+    np.testing.assert_allclose(columns["zsarea"], area)
+    np.testing.assert_allclose(columns["half"], np.array(area) / 2)
+    errors = parameter_constraints.error(np.array(ROWS))
+    assert errors[0] == 0 and errors[1] > 0 and errors[2] == 0
+
+    with pytest.raises(ValueError):
+        checks(["power <= 1"], {"zsarea": AREA})
+    with pytest.raises(ValueError):
+        checks([], {"LM1": "WM1"})
+    with pytest.raises(ValueError):
+        checks([], {"zsarea": "LM1 * vdd"})
+
+
+def test_resample(configs):
+    parameter_constraints = checks(["zsarea <= 5e-11"], {"zsarea": AREA})
+    inds = individuals(ROWS)
+    assert parameter_constraints.apply(inds) == [False, True, False]
+    assert inds[0].circuit.zsarea == pytest.approx(6 * 1.3e-7 * 1e-6)
+    assert not hasattr(inds[1].circuit, 'zsarea')
+    assert parameter_constraints.rejected == 1
+
+
+def test_repair(configs):
+    parameter_constraints = checks(["zsarea <= 5e-11"], {"zsarea": AREA}, policy='repair')
+    inds = individuals(ROWS)
+    assert parameter_constraints.apply(inds) == [False, False, False]
+    assert parameter_constraints.repaired == 1
+    repaired = inds[1].circuit.parameters
+    assert parameter_constraints.error(repaired)[0] == 0
+    # on the line to the nearest feasible row, close to the boundary
+    t = (repaired - np.array(ROWS[1]))[:6] / (np.array(ROWS[2]) - np.array(ROWS[1]))[:6]
+    assert np.allclose(t, t[0]) and 0 < t[0] < 1
+    assert inds[1].circuit.zsarea == pytest.approx(5e-11, rel=1e-4)
+
+    # nothing feasible to repair towards
+    assert parameter_constraints.apply(individuals(ROWS[1:2])) == [True]
+
+
+def test_violators_are_not_simulated(configs, fake_simulator):
+    Generation.parameter_constraints = checks(["LM2 <= 5e-7"], max_attempts=100)
+    generation = Generation(12, 0)
+    generation.population_initialize('Random', rng=np.random.default_rng(0))
+    with WorkerPool('scratch/', 2) as workers:
+        generation.simulate(None, workers=workers, rng=np.random.default_rng(1))
+    assert all(ind.circuit.parameters[1] <= 5e-7 for ind in generation.individuals)
+    assert all(ind.status == 'simulated' for ind in generation.individuals)
+    assert generation.simulation_count == 12
+    assert Generation.parameter_constraints.rejected > 0
+
+    # violators are simulated anyway after max_attempts rounds
+    Generation.parameter_constraints = checks(["LM2 <= 1e-9"], max_attempts=2)
+    generation = Generation(4, 0)
+    generation.population_initialize('Random', rng=np.random.default_rng(0))
+    with WorkerPool('scratch/', 1) as workers:
+        generation.simulate(None, workers=workers, rng=np.random.default_rng(1))
+    assert Generation.parameter_constraints.rejected == 8
+    assert generation.simulation_count == 4
+
+
+def test_process_with_parameter_constraints(configs, fake_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    spea2_config["parameter_constraints"] = {
+        "derived": {"x1": "(LM2 - 1.3e-7) / 1.17e-6"},
+        "constraints": ["x1 <= 0.8"],
+        "policy": "repair",
+    }
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=5)
+    pool = GenerationPool.load(saved)
+    for k in range(spea2_config["maximum_generation"]):
+        generation = pool.pool[k]
+        assert generation.simulation_count == 12
+        for ind in generation.individuals:
+            assert ind.circuit.x1 <= 0.8
+            assert ind.circuit.zsarea <= 5e-9 * (1 + 1e-12)
@@ -11,4 +11,71 @@ def test_check_required_files():
     assert os.path.isdir('../circuitfiles/amp_temp/0')
     assert os.path.isdir('../circuitfiles/amp_temp/1')
     assert os.path.isdir('../circuitfiles/amp_temp/2')
-    assert os.path.isdir('../circuitfiles/amp_temp/3')
\ No newline at end of file
+    assert os.path.isdir('../circuitfiles/amp_temp/3')
+
+
+def _make_source(tmp_path):
+    source = tmp_path / 'amp'
+    (source / 'models').mkdir(parents=True)
+    (source / 'amp.sp').write_text('.inc param.cir\n')
+    (source / 'models' / '130nm.txt').write_text('.PARAM\n')
+    return str(source) + os.sep
+
+
+def test_forms_only_requested_folders(tmp_path):
+    file_hand = FileHandler(_make_source(tmp_path))
+    file_hand.form_simulation_environment(3)
+    temp = tmp_path / 'amp_temp'
+    assert sorted(os.listdir(temp)) == ['0', '1', '2']
+    assert (temp / '2' / 'models' / '130nm.txt').read_text() == '.PARAM\n'
+
+
+def test_second_run_is_incremental(tmp_path):
+    source = _make_source(tmp_path)
+    FileHandler(source).form_simulation_environment(2)
+    copied = tmp_path / 'amp_temp' / '1' / 'amp.sp'
+    mtime = os.stat(copied).st_mtime_ns
+
+    # The sub-folder already exists and must not make the copy fail.
+    (tmp_path / 'amp' / 'models' / '130nm.txt').write_text('.PARAM\n+ a = 1\n')
+    FileHandler(source).form_simulation_environment(2)
+
+    assert os.stat(copied).st_mtime_ns == mtime
+    assert (tmp_path / 'amp_temp' / '1' / 'models' / '130nm.txt').read_text() \
+        == '.PARAM\n+ a = 1\n'
+
+
+def test_deleted_files_are_pruned(tmp_path):
+    source = _make_source(tmp_path)
+    FileHandler(source).form_simulation_environment(2)
+    worker = tmp_path / 'amp_temp' / '1'
+    (worker / 'amp.lis').write_text('output\n')
+
+    os.remove(tmp_path / 'amp' / 'models' / '130nm.txt')
+    FileHandler(source).form_simulation_environment(2)
+
+    assert not (worker / 'models' / '130nm.txt').exists()
+    # Files which were not copied from the source are kept.
+    assert (worker / 'amp.lis').exists()
+
+
+def test_keep_scratch(tmp_path):
+    scratch = tmp_path / 'scratch'
+    file_hand = FileHandler(_make_source(tmp_path), scratch_path=str(scratch),
+                            keep_scratch=True)
+    file_hand.form_simulation_environment(2)
+    assert file_hand.get_folder_path() == str(scratch) + os.sep
+    file_hand.delete_simulation_environment()
+    assert os.path.isdir(scratch / '0')
+
+
+def test_recreate_folder(tmp_path):
+    source = _make_source(tmp_path)
+    FileHandler(source).form_simulation_environment(2)
+    worker = tmp_path / 'amp_temp' / '0'
+    (worker / 'amp.sp').write_text('corrupted')
+    (worker / 'amp.lis').write_text('left over')
+
+    FileHandler.recreate_folder(source, str(worker) + os.sep)
+    assert sorted(os.listdir(worker)) == sorted(os.listdir(tmp_path / 'amp_temp' / '1'))
+    assert (worker / 'amp.sp').read_text() == (tmp_path / 'amp' / 'amp.sp').read_text()
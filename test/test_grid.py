@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import AnalogCircuit, Circuit, ParameterGrid
+from spea2.algorithm import EvolutionaryAlgorithm, Generation, GenerationPool
+
+from conftest import CIRCUIT_CONFIG
+
+GRIDS = {"default": "tech", "WM1": {"step": 5e-8}, "Ib": {"per_decade": 10},
+         "WM3": None}
+
+
+def grid(grids=GRIDS):
+    return ParameterGrid.from_config(dict(CIRCUIT_CONFIG, grid=grids))
+
+
+def on_grid(parameters, grids=GRIDS):
+    """ Whether the parameters are multiples of their steps or log steps. """
+    p = np.asarray(parameters)
+    ok = [np.isclose(p[..., i] / 13e-9, np.rint(p[..., i] / 13e-9), atol=1e-6).all()
+          for i in (0, 1, 2, 4)]
+    ok.append(np.isclose(p[..., 3] / 5e-8, np.rint(p[..., 3] / 5e-8), atol=1e-6).all())
+    k = np.log10(p[..., 6]) * 10
+    ok.append(np.isclose(k, np.rint(k), atol=1e-6).all())
+    return all(ok)
+
+
+def test_snap():
+    parameter_grid = grid()
+    x = np.array([1.3000000001e-7, 2.71e-7, 1.3e-6, 7.1234e-6, 8e-7, 9.87654e-7, 3.3e-5])
+    snapped = parameter_grid.snap(x)
+    assert snapped is not x and on_grid(snapped)
+    np.testing.assert_allclose(snapped[:6], [1.3e-7, 2.73e-7, 1.3e-6, 7.1e-6, 8.06e-7,
+                                             9.87654e-7])
+    assert snapped[5] == x[5]
+    assert snapped[6] == pytest.approx(10 ** -4.5)
+    np.testing.assert_array_equal(parameter_grid.snap(snapped), snapped)
+    assert parameter_grid.snap(1.3e-7 * np.ones(7))[0] == \
+        parameter_grid.snap(1.3000000001e-7 * np.ones(7))[0]
+
+    matrix = np.random.default_rng(0).uniform(CIRCUIT_CONFIG["lower_bound"],
+                                              CIRCUIT_CONFIG["upper_bound"], (50, 7))
+    snapped = parameter_grid.snap(matrix)
+    assert on_grid(snapped)
+    assert (snapped >= CIRCUIT_CONFIG["lower_bound"]).all()
+    assert (snapped <= CIRCUIT_CONFIG["upper_bound"]).all()
+
+
+def test_bounds():
+    parameter_grid = ParameterGrid(["a", "b"], [1.0, 1.05], [2.0, 1.08],
+                                   {"a": {"step": 0.3}, "b": {"step": 0.1}})
+    # 2.0 rounds to 2.1 which is outside, one step inwards
+    np.testing.assert_allclose(parameter_grid.snap([2.0, 1.06]), [1.8, 1.08])
+    np.testing.assert_allclose(parameter_grid.snap([1.0, 1.06]), [1.2, 1.08])
+
+
+def test_invalid_grids():
+    with pytest.raises(ValueError):
+        grid({"LM4": "tech"})
+    with pytest.raises(ValueError):
+        grid({"LM1": {"round": 1}})
+    with pytest.raises(ValueError):
+        ParameterGrid(["a"], [0.0], [1.0], {"a": {"per_decade": 10}})
+    with pytest.raises(ValueError):
+        ParameterGrid(["a"], [0.0], [1.0], {"a": "tech"})
+    assert ParameterGrid.from_config(CIRCUIT_CONFIG) is None
+
+
+def test_new_circuits_are_on_the_grid(configs):
+    Circuit.GRID = grid()
+    rng = np.random.default_rng(1)
+    generation = Generation(20, 0)
+    generation.population_initialize('Random', rng=rng)
+    for ind in generation.individuals:
+        assert on_grid(ind.circuit.parameters)
+        ind.fitness.fitness = rng.random()
+    generation.archive_inds = generation.individuals
+
+    offspring = EvolutionaryAlgorithm(generation, generation, rng=rng).produce()
+    for ind in offspring.individuals:
+        assert on_grid(ind.circuit.parameters)
+    assert AnalogCircuit.on_grid(np.full(7, 1.3000000001e-7)) == \
+        AnalogCircuit.on_grid(np.full(7, 1.3e-7))
+
+
+def test_process_on_the_grid(configs, fake_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    circuit_config["grid"] = {"default": {"step": 1e-7}, "Ib": {"per_decade": 4}}
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=6)
+    pool = GenerationPool.load(saved)
+    params = np.array([ind.circuit.parameters for k in range(6)
+                       for ind in pool.pool[k].individuals])
+    # WM bounds are not multiples of the step, those are clipped
+    k = params[:, :3] / 1e-7
+    assert np.allclose(k, np.rint(k))
+    k = np.log10(params[:, 6]) * 4
+    assert np.allclose(k, np.rint(k))
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import FitnessAssigner, Generation, GenerationPool
+from spea2.islands import MigrationTopology, emigrants, immigrate, merge_generations
+
+
+def simulated_generation(n, seed):
+    gen = Generation(n, 0, archive_size=n // 2)
+    gen.population_initialize('Random', rng=np.random.default_rng(seed))
+    gen.simulate(path=None)
+    FitnessAssigner.assign_fitness_first(gen)
+    gen.archive_inds = sorted(gen.individuals, key=lambda ind: ind.fitness.fitness)[:n // 2]
+    return gen
+
+
+def test_topology():
+    assert MigrationTopology(3, 'ring').sources() == {0: [2], 1: [0], 2: [1]}
+    assert MigrationTopology(3, 'fully_connected').sources() == \
+        {0: [1, 2], 1: [0, 2], 2: [0, 1]}
+    sources = MigrationTopology(4, 'random', np.random.default_rng(0)).sources()
+    assert sorted(s for v in sources.values() for s in v) == [0, 1, 2, 3]
+    assert all(i not in v for i, v in sources.items())
+    assert MigrationTopology(2, {0: [1]}).sources() == {0: [1], 1: []}
+    assert MigrationTopology(1).sources() == {0: []}
+    with pytest.raises(ValueError):
+        MigrationTopology(2, 'star')
+    with pytest.raises(ValueError):
+        MigrationTopology(2, {0: [2]})
+
+
+def test_migration(configs, fake_simulator):
+    source = simulated_generation(12, 1)
+    target = simulated_generation(12, 2)
+    migrants = emigrants(source, 2)
+    assert 0 < len(migrants) <= 2
+    for migrant in migrants:
+        assert migrant.fitness.rawfitness == 0 and migrant.fitness.total_error == 0
+        assert migrant.status == 'simulated' and migrant.coming_from == 'last_gen'
+
+    worst = max(target.archive_inds, key=lambda ind: ind.fitness.fitness)
+    immigrate(target, migrants + migrants)
+    assert len(target.archive_inds) == 6
+    assert target.archive_inds[-len(migrants):] == migrants
+    assert worst not in target.archive_inds
+
+    merged = merge_generations([source, target])
+    assert merged.N == 24 and merged.archive_size == 12
+    assert merged.individuals == source.individuals + target.individuals
+
+
+@pytest.mark.parametrize('saving_format', ['instance', 'numpy'])
+def test_process_with_islands(configs, fake_simulator, tmp_path, saving_format):
+    circuit_config, spea2_config = configs
+    spea2_config["islands"] = {"count": 2, "migration_interval": 2, "migrants": 2}
+    runs = []
+    for _ in range(2):
+        saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                        thread=2, saving_format=saving_format, seed=4)
+        runs.append(GenerationPool.load(saved))
+
+    pool = runs[0]
+    assert len(pool.metrics) == spea2_config["maximum_generation"]
+    if saving_format == 'instance':
+        assert all(len(gen.individuals) == 24 for gen in pool.pool)
+        params = [[ind.circuit.parameters for ind in gen.individuals]
+                  for run in runs for gen in run.pool[-1:]]
+        np.testing.assert_array_equal(params[0], params[1])
+    else:
+        assert pool.parameters.shape[1] == 24
+        assert not np.isnan(pool.parameters).any()
+        np.testing.assert_array_equal(pool.parameters, runs[1].parameters)
+    assert pool.worker_summary["jobs"] >= 2 * 12 * spea2_config["maximum_generation"]
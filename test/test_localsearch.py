@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import (
+    DuplicateIndex, FitnessAssigner, Generation, GenerationPool, Individual, LocalSearch,
+    WorkerPool
+)
+
+from conftest import CIRCUIT_CONFIG
+
+
+def local_search(**kwargs):
+    return LocalSearch(CIRCUIT_CONFIG["lower_bound"], CIRCUIT_CONFIG["upper_bound"],
+                       **kwargs)
+
+
+def simulated_generation(params, kii=0):
+    generation = Generation.new_generation_from_parameters(params, len(params), kii)
+    with WorkerPool('scratch/', 1) as workers:
+        generation._simulate_inds(workers, generation.individuals)
+    FitnessAssigner.assign_fitness_first(generation)
+    generation.archive_inds = generation.individuals
+    return generation
+
+
+def test_steps_improve_the_members(configs, fake_simulator):
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    params = [lower + (upper - lower) * x for x in (0.3, 0.5)]
+    generation = simulated_generation(params)
+    next_generation = Generation(2, 1)
+    search = local_search(members=2, step=0.1)
+
+    with WorkerPool('scratch/', 2) as workers:
+        steps = search.refine(next_generation, generation.archive_inds, workers,
+                              np.random.default_rng(0))
+    # 7 perturbations per member and one step each, in two batches
+    assert search.simulations == next_generation.simulation_count == 2 * 7 + 2
+    assert next_generation.individuals == steps and len(steps) == 2
+
+    errors = Individual.constraint_set.evaluate(generation.archive_inds)
+    for step in steps:
+        member = min(generation.archive_inds, key=lambda ind: np.linalg.norm(
+            ind.circuit.parameters - step.circuit.parameters))
+        assert step.status == 'simulated'
+        moved = (step.circuit.parameters - member.circuit.parameters) / (upper - lower)
+        assert np.linalg.norm(moved) == pytest.approx(0.1)
+        # zsarea grows with LM2 and pm falls with LM3 while neither helps the targets
+        assert moved[1] <= 0 and moved[2] <= 0
+        assert Individual.constraint_set.evaluate([step])[0] <= errors.max()
+        # one of the targets improves
+        assert any(s > m for s, m in zip(step.targets, member.targets))
+
+
+def test_steps_simulated_before(configs, fake_simulator):
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    generation = simulated_generation([lower + (upper - lower) * x for x in (0.3, 0.5)])
+    search = local_search(members=2, step=0.1)
+    with WorkerPool('scratch/', 2) as workers:
+        first = Generation(2, 1)
+        steps = search.refine(first, generation.archive_inds, workers,
+                              np.random.default_rng(0))
+
+        # the same steps again take over the results of the first ones
+        index = DuplicateIndex(lower, upper, policy='reuse')
+        index.start_generation(first)
+        again = Generation(2, 2)
+        reused = search.refine(again, generation.archive_inds, workers,
+                               np.random.default_rng(0), index)
+    assert again.simulation_count == 2 * 7 and index.avoided == 2
+    assert [ind.circuit.gain for ind in reused] == [ind.circuit.gain for ind in steps]
+    assert all(ind.status == 'simulated' for ind in reused)
+
+
+def test_infeasible_members_reduce_their_error(configs, fake_simulator):
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    generation = simulated_generation([upper.copy()])
+    member = generation.archive_inds[0]
+    error = Individual.constraint_set.evaluate([member])[0]
+    assert error > 0
+
+    with WorkerPool('scratch/', 1) as workers:
+        steps = local_search(members=1).refine(Generation(1, 1), [member], workers,
+                                               np.random.default_rng(0))
+    assert Individual.constraint_set.evaluate(steps)[0] < error
+    # perturbed backward at the upper bound
+    assert (steps[0].circuit.parameters <= upper).all()
+
+
+def test_from_config(configs):
+    circuit_config, spea2_config = configs
+    assert LocalSearch.from_config(circuit_config, spea2_config) is None
+    spea2_config["local_search"] = {"interval": 3, "members": 2}
+    search = LocalSearch.from_config(circuit_config, spea2_config)
+    assert [search.due(k) for k in range(1, 7)] == [False, False, True] * 2
+    with pytest.raises(ValueError):
+        local_search(delta=0)
+
+
+def test_process_with_local_search(configs, fake_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    spea2_config["local_search"] = {"interval": 2, "members": 3}
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=4)
+    pool = GenerationPool.load(saved)
+    sizes = [len(pool.pool[k].individuals) for k in range(6)]
+    assert sizes == [12, 12, 15, 12, 15, 12]
+    assert pool.pool[2].simulation_count == 12 + 3 * 7 + 3
@@ -0,0 +1,84 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import GenerationPool
+from spea2.algorithm.metrics import (
+    front_metrics, generational_distance, get_reference_point,
+    hypervolume, nondominated, nondominated_mask, spacing, spread
+)
+
+
+def brute_force_hypervolume(points, reference):
+    points = points[(points > reference).all(axis=1)]
+    grid = [sorted(set(points[:, d]) | {reference[d]})
+            for d in range(points.shape[1])]
+    volume = 0.0
+    for cell in itertools.product(*[range(len(g) - 1) for g in grid]):
+        low = np.array([g[c] for g, c in zip(grid, cell)])
+        high = np.array([g[c + 1] for g, c in zip(grid, cell)])
+        if (points >= high).all(axis=1).any():
+            volume += np.prod(high - low)
+    return volume
+
+
+def test_hypervolume_2d():
+    points = np.array([[1.0, 3.0], [2.0, 2.0], [3.0, 1.0], [1.0, 1.0]])
+    assert hypervolume(points, [0.0, 0.0]) == pytest.approx(6.0)
+
+
+@pytest.mark.parametrize('dimension', [3, 4, 5])
+def test_hypervolume_matches_brute_force(dimension):
+    points = np.random.default_rng(dimension).random((7, dimension))
+    reference = np.full(dimension, 0.1)
+    assert hypervolume(points, reference) == \
+        pytest.approx(brute_force_hypervolume(points, reference))
+
+
+def test_points_outside_reference_are_ignored():
+    assert hypervolume([[1.0, -1.0]], [0.0, 0.0]) == 0.0
+
+
+def test_nondominated():
+    points = np.array([[1.0, 3.0], [2.0, 2.0], [1.0, 1.0], [2.0, 2.0]])
+    assert sorted(map(tuple, nondominated(points))) == [(1.0, 3.0), (2.0, 2.0)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 256])
+def test_nondominated_mask_matches_pairwise(chunk_size):
+    points = np.random.default_rng(chunk_size).integers(0, 8, (300, 3)).astype(float)
+    dominated = [any((q >= p).all() and (q > p).any() for q in points) for p in points]
+    mask = nondominated_mask(points, chunk_size)
+    _, first = np.unique(points, axis=0, return_index=True)
+    expected = np.zeros(len(points), dtype=bool)
+    expected[first] = True
+    assert np.array_equal(mask, expected & ~np.array(dominated))
+
+
+def test_uniform_front_has_zero_spacing_and_spread():
+    front = np.array([[0.0, 4.0], [1.0, 3.0], [2.0, 2.0], [3.0, 1.0], [4.0, 0.0]])
+    assert spacing(front) == pytest.approx(0.0)
+    assert spread(front) == pytest.approx(0.0)
+    assert generational_distance(front, front) == pytest.approx(0.0)
+
+
+def test_reference_point_inverts_min_targets():
+    assert get_reference_point({"gain": "max", "power": "min"},
+                               {"gain": 10, "power": 1e-3}) == [10.0, 1000.0]
+
+
+def test_front_metrics_without_previous():
+    metrics = front_metrics([[1.0, 2.0], [2.0, 1.0]], [0.0, 0.0])
+    assert metrics["generational_distance"] is None
+    assert metrics["front_size"] == 2
+
+
+def test_metrics_are_tracked_per_generation(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    saved_file_path = process(circuit_config, spea2_config, path=None)
+    pool = GenerationPool.load(saved_file_path)
+    assert len(pool.metrics) == spea2_config["maximum_generation"]
+    assert [m["kii"] for m in pool.metrics] == list(range(6))
+    assert all(hv > 0 for hv in pool.hypervolume)
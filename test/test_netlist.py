@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from spea2.IC import HSpiceSimulator, NetlistTemplate
+
+TOPOLOGY = ["LM1", "WM1", "Ib"]
+NETLIST = "**amp\n.inc 130nm.txt\n.inc param.cir\nm1 6 4 3 3 pfet l=lm1 w=wm1\n.END"
+
+
+def _values(rendered):
+    return [float(line.split('=')[1]) for line in rendered.splitlines()
+            if line.startswith('+')]
+
+
+def test_render_params_is_exact():
+    params = np.array([1.3e-7 + 1e-22, 0.1 + 0.2, 1.0e-3])
+    rendered = NetlistTemplate(TOPOLOGY).render_params(params).decode()
+    assert rendered.startswith('.PARAM\n+ LM1 = ')
+    assert _values(rendered) == list(params)
+
+
+def test_render_netlist_inlines_params():
+    template = NetlistTemplate(TOPOLOGY, NETLIST)
+    rendered = template.render_netlist([1.3e-7, 6.5e-7, 1e-5]).decode()
+    assert 'param.cir' not in rendered
+    assert rendered.index('.inc 130nm.txt') < rendered.index('.PARAM') \
+        < rendered.index('m1 6 4 3 3')
+    assert _values(rendered) == [1.3e-7, 6.5e-7, 1e-5]
+
+
+def test_netlist_without_include():
+    with pytest.raises(ValueError):
+        NetlistTemplate(TOPOLOGY, "**amp\n.END")
+
+
+@pytest.mark.parametrize('injection, file_name', [('include', 'param.cir'),
+                                                  ('inline', 'amp_inline.sp')])
+def test_write_param(tmp_path, injection, file_name):
+    (tmp_path / 'amp.sp').write_text(NETLIST)
+    simulator = HSpiceSimulator.for_path(str(tmp_path) + '/', 'amp', injection)
+    assert simulator is HSpiceSimulator.for_path(str(tmp_path) + '/', 'amp', injection)
+    simulator.write_param(TOPOLOGY, np.array([1.3e-7, 6.5e-7, 1e-5]))
+    assert _values((tmp_path / file_name).read_text()) == [1.3e-7, 6.5e-7, 1e-5]
+    assert not (tmp_path / (file_name + '.tmp')).exists()
@@ -0,0 +1,133 @@
+import ctypes
+import ctypes.util
+
+import numpy as np
+import pytest
+
+from spea2.IC import NgspiceSharedSimulator, SimulationFailedError
+from spea2.IC.circuit import AnalogCircuit
+from spea2.IC.simulators import _NgVectorInfo
+
+from conftest import CIRCUIT_CONFIG, fake_simulate
+
+NETLIST = "**amp\n.inc param.cir\nR1 in out 1k\n.END"
+
+
+class _Function:
+    """ Settable argtypes and restype like a function of ctypes.CDLL. """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+
+class FakeNgspice:
+    """ libngspice computing the outputs of conftest.fake_simulate. """
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.commands = []
+        self.params = {}
+        self.vectors = {}
+        self._keep = []
+        self.ngSpice_Init = _Function(lambda *args: 0)
+        self.ngSpice_Command = _Function(self._command)
+        self.ngGet_Vec_Info = _Function(self._vector)
+        self.ngSpice_AllPlots = _Function(self._plots)
+
+    def _command(self, command):
+        command = command.decode()
+        self.commands.append(command)
+        if command.startswith('alterparam'):
+            name, value = command.split(' ', 1)[1].split(' = ')
+            self.params[name] = float(value)
+        elif command == 'run':
+            circuit = AnalogCircuit.from_trusted(
+                np.array([self.params[name] for name in CIRCUIT_CONFIG["topology"]]))
+            fake_simulate(circuit, None)
+            self.vectors = {f"ac1.{name}": getattr(circuit, name)
+                            for name in self.outputs}
+        elif command == 'destroy all':
+            self.vectors = {}
+        return 0
+
+    def _vector(self, name):
+        name = name.decode()
+        if name not in self.vectors:
+            return ctypes.POINTER(_NgVectorInfo)()
+        data = (ctypes.c_double * 1)(self.vectors[name])
+        info = _NgVectorInfo(name.encode(), 0, 0, data, None, 1)
+        self._keep.append((data, info))
+        return ctypes.pointer(info)
+
+    def _plots(self):
+        plots = (ctypes.c_char_p * 4)(b"ac1", b"op1", b"const", None)
+        self._keep.append(plots)
+        return ctypes.cast(plots, ctypes.POINTER(ctypes.c_char_p))
+
+
+@pytest.fixture
+def ngspice(configs, monkeypatch, tmp_path):
+    circuit_config, _ = configs
+    circuit_config["simulator"] = "ngspice"
+    (tmp_path / 'amp.sp').write_text(NETLIST)
+    monkeypatch.setattr(NgspiceSharedSimulator, "_instances", {})
+    libraries = []
+
+    def load(self):
+        libraries.append(FakeNgspice(["gain", "bw", "himg", "hreal", "zsarea"]))
+        return libraries[-1]
+
+    monkeypatch.setattr(NgspiceSharedSimulator, "_load_library", load)
+    return libraries
+
+
+def test_simulate_in_memory(configs, ngspice, tmp_path):
+    path = str(tmp_path) + '/'
+    params = [np.array([1.3e-7 * k, 2e-7, 3e-7, 1e-6, 2e-6, 3e-6, 1e-4 * k])
+              for k in (1, 2, 3)]
+    for p in params:
+        circuit = AnalogCircuit.from_trusted(p.copy())
+        circuit.simulate(path)
+        expected = AnalogCircuit.from_trusted(p.copy())
+        fake_simulate(expected, None)
+        for name in CIRCUIT_CONFIG["output"]:
+            assert getattr(circuit, name) == getattr(expected, name)
+
+    # The library is loaded and the netlist sourced once for the folder.
+    assert len(ngspice) == 1
+    commands = ngspice[0].commands
+    assert sum(c.startswith('source') for c in commands) == 1
+    assert commands.count('run') == 3 and commands.count('reset') == 3
+    assert commands.count('destroy all') == 3
+    assert 'param.cir' not in (tmp_path / 'amp_ngspice.sp').read_text()
+    # No parameter file is written for the simulations.
+    assert not (tmp_path / 'param.cir').exists()
+
+
+def test_missing_measurement_fails(configs, ngspice, tmp_path):
+    circuit_config, _ = configs
+    circuit_config["output"] = CIRCUIT_CONFIG["output"] + ["power"]
+    circuit = AnalogCircuit.from_trusted(np.full(7, 1e-6))
+    with pytest.raises(SimulationFailedError, match="power"):
+        circuit.simulate(str(tmp_path) + '/')
+    # Plots are freed even if the simulation failed.
+    assert ngspice[0].commands[-1] == 'destroy all'
+
+
+@pytest.mark.skipif(ctypes.util.find_library('ngspice') is None,
+                    reason="libngspice is not installed")
+def test_libngspice(tmp_path):
+    (tmp_path / 'rc.sp').write_text(
+        "* rc\n.inc param.cir\nV1 in 0 DC 0 AC 1\nR1 in out 1k\nC1 out 0 {c}\n"
+        ".ac dec 20 1 1e9\n.meas ac bw when vdb(out)=-3\n.end\n")
+    simulator = NgspiceSharedSimulator(str(tmp_path) + '/', 'rc')
+    bws = []
+    for c in (1e-9, 2e-9):
+        simulator.write_param(['c'], [c])
+        simulator.simulate()
+        bws.append(dict(simulator.read_outputs(['bw']))['bw'])
+    assert bws[0] == pytest.approx(1 / (2 * np.pi * 1e3 * 1e-9), rel=1e-2)
+    assert bws[1] == pytest.approx(bws[0] / 2, rel=1e-2)
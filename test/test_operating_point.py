@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import OP_FIELDS, HSpiceSimulator, parse_dp0
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import ConstraintSet, GenerationPool, Individual, OperatingPointConstraint
+from spea2.algorithm.helperfuncs import calculate_total_error
+
+from conftest import fake_simulate
+
+ROW_NAMES = ['element', 'model', 'region', 'pad', 'id', 'ibs', 'ibd', 'vgs', 'vds',
+             'vbs', 'vth', 'vdsat', 'beta', 'gameff', 'gm', 'gds', 'gmb']
+OFFSETS = (4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 15, 16)
+
+
+def dp0_lines(op):
+    """ Lines of a .dp0 file with the given (T, 12) operating point. """
+    lines = ['**** mosfets\n', '\n']
+    for row, name in enumerate(ROW_NAMES):
+        if row == 0:
+            cells = ['M' + str(t + 1) for t in range(len(op))]
+        elif row in OFFSETS:
+            cells = [repr(float(v)) for v in op[:, OFFSETS.index(row)]]
+        else:
+            cells = ['x'] * len(op)
+        lines.append('|' + '|'.join([name] + cells) + '|\n')
+    return lines
+
+
+def test_parse_dp0():
+    op = np.arange(24 * 12, dtype=float).reshape(24, 12) / 7
+    parsed = parse_dp0(dp0_lines(op), 24)
+    assert parsed.dtype == np.float32 and parsed.shape == (24, 12)
+    # transistors after M9 are parsed as well
+    np.testing.assert_array_equal(parsed, op.astype(np.float32))
+    np.testing.assert_array_equal(parse_dp0(dp0_lines(op), 26)[24:], 0)
+
+
+def test_read_dp0(tmp_path):
+    op = np.random.rand(6, 12)
+    (tmp_path / 'amp.dp0').write_text(''.join(dp0_lines(op)))
+    simulator = HSpiceSimulator(str(tmp_path) + '/', 'amp')
+    t_values = simulator.read_dp0(6)
+    assert list(t_values) == list(OP_FIELDS)
+    assert t_values['Vdsat'] == list(op[:, 7])
+    np.testing.assert_array_equal(simulator.read_operating_point(6),
+                                  op.astype(np.float32))
+
+
+def test_constraint_evaluation():
+    op = np.zeros((3, 4, 12), dtype=np.float32)
+    op[..., OP_FIELDS.index('Vds')] = [0.3, 0.2, -0.3, 0.1]
+    op[..., OP_FIELDS.index('Vdsat')] = [0.1, 0.2, -0.1, 0.0]
+    saturation = OperatingPointConstraint('abs(Vds) - abs(Vdsat)', 'min', 0.05)
+    np.testing.assert_allclose(saturation.evaluate(op)[0], [0.2, 0, 0.2, 0.1], atol=1e-7)
+    np.testing.assert_allclose(saturation.error(op), [1.0] * 3, rtol=1e-6)
+
+    only_m1 = OperatingPointConstraint('Vds - Vdsat', 'min', 0.05, transistors=[1])
+    np.testing.assert_array_equal(only_m1.error(op), 0)
+    assert OperatingPointConstraint('Vds', 'max', 0.25).error(op[0]) \
+        == pytest.approx(0.05 / 0.25)
+
+
+@pytest.mark.parametrize('expression', ['Vds - Vt', '__import__("os")',
+                                        'Vds.real', 'Vds -'])
+def test_invalid_expression(expression):
+    with pytest.raises(ValueError):
+        OperatingPointConstraint(expression, 'min', 0)
+
+
+def test_from_config():
+    constraints = OperatingPointConstraint.from_config(
+        {'Vds - Vdsat': {'min': 0.05, 'transistors': [1, 2]},
+         'Vgs - Vth': {'min': 0.0, 'max': 0.4}})
+    assert [(c.expression.source, c.operation) for c in constraints] == [
+        ('Vds - Vdsat', 'min'), ('Vgs - Vth', 'min'), ('Vgs - Vth', 'max')]
+    assert list(constraints[0].transistors) == [0, 1]
+
+
+def simulate_with_op(self, path, lock=None):
+    fake_simulate(self, path, lock)
+    op = np.zeros((6, 12), dtype=np.float32)
+    op[:, OP_FIELDS.index('Vds')] = 0.2
+    op[:, OP_FIELDS.index('Vdsat')] = self.hreal + 1.1
+    self.operating_point = op
+
+
+def test_process_with_operating_point(configs, monkeypatch):
+    circuit_config, spea2_config = configs
+    circuit_config["operating_point"] = True
+    spea2_config["constraints"] = dict(spea2_config["constraints"], operating_point={
+        'Vds - Vdsat': {'min': 0.05}})
+    monkeypatch.setattr(AnalogCircuit, "simulate", simulate_with_op)
+
+    saved = process(circuit_config, spea2_config, path=None,
+                    saving_format='numpy', seed=1)
+    pool = GenerationPool.load(saved)
+    assert pool.operating_point.shape == (6, 12, 6, 12)
+    assert pool.operating_point.dtype == np.float32
+    assert not np.isnan(pool.arch_operating_point).all()
+    np.testing.assert_array_equal(pool.operating_point[..., OP_FIELDS.index('Vds')],
+                                  np.float32(0.2))
+
+
+def test_operating_point_error(configs):
+    Individual.constraint_set = ConstraintSet.from_config(
+        dict(configs[1]["constraints"], operating_point={'Vds - Vdsat': {'min': 0.05}}))
+    circuit = AnalogCircuit([1e-7] * 7)
+    circuit.himg, circuit.hreal, circuit.zsarea = 2.0, 1.0, 1e-9
+    circuit.operating_point = np.zeros((6, 12), dtype=np.float32)
+    assert calculate_total_error(Individual(circuit, 1)) == pytest.approx(6.0)
+
+
+def test_constraints_without_capture(configs):
+    circuit_config, spea2_config = configs
+    spea2_config["constraints"] = dict(spea2_config["constraints"], operating_point={
+        'Vds - Vdsat': {'min': 0.05}})
+    with pytest.raises(ValueError):
+        process(circuit_config, spea2_config, path=None)
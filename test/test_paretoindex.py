@@ -0,0 +1,85 @@
+import csv
+
+import numpy as np
+import pytest
+
+from spea2 import query
+from spea2.__main__ import process
+from spea2.algorithm import FitnessAssigner, Generation, GenerationPool, ParetoIndex
+from spea2.algorithm.metrics import nondominated_mask
+from spea2.algorithm.paretoindex import parse_condition
+
+
+@pytest.fixture
+def index(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    saved_file_path = process(circuit_config, spea2_config, path=None,
+                              saving_format='numpy')
+    return saved_file_path, GenerationPool.load(saved_file_path).load_index()
+
+
+def test_parse_condition():
+    assert parse_condition('zsarea <= 3e-9') == ('zsarea', '<=', 3e-9)
+    with pytest.raises(ValueError):
+        parse_condition('gain => 3')
+
+
+def test_range_query_matches_scan(index):
+    _, index = index
+    table = index.table(np.arange(len(index)))
+    expected = np.flatnonzero((table["gain"] > 40) & (table["zsarea"] <= 3e-9)
+                              & table["archive"])
+    rows = index.query(["gain>40", "zsarea<=3e-9"], archive=True)
+    assert np.array_equal(rows, expected)
+    assert np.array_equal(index.query({"gain": (40, None)}),
+                          np.flatnonzero(table["gain"] >= 40))
+
+
+def test_front_over_all_generations(index, configs):
+    _, index = index
+    table = index.table(np.arange(len(index)))
+    feasible = np.flatnonzero(table["total_error"] == 0)
+    targets = np.column_stack((table["gain"], table["bw"]))[feasible]
+    expected = np.unique(targets[nondominated_mask(targets)], axis=0)
+    front = index.pareto_front()
+    actual = np.column_stack((table["gain"], table["bw"]))[front]
+    assert np.array_equal(np.unique(actual, axis=0), expected)
+    assert np.array_equal(index.query(pareto=True), front)
+
+
+def test_front_is_updated_as_generations_are_added(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    index = ParetoIndex.from_config(circuit_config, spea2_config)
+    inds = []
+    for kii in range(3):
+        gen = Generation(12, kii)
+        gen.population_initialize('Random', rng=np.random.default_rng(kii))
+        gen.simulate(path=None)
+        FitnessAssigner.assign_fitness_first(gen)
+        gen.archive_inds = []
+        index.add(gen)
+        inds.extend(gen.individuals)
+    # merged into the front before the rows are consolidated
+    assert index._chunks
+    feasible = [k for k, ind in enumerate(inds) if ind.fitness.total_error == 0]
+    targets = np.array([inds[k].targets for k in feasible])
+    expected = np.array(feasible)[nondominated_mask(targets)]
+    assert 1 < len(expected) < len(feasible)
+    assert np.array_equal(np.sort(index.front), expected)
+    assert np.array_equal(index.pareto_front(), expected)
+
+
+def test_pool_pickle_does_not_contain_index(index):
+    saved_file_path, _ = index
+    assert GenerationPool.load(saved_file_path).index is None
+
+
+def test_query_cli(index, tmp_path):
+    saved_file_path, index = index
+    output = str(tmp_path / 'front.csv')
+    assert query.main([saved_file_path, '--pareto', '--where', 'gain>30',
+                       '--output', output]) == 0
+    with open(output) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(index.query(["gain>30"], pareto=True))
+    assert all(float(row["gain"]) > 30 for row in rows)
@@ -0,0 +1,51 @@
+import os
+import pstats
+import time
+
+from spea2.__main__ import process
+from spea2.IC.circuit import AnalogCircuit
+from spea2.profiling import Profiler
+
+from conftest import fake_simulate
+
+
+def slow_simulate(self, path, lock=None):
+    time.sleep(0.002)
+    fake_simulate(self, path, lock)
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    profiler = Profiler()
+    with profiler:
+        with profiler.stage('simulate', 0):
+            pass
+        profiler.generation_done(9)
+    assert profiler._thread is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_process_with_profiler(configs, monkeypatch, tmp_path):
+    monkeypatch.setattr(AnalogCircuit, "simulate", slow_simulate)
+    circuit_config, spea2_config = configs
+    output_dir = str(tmp_path / 'profile')
+    with Profiler(output_dir, interval=0.001, every=3) as profiler:
+        process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                thread=2, seed=1, profiler=profiler)
+
+    files = set(os.listdir(output_dir))
+    # maximum_generation is 6, so two windows of three generations.
+    assert {"stacks.gen-0to2.collapsed", "stacks.gen-3to5.collapsed"} <= files
+    for stage in ('simulate', 'fitness', 'archive', 'produce', 'append'):
+        assert f"{stage}.gen-0to2.prof" in files
+    assert "initialize.gen-0to2.prof" in files
+
+    with open(os.path.join(output_dir, "stacks.gen-0to2.collapsed")) as f:
+        lines = f.read().splitlines()
+    assert any(line.startswith("simulate;gen-") for line in lines)
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert stack.split(';')[1].startswith("gen-")
+
+    stats = pstats.Stats(os.path.join(output_dir, "fitness.gen-0to2.prof"))
+    assert any('assign_fitness' in func[2] for func in stats.stats)
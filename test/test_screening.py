@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import HSpiceSimulator, ScreeningNetlist
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import (
+    ConstraintSet, GenerationPool, ScreenedOut, Screening, ScreeningPool, WorkerPool
+)
+
+from conftest import CIRCUIT_CONFIG, fake_simulate
+
+NETLIST = """**amp
+.inc param.cir
+.op
+.ac dec 100 100 10000000000
+.TRAN 2n 100n
+.MEAS AC gain max PAR('db(V(7))')
+.MEAS zPOWER AVG POWER
+.MEASURE TRAN zSAREA avg PAR(AREA)
++ from=0
+.MEASURE AC hreal FIND VR(7)
++ WHEN V(7)=1
+.END
+"""
+
+
+def screened_simulate(self, path, lock=None):
+    """ The low fidelity netlist does not measure zsarea. """
+    fake_simulate(self, path, lock)
+    if self.fidelity is not None:
+        self.gain += 1.0
+        del self.zsarea
+
+
+@pytest.fixture
+def screened_simulator(monkeypatch):
+    monkeypatch.setattr(AnalogCircuit, "simulate", screened_simulate)
+
+
+def circuits(x0s):
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    return [AnalogCircuit.from_trusted(lower + (upper - lower) * np.array(
+        [x0, 0.9, 0, 0.5, 0.5, 0.5, 0.5])) for x0 in x0s]
+
+
+def test_derive_netlist():
+    derived = ScreeningNetlist(ac_points=5).derive(NETLIST)
+    assert ".ac dec 5 100 10000000000\n" in derived
+    assert ".TRAN" not in derived and "zPOWER" not in derived
+    assert "zSAREA" not in derived and "from=0" not in derived
+    assert ".MEAS AC gain" in derived and "+ WHEN V(7)=1" in derived
+    assert ".op\n" in derived and ".inc param.cir" in derived
+
+    kept = ScreeningNetlist(ac_points=500, transient=True).derive(NETLIST)
+    assert kept == NETLIST
+
+
+def test_prepare(tmp_path):
+    path = str(tmp_path) + '/'
+    (tmp_path / 'amp.sp').write_text(NETLIST)
+    netlist = ScreeningNetlist()
+    assert netlist.prepare(path, 'amp') == 'amp_screen'
+    assert (tmp_path / 'amp_screen.sp').read_text() == netlist.derive(NETLIST)
+    assert ScreeningNetlist(netlist='coarse.sp').prepare(path, 'amp') == 'coarse'
+
+
+def test_hspice_reads_only_ac_measurements(configs, monkeypatch, tmp_path):
+    (tmp_path / 'amp.sp').write_text(NETLIST)
+    monkeypatch.setattr(HSpiceSimulator, "_instances", {})
+    simulated = []
+
+    def simulate(self):
+        simulated.append(self.netlist)
+        with open(self.path + self.circuit_name + '.ma0', 'w') as f:
+            f.write("\n\ngain bw himg hreal\n40 1e6 -1 -1\n")
+
+    monkeypatch.setattr(HSpiceSimulator, "simulate", simulate)
+    circuit = Screening(ScreeningNetlist(), ConstraintSet()).job(circuits([0.5])[0])
+    circuit.simulate(str(tmp_path) + '/')
+    assert simulated == ['amp_screen.sp']
+    assert circuit.gain == 40 and not hasattr(circuit, 'zsarea')
+
+
+def test_select_promotes_the_best_failures():
+    screening = Screening(ScreeningNetlist(), ConstraintSet.from_config(["gain >= 40"]),
+                          promote=0.5)
+    jobs = circuits([0.0, 0.1, 0.2, 0.3])
+    for job in jobs:
+        fake_simulate(job, None)
+    # all fail, the two closest to 40 dB are promoted
+    assert screening.select(jobs).tolist() == [False, False, True, True]
+    screening.promote = 0
+    assert not screening.select(jobs).any()
+
+
+def test_unmeasured_outputs_are_not_screened(configs):
+    _, spea2_config = configs
+    screening = Screening(ScreeningNetlist(),
+                          ConstraintSet.from_config(spea2_config["constraints"]), 0)
+    job = circuits([0.5])[0]
+    fake_simulate(job, None)
+    del job.zsarea
+    assert screening.error([job])[0] == 0
+
+
+def test_pool(configs, screened_simulator):
+    screening = Screening(ScreeningNetlist(), ConstraintSet.from_config(["gain >= 40"]), 0)
+    batch = circuits([0.1, 0.6, 0.9])
+    with ScreeningPool(WorkerPool('scratch/', 2), screening) as workers:
+        outcomes = workers.run(batch)
+        assert workers.dispatched == 3 + 2
+    assert isinstance(outcomes[0], ScreenedOut) and outcomes[1:] == [None, None]
+    assert not hasattr(batch[0], 'gain')
+    for cct, full in zip(batch[1:], circuits([0.6, 0.9])):
+        # full results, not those of the screening
+        fake_simulate(full, None)
+        assert cct.fidelity is None
+        assert cct.gain == full.gain and cct.zsarea == full.zsarea
+
+    summary = workers.summary()
+    assert summary["screen"]["simulations"] == 3
+    assert summary["full"]["simulations"] == 2
+    assert summary["screen"]["seconds"] > 0
+    assert summary["rejected"] == 1 and summary["rejection_rate"] == pytest.approx(1 / 3)
+    assert "Rejected by screening: 1 of 3" in workers.report()
+
+
+def test_process_with_screening(configs, screened_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    spea2_config["screening"] = {"constraints": ["gain >= 35"], "promote": 0.25}
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=3)
+    pool = GenerationPool.load(saved)
+    summary = pool.worker_summary["screening"]
+    assert summary["rejected"] > 0
+    assert summary["screen"]["simulations"] == summary["screened"]
+    assert sum(pool.pool[k].simulation_count for k in range(6)) == \
+        summary["screen"]["simulations"] + summary["full"]["simulations"]
+    for ind in pool.pool[-1].individuals:
+        assert ind.circuit.fidelity is None and hasattr(ind.circuit, 'zsarea')
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from conftest import fake_simulate
+from spea2.__main__ import process
+from spea2.IC import AnalogCircuit, SimulationFailedError
+from spea2.algorithm import GenerationPool
+
+
+def flaky_simulate(self, path, lock=None):
+    """ Fails deterministically for a part of the design space. """
+    if self.parameters[4] > 8.0e-5:
+        raise SimulationFailedError("did not converge")
+    fake_simulate(self, path, lock)
+
+
+@pytest.fixture
+def flaky_simulator(monkeypatch):
+    monkeypatch.setattr(AnalogCircuit, "simulate", flaky_simulate)
+
+
+def _run(configs, tmp_path, thread, seed):
+    circuit_config, spea2_config = configs
+    saved_file_path = process(circuit_config, spea2_config,
+                              path=str(tmp_path) + '/', thread=thread,
+                              saving_format='numpy', seed=seed)
+    return GenerationPool.load(saved_file_path)
+
+
+def test_same_seed_same_trajectory(configs, flaky_simulator, tmp_path):
+    first = _run(configs, tmp_path, 1, seed=7)
+    second = _run(configs, tmp_path, 4, seed=7)
+    assert np.array_equal(first.parameters, second.parameters)
+    assert np.array_equal(first.arch_parameters, second.arch_parameters)
+    assert np.array_equal(first.gain, second.gain)
+
+
+def test_seed_from_config(configs, flaky_simulator, tmp_path):
+    configs[1]["seed"] = 3
+    first = _run(configs, tmp_path, 3, seed=None)
+    second = _run(configs, tmp_path, 2, seed=3)
+    different = _run(configs, tmp_path, 2, seed=4)
+    assert np.array_equal(first.parameters, second.parameters)
+    assert not np.array_equal(first.parameters, different.parameters)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import (
+    FitnessAssigner, Generation, GenerationPool, PopulationSizing
+)
+from spea2.algorithm.genetic import EvolutionaryAlgorithm
+from spea2.algorithm.helperfuncs import calculate_distance, get_normalize_constants
+
+
+def test_round_to_workers():
+    sizing = PopulationSizing(50, round_to_workers=True)
+    assert sizing.population_size(8) == 56
+    assert sizing.population_size(1) == 50
+    sizing.resize(N=64)
+    assert sizing.population_size(8) == 64
+    assert PopulationSizing(50).population_size(8) == 50
+
+
+def test_adapt_to_throughput():
+    sizing = PopulationSizing(20, generation_seconds=10, min_N=10, max_N=60)
+    sizing.adapt(None)
+    assert sizing.N == 20
+    sizing.adapt(4.0)
+    assert sizing.N == 40 and sizing.archive_size == 40
+    sizing.adapt(100.0)
+    assert sizing.N == 60
+    sizing.adapt(0.1)
+    assert sizing.N == 10
+
+    sizing = PopulationSizing(20, archive_size=8, generation_seconds=10, max_N=60)
+    sizing.adapt(4.0)
+    assert sizing.N == 40 and sizing.archive_size == 8
+    PopulationSizing(20).adapt(4.0)
+
+
+def test_fitness_with_different_sizes(configs, fake_simulator):
+    gen = Generation(10, 0, archive_size=4)
+    gen.population_initialize('Random')
+    gen.simulate(path=None)
+    FitnessAssigner.assign_fitness_first(gen)
+    gen.archive_inds = gen.individuals[:4]
+
+    algorithm = EvolutionaryAlgorithm(gen, gen)
+    next_gen = algorithm.produce(N=7)
+    assert len(next_gen.individuals) == 7
+    next_gen.simulate(path=None)
+    FitnessAssigner().assign_fitness(next_gen, gen)
+    normalize = get_normalize_constants(next_gen.individuals, gen.archive_inds)
+    for ind in next_gen.individuals:
+        assert ind.fitness.distance == min(
+            calculate_distance(ind, arch_ind, normalize)
+            for arch_ind in gen.archive_inds)
+
+    algorithm = EvolutionaryAlgorithm(gen, next_gen)
+    assert len(algorithm.select_archive()) == 4
+
+
+@pytest.mark.parametrize('saving_format', ['numpy', 'instance'])
+def test_process_with_decoupled_archive(configs, fake_simulator, saving_format):
+    circuit_config, spea2_config = configs
+    spea2_config["N"] = 10
+    spea2_config["archive_size"] = 6
+    spea2_config["round_to_workers"] = True
+    saved_file_path = process(circuit_config, spea2_config, path=None,
+                              saving_format=saving_format)
+    pool = GenerationPool.load(saved_file_path)
+    if saving_format == 'numpy':
+        assert pool.parameters.shape[1] == 10
+        assert pool.arch_parameters.shape[1] == 6
+        assert not np.isnan(pool.arch_gain).any()
+    else:
+        assert all(len(gen.archive_inds) == 6 for gen in pool.pool)
+
+
+def test_process_adapts_population(configs, fake_simulator):
+    circuit_config, spea2_config = configs
+    spea2_config["N"] = 10
+    spea2_config["max_N"] = 14
+    spea2_config["generation_seconds"] = 60
+    pool = GenerationPool.load(process(circuit_config, spea2_config, path=None))
+    # the monitor knows the throughput once 20 simulations finished
+    sizes = [len(gen.individuals) for gen in pool.pool]
+    assert sizes[:2] == [10, 10] and set(sizes[2:]) == {14}
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import EarlyStopping, FitnessAssigner, Generation, GenerationPool
+from spea2.algorithm.genetic import EvolutionaryAlgorithm
+
+
+def test_hypervolume_stall():
+    stopping = EarlyStopping(hypervolume_epsilon=0.01, patience=2)
+    assert stopping.update({"hypervolume": 1.0}, 1, 10) is None
+    assert stopping.update({"hypervolume": 1.5}, 1, 10) is None
+    assert stopping.update({"hypervolume": 1.501}, 1, 10) is None
+    assert stopping.update({"hypervolume": 1.502}, 1, 10) is not None
+
+
+def test_archive_patience():
+    stopping = EarlyStopping(archive_patience=2)
+    assert stopping.update({"hypervolume": 1.0}, 0, 10) is None
+    assert stopping.update({"hypervolume": 1.0}, 3, 10) is None
+    assert stopping.update({"hypervolume": 1.0}, 0, 10) is None
+    assert stopping.update({"hypervolume": 1.0}, 0, 10) is not None
+
+
+def test_new_archive_members_survive_truncation(configs, fake_simulator):
+    rng = np.random.default_rng(0)
+    gen = Generation(20, 0, archive_size=2)
+    gen.population_initialize('Random', rng=rng)
+    gen.simulate(path=None)
+    FitnessAssigner.assign_fitness_first(gen)
+    gen.archive_inds = gen.individuals[:2]
+    next_gen = EvolutionaryAlgorithm(gen, gen, rng=rng).produce()
+    next_gen.simulate(path=None)
+    FitnessAssigner().assign_fitness(next_gen, gen)
+
+    algorithm = EvolutionaryAlgorithm(gen, next_gen)
+    archive = algorithm.select_archive()
+    front = [ind for ind in next_gen.individuals
+             if ind.fitness.rawfitness == 0 and ind.fitness.total_error == 0]
+    assert algorithm.new_archive_members == sum(
+        1 for ind in archive if ind in front and ind.coming_from == 'last_gen')
+    assert algorithm.new_archive_members <= 2 < len(front)
+
+
+def test_simulation_budget():
+    stopping = EarlyStopping(max_simulations=25)
+    assert stopping.update({"hypervolume": 1.0}, 1, 10) is None
+    assert stopping.update({"hypervolume": 1.0}, 1, 10) is None
+    assert stopping.update({"hypervolume": 1.0}, 1, 10) is not None
+
+
+def test_epsilon_requires_patience():
+    with pytest.raises(ValueError):
+        EarlyStopping(hypervolume_epsilon=0.01)
+
+
+@pytest.mark.parametrize('saving_format', ['numpy', 'instance'])
+def test_pool_is_saved_at_stopping_generation(configs, fake_simulator, saving_format):
+    circuit_config, spea2_config = configs
+    spea2_config["maximum_generation"] = 50
+    spea2_config["stopping"] = {"max_simulations": 3 * spea2_config["N"]}
+    saved_file_path = process(circuit_config, spea2_config, path=None,
+                              saving_format=saving_format)
+    assert saved_file_path.endswith('gen-0to2')
+    pool = GenerationPool.load(saved_file_path)
+    assert len(pool.metrics) == 3
+    if saving_format == 'numpy':
+        assert pool.parameters.shape[0] == 3
+    else:
+        assert len(pool.pool) == 3
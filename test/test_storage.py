@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.algorithm import Generation, GenerationPool
+from spea2.algorithm.storage import CompressedStore, InstanceStore
+
+from conftest import CIRCUIT_CONFIG, fake_simulate
+
+
+def _run(configs, tmp_path, saving_format='instance', **storage):
+    circuit_config, spea2_config = configs
+    spea2_config = dict(spea2_config, storage=storage)
+    return GenerationPool.load(process(circuit_config, spea2_config, path=None,
+                                       saving_format=saving_format, seed=7))
+
+
+def _tables(pool):
+    return [table for table in pool.iter_tables()]
+
+
+def test_snapshot_is_isolated(configs):
+    generation = Generation(4, 0)
+    generation.population_initialize('Random', rng=np.random.default_rng(0))
+    generation.archive_inds = generation.individuals[:2]
+    store = InstanceStore()
+    store.append(generation)
+
+    generation.individuals[0].fitness.total_error = 3.0
+    generation.individuals[0].status = 'failed'
+    snapshot = store[0]
+    assert snapshot.individuals[0].fitness.total_error == 0.0
+    assert snapshot.individuals[0].status == 'not simulated'
+    # circuits are shared, the individual in both lists is stored once
+    assert snapshot.individuals[0].circuit is generation.individuals[0].circuit
+    assert snapshot.archive_inds[1] is snapshot.individuals[1]
+
+
+def test_archive_circuits_are_shared(configs, fake_simulator, tmp_path):
+    pool = _run(configs, tmp_path)
+    for last, gen in zip(pool.pool, pool.pool[1:]):
+        carried = [ind for ind in gen.archive_inds if ind.coming_from == 'last_arch']
+        assert carried
+        last_circuits = {id(ind.circuit) for ind in last.archive_inds}
+        assert all(id(ind.circuit) in last_circuits for ind in carried)
+
+
+def test_spill_to_disk(configs, fake_simulator, tmp_path):
+    expected = _tables(_run(configs, tmp_path))
+    spill_path = tmp_path / 'spill'
+    pool = _run(configs, tmp_path, memory_limit=1e-6, spill_path=str(spill_path))
+
+    assert pool.pool.spilled == len(pool.pool) - 1
+    # spill files are deleted after saving, the pool keeps them
+    assert os.listdir(spill_path) == []
+    tables = _tables(pool)
+    assert len(tables) == len(expected)
+    for table, expected_table in zip(tables, expected):
+        for name, column in expected_table.items():
+            np.testing.assert_array_equal(table[name], column)
+
+
+@pytest.mark.parametrize('only_cct', [False, True])
+def test_spilled_generation_access(configs, only_cct, tmp_path):
+    store = InstanceStore(only_cct, memory_limit=1e-6, spill_path=str(tmp_path))
+    for kii in range(3):
+        generation = Generation(3, kii)
+        generation.population_initialize('Random', rng=np.random.default_rng(kii))
+        generation.archive_inds = generation.individuals
+        store.append(generation)
+    assert store.spilled == 2
+    assert [gen.kii for gen in store] == [0, 1, 2]
+    first = store[0].individuals[0]
+    assert type(first).__name__ == ('AnalogCircuit' if only_cct else 'Individual')
+    store.cleanup()
+    assert os.listdir(tmp_path) == []
+
+
+def test_compressed_pool(configs, fake_simulator, tmp_path):
+    expected = _run(configs, tmp_path, 'numpy')
+    pool = _run(configs, tmp_path, 'compressed', codec='lzma', keyframe_interval=4,
+                spill_path=str(tmp_path / 'spill'))
+    assert os.path.isfile(pool.data_path) and os.listdir(tmp_path / 'spill') == []
+    tables, expected_tables = _tables(pool), _tables(expected)
+    assert len(tables) == len(expected_tables) == 6
+    for table, expected_table in zip(tables, expected_tables):
+        for name, column in expected_table.items():
+            np.testing.assert_array_equal(table[name], column)
+
+    # any generation, in any order
+    for kii in (5, 2, 3, 0):
+        values = pool.pool[kii]
+        np.testing.assert_array_equal(values["arch_parameters"],
+                                      expected.arch_parameters[kii])
+        np.testing.assert_array_equal(values["gain"], expected.gain[kii])
+
+
+def test_archive_deltas(configs, tmp_path):
+    store = CompressedStore(CIRCUIT_CONFIG["topology"], CIRCUIT_CONFIG["output"],
+                            keyframe_interval=3, spill_path=str(tmp_path))
+    rng = np.random.default_rng(0)
+    archive, archives = [], []
+    for kii in range(7):
+        generation = Generation(6, kii)
+        generation.population_initialize('Random', rng=rng)
+        for ind in generation.individuals:
+            fake_simulate(ind.circuit, None)
+        # two of the archive are new, from the individuals of the generation
+        archive = archive[2:] + generation.individuals[:2] if archive else \
+            generation.individuals[:4]
+        generation.archive_inds = list(archive)
+        archives.append([ind.circuit.parameters for ind in archive])
+        store.append(generation)
+
+    stored = [entry["arch_parameters"][2][0] for entry in store.generations]
+    assert stored == [4, 0, 0, 4, 0, 0, 4]
+    for kii in (6, 1, 5, 4, 2):
+        np.testing.assert_array_equal(store[kii]["arch_parameters"], archives[kii])
+        assert store[kii]["parameters"].shape == (6, 7)
+
+    path = str(tmp_path / 'pool.gens')
+    store.save(path)
+    assert os.listdir(tmp_path) == ['pool.gens']
+    store.cleanup()
+    store.open(path)
+    np.testing.assert_array_equal(store[4]["arch_parameters"], archives[4])
+    with pytest.raises(IndexError):
+        store[7]
+    with pytest.raises(ValueError):
+        CompressedStore(["a"], ["gain"], codec='gzip')
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import (
+    AnalogCircuit, ReplaySimulator, SimulationFailedError, SimulationTrace, TraceMissError
+)
+from spea2.algorithm import GenerationPool, RecordingPool, StragglerError, WorkerPool
+
+from conftest import CIRCUIT_CONFIG, fake_simulate
+
+
+def circuit(x):
+    """ Circuit at the normalized parameters x, simulated by fake_simulate. """
+    lower = np.array(CIRCUIT_CONFIG["lower_bound"])
+    upper = np.array(CIRCUIT_CONFIG["upper_bound"])
+    return AnalogCircuit.from_trusted(lower + (upper - lower) * np.asarray(x, dtype=float))
+
+
+def trace_of(circuits):
+    trace = SimulationTrace(CIRCUIT_CONFIG["topology"], CIRCUIT_CONFIG["output"],
+                            CIRCUIT_CONFIG["lower_bound"], CIRCUIT_CONFIG["upper_bound"])
+    for c in circuits:
+        fake_simulate(c, None)
+        trace.add(c)
+    return trace
+
+
+def test_save_and_load(configs, tmp_path):
+    trace = trace_of([circuit(np.full(7, 0.1 * k)) for k in range(5)])
+    failed = circuit(np.full(7, 0.9))
+    failed.corner = {"temp": 125.0}
+    trace.add(failed, failed=True)
+    path = str(tmp_path / 'trace.npz')
+    trace.save(path)
+
+    loaded = SimulationTrace.load(path)
+    assert len(loaded) == 6 and loaded.topology == trace.topology
+    np.testing.assert_array_equal(loaded.parameters, trace.parameters[:6])
+    np.testing.assert_array_equal(loaded.values, trace.values[:6])
+    assert loaded.failed.tolist() == [False] * 5 + [True]
+    assert len(loaded.conditions) == 2
+
+    loaded.extend(trace)
+    assert len(loaded) == 12
+    assert loaded.condition[:12].tolist() == [0] * 5 + [1] + [0] * 5 + [1]
+    with pytest.raises(ValueError):
+        loaded.extend(SimulationTrace(["a"], ["gain"], [0], [1]))
+
+
+def test_replay(configs):
+    trace = trace_of([circuit(np.full(7, 0.1 * k)) for k in range(5)])
+    failed = circuit(np.full(7, 0.95))
+    trace.add(failed, failed=True)
+    replay = ReplaySimulator(trace, miss='nearest', max_distance=0.1, neighbors=2)
+
+    # recorded circuits get their outputs, the same ones as simulated
+    c = circuit(np.full(7, 0.2))
+    outputs = dict(replay.replay(c))
+    fake_simulate(c, None)
+    assert outputs == pytest.approx({name: getattr(c, name)
+                                     for name in CIRCUIT_CONFIG["output"]})
+    with pytest.raises(SimulationFailedError):
+        replay.replay(circuit(np.full(7, 0.95)))
+
+    # in between two recorded circuits, the outputs are interpolated
+    outputs = dict(replay.replay(circuit(np.full(7, 0.125))))
+    # inverse distance weighting of two points on a line is linear
+    assert outputs["gain"] == pytest.approx(20 + 45 * 0.125)
+    with pytest.raises(TraceMissError):
+        replay.replay(circuit(np.full(7, 0.55)))
+    # nearest to the failed one
+    with pytest.raises(SimulationFailedError):
+        replay.replay(circuit(np.full(7, 0.9)))
+    # the corner is not recorded
+    at_corner = circuit(np.full(7, 0.2))
+    at_corner.corner = {"temp": 125.0}
+    with pytest.raises(TraceMissError):
+        replay.replay(at_corner)
+    assert replay.summary() == {"simulations": 6, "hits": 2, "interpolated": 2,
+                                "misses": 2}
+
+    replay = ReplaySimulator(trace, miss='fail')
+    with pytest.raises(TraceMissError):
+        replay.replay(circuit(np.full(7, 0.2001)))
+    with pytest.raises(ValueError):
+        ReplaySimulator(trace, miss='skip')
+
+
+def test_recording_pool(configs, monkeypatch, tmp_path):
+    def simulate(self, path, lock=None):
+        if self.parameters[0] > 1e-6:
+            raise SimulationFailedError("too long")
+        if self.parameters[1] > 1e-6:
+            raise StragglerError("cut off")
+        fake_simulate(self, path, lock)
+
+    monkeypatch.setattr(AnalogCircuit, "simulate", simulate)
+    trace = trace_of([])
+    path = str(tmp_path / 'trace.npz')
+    circuits = [circuit([0.1, 0.1, 0, 0, 0, 0, 0]), circuit([0.9, 0.1, 0, 0, 0, 0, 0]),
+                circuit([0.1, 0.9, 0, 0, 0, 0, 0])]
+    with RecordingPool(WorkerPool('scratch/', 2), trace, path) as workers:
+        outcomes = workers.run(circuits)
+        assert outcomes[0] is None and workers.dispatched == 3
+    assert workers.recorded == 2
+    loaded = SimulationTrace.load(path)
+    assert loaded.failed.tolist() == [False, True]
+    assert loaded.values[0, 0] == circuits[0].gain
+
+
+def test_record_and_replay_run(configs, monkeypatch, tmp_path):
+    circuit_config, spea2_config = configs
+    path = str(tmp_path / 'trace.npz')
+    circuit_config["trace"] = {"path": path}
+    monkeypatch.setattr(AnalogCircuit, "simulate", fake_simulate)
+    recorded = GenerationPool.load(process(circuit_config, spea2_config,
+                                           path=str(tmp_path) + '/', thread=2, seed=3))
+    trace = SimulationTrace.load(path)
+    assert len(trace) == sum(recorded.pool[k].simulation_count for k in range(6))
+
+    # the same seed replays the same run without simulating
+    monkeypatch.undo()
+    circuit_config["simulator"] = "replay"
+    circuit_config["path_to_output"] = str(tmp_path / 'replay') + '/'
+    (tmp_path / 'replay').mkdir()
+    replayed = GenerationPool.load(process(circuit_config, spea2_config,
+                                           path=str(tmp_path) + '/', thread=2, seed=3))
+    for k in range(6):
+        for a, b in zip(recorded.pool[k].individuals, replayed.pool[k].individuals):
+            np.testing.assert_array_equal(a.circuit.parameters, b.circuit.parameters)
+            assert a.circuit.gain == b.circuit.gain and a.circuit.bw == b.circuit.bw
+    summary = ReplaySimulator.for_config(circuit_config["trace"]).summary()
+    assert summary["misses"] == 0 and summary["hits"] == len(trace)
+
+    del circuit_config["trace"]
+    with pytest.raises(ValueError):
+        process(circuit_config, spea2_config, path=str(tmp_path) + '/')
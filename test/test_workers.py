@@ -0,0 +1,107 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from spea2.__main__ import process
+from spea2.IC import SimulationFailedError
+from spea2.IC.circuit import AnalogCircuit
+from spea2.algorithm import GenerationPool, StragglerError, WorkerMonitor, WorkerPool
+
+from conftest import fake_simulate
+
+SLOW = 0.5
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def circuits(n):
+    return [AnalogCircuit([1e-7 + i * 1e-9] + [1e-6] * 6) for i in range(n)]
+
+
+def test_monitor():
+    monitor = WorkerMonitor(straggler_percentile=50, straggler_factor=2,
+                            min_samples=3, quarantine_after=2)
+    for runtime in (0.1, 0.2):
+        monitor.finished(0, runtime, ok=True)
+    assert monitor.deadline() is None
+    monitor.finished(1, 0.3, ok=True)
+    assert monitor.deadline() == pytest.approx(0.4)
+
+    assert not monitor.finished(1, 0.01, ok=False)
+    assert monitor.finished(1, 0.01, ok=False)
+    assert not monitor.finished(1, 0.01, ok=False)
+    summary = monitor.summary()
+    assert summary["jobs"] == 6 and summary["failures"] == 3
+    assert summary["quarantines"] == {1: 1}
+    assert sum(summary["workers"][1]["histogram"]) == 4
+    assert "Worker 1: 4 jobs, 3 failed, quarantined 1 times" in monitor.report()
+
+
+@pytest.mark.parametrize('policy', ['redispatch', 'cutoff'])
+def test_straggler(configs, monkeypatch, release, policy):
+    slow = set()
+
+    def simulate(self, path, lock=None):
+        # The last circuit is slow at its first attempt only.
+        if self.parameters[0] == pytest.approx(1.11e-7) and not slow:
+            slow.add(path)
+            release.wait(10)
+        time.sleep(0.005)
+        fake_simulate(self, path, lock)
+
+    monkeypatch.setattr(AnalogCircuit, "simulate", simulate)
+    monitor = WorkerMonitor(straggler_percentile=90, straggler_factor=5,
+                            straggler_policy=policy, min_samples=5,
+                            heartbeat_interval=0.01)
+    batch = circuits(12)
+    with WorkerPool('scratch/', 3, monitor) as workers:
+        start = time.perf_counter()
+        outcomes = workers.run(batch)
+        assert time.perf_counter() - start < SLOW
+
+    assert monitor.stragglers == 1
+    if policy == 'redispatch':
+        assert outcomes == [None] * 12
+        assert monitor.redispatched == 1 and workers.dispatched == 13
+        assert batch[-1].gain is not None and hasattr(batch[-1], 'bw')
+    else:
+        assert outcomes[:11] == [None] * 11
+        assert isinstance(outcomes[-1], StragglerError)
+        assert monitor.cutoff == 1
+
+
+def test_quarantine(configs, monkeypatch):
+    repaired = []
+
+    def simulate(self, path, lock=None):
+        if path == 'scratch/0/' and not repaired:
+            raise SimulationFailedError("broken folder")
+        fake_simulate(self, path, lock)
+
+    monkeypatch.setattr(AnalogCircuit, "simulate", simulate)
+    monitor = WorkerMonitor(quarantine_after=2)
+    with WorkerPool('scratch/', 2, monitor, repaired.append) as workers:
+        # folders are used in turn
+        outcomes = [workers.run(circuits(1))[0] for _ in range(5)]
+    assert repaired == ['scratch/0/']
+    assert monitor.quarantines == {0: 1}
+    assert [o is None for o in outcomes] == [False, True, False, True, True]
+    assert isinstance(outcomes[0], SimulationFailedError)
+
+
+def test_process_worker_summary(configs, fake_simulator, tmp_path):
+    circuit_config, spea2_config = configs
+    spea2_config["workers"] = {"straggler_percentile": 95, "min_samples": 10}
+    saved = process(circuit_config, spea2_config, path=str(tmp_path) + '/',
+                    thread=2, seed=3)
+    pool = GenerationPool.load(saved)
+    assert pool.worker_summary["jobs"] >= 6 * 12
+    assert set(pool.worker_summary["workers"]) <= {0, 1}
+    assert np.isfinite(pool.worker_summary["runtime"]["p50"])